@@ -4,13 +4,21 @@ input can be the webcam or a file
 send to ndi, and use PoseDetector to collect Pose and send via osc
 """
 
-import cv2, os, time
+import cv2, os
 import tkinter as tk
 from tkinter import filedialog, Menu
 from PIL import Image, ImageTk
 from pythonosc import udp_client
-import NDIlib as ndi
 from pose_detector import PoseDetectorMediapipe
+from pose_detector.detection_cache import DetectionCache
+from pose_detector.metrics import MetricsReporter
+from pose_detector.multicam import MultiCameraRunner
+from pose_detector.ndi_sender import NdiSender
+from pose_detector.pipeline import PosePipeline
+from pose_detector.pose_encoding import POSE_FORMATS
+from pose_detector.pose_recording import PoseRecorder, PoseRecording, PoseReplayer, detector_schema
+from pose_detector.profiler import start_profile
+from pose_detector.roi import RoiTracker, parse_zones
 from getCamNames import  get_available_cameras
 
 # define global strings for set/compare
@@ -36,35 +44,70 @@ class PoseApp:
         self.video_isWebcam = True
 
         self.video_looping = tk.BooleanVar(value=False)
+        # reuse detections of earlier loops/runs of the same file, see detection_cache
+        self.cache_detections = tk.BooleanVar(value=True)
+        self.detection_cache = None
         self.video_input_file = tk.StringVar()
 
         self.ndi_out_name = tk.StringVar(value="posePC")
+        # "Start All Cams" opens an NDI source per camera only when asked to
+        self.multicam_ndi = tk.BooleanVar(value=False)
         self.osc_output_ip = tk.StringVar(value="127.0.0.1")
         self.osc_output_port = tk.StringVar(value="5005")
+        self.osc_bundle = tk.BooleanVar(value=self.pose_detector.osc_bundle)
+        self.osc_pose_format = tk.StringVar(value=self.pose_detector.osc_pose_format)
+        # run the detector every Nth frame, send OSC at a fixed rate in between (0 = once per detection)
+        self.inference_every = tk.StringVar(value="1")
+        self.osc_rate = tk.StringVar(value="0")
+        # crop frames around the last detected people before inference
+        self.crop_to_roi = tk.BooleanVar(value=False)
+        # normalized "x,y,w,h; x,y,w,h" zones the crop stays inside / blacks out
+        self.roi_include = tk.StringVar(value="")
+        self.roi_exclude = tk.StringVar(value="")
+        # detector input and NDI output widths, 0 keeps the capture size
+        self.inference_width = tk.StringVar(value="0")
+        self.ndi_width = tk.StringVar(value="0")
+        # preview can be switched off entirely, or shown smaller and slower than the processing
+        self.show_preview = tk.BooleanVar(value=True)
+        self.preview_fps = tk.StringVar(value="15")
+        self.preview_width = tk.StringVar(value="640")
+        self.preview_photo = None
+        self.preview_item = None
+        # per stage latency/fps, sent as /stats/... to the OSC output when checked
+        self.send_stats = tk.BooleanVar(value=False)
+        self.metrics_reporter = None
 
         # a few local var to hold cv2 stuff
         self.cap = None
 
         self.osc_client = None
 
-        result = ndi.initialize()
-        assert result is True, "NDI Initialization failed"
-
         self.cameraNames = get_available_cameras()
         print("Camera Names", self.cameraNames)
 
-        self.ndi_send = None
-        self.video_frame = None
+        # async double buffered NDI source, sends from the pipeline's NDI thread
+        self.ndi_sender = None
 
+        self.pipeline = None
         self.running = False
+        self.multicam = None
+        self.recorder = None
+        self.replayer = None
+        self.replay_speed = tk.StringVar(value="1.0")
 
     def run(self):
         self.build_gui()
         self.root.mainloop()
 
     def check_key(self,event):
+        # typing in the ip/port/name fields is not a command
+        if isinstance(event.widget, tk.Entry):
+            return
         if event.char == 'q':
             self.on_closing()
+        elif event.char == 'p':
+            # sample stacks and allocations of the running app, see pose_detector/profiler.py
+            start_profile()
         return
 
     def set_video_input_file(self):
@@ -92,6 +135,7 @@ class PoseApp:
         self.root.config(menu=menu)
         file_menu = Menu(menu, tearoff=False)
         file_menu.add_command(label="Exit", command=self.on_closing)  # Call on_closing function when selecting "Exit"
+        self.root.bind("<Key>", self.check_key)
         menu.add_cascade(label="File", menu=file_menu)
 
         # Create the upper canvas
@@ -127,6 +171,8 @@ class PoseApp:
                 text=f"{g_looping_prefix} {'ON' if self.video_looping.get() else 'OFF'}",
                 command=self.toggle_looping)
         self.looping_button.grid(row=3, column=1, sticky="w", padx=5, pady=5)
+        cache_check = tk.Checkbutton(self.upper_canvas, text="Cache Detections", variable=self.cache_detections)
+        cache_check.grid(row=3, column=2, sticky="w", padx=5, pady=5)
 
         ndi_output_label = tk.Label(self.upper_canvas, text="NDI Video Out Name:")
         ndi_out_name_entry = tk.Entry(self.upper_canvas, textvariable=self.ndi_out_name)
@@ -148,17 +194,86 @@ class PoseApp:
         osc_output_ip_entry.grid(row=6, column=1, sticky="w", padx=5, pady=5)
         osc_output_port_entry.grid(row=6, column=2, sticky="w", padx=5, pady=5)
 
+        # landmarks = one message per landmark, others = one /p1/pose message per person
+        osc_format_dropdown = tk.OptionMenu(self.upper_canvas, self.osc_pose_format,
+                                            *POSE_FORMATS, command=self.update_osc_pose_format)
+        osc_format_dropdown.grid(row=6, column=3, sticky="w", padx=5, pady=5)
+
         self.start_osc_button = tk.Button(self.upper_canvas, text="Start OSC", command=self.start_osc)
         self.stop_osc_button = tk.Button(self.upper_canvas, text="Stop OSC", command=self.stop_osc, state=tk.DISABLED)
         #
         self.start_osc_button.grid(row=7, column=1, sticky="w", padx=5, pady=5)
         self.stop_osc_button.grid(row=7, column=2, sticky="w", padx=5, pady=5)
 
+        osc_bundle_check = tk.Checkbutton(self.upper_canvas, text="One bundle per frame",
+                                          variable=self.osc_bundle, command=self.toggle_osc_bundle)
+        osc_bundle_check.grid(row=7, column=3, sticky="w", padx=5, pady=5)
+        stats_check = tk.Checkbutton(self.upper_canvas, text="Send /stats", variable=self.send_stats)
+        stats_check.grid(row=7, column=0, sticky="w", padx=5, pady=5)
+
         self.start_video_button = tk.Button(self.upper_canvas, text="Play Video", command=self.play_video)
         self.stop_video_button = tk.Button(self.upper_canvas, text="Stop Video", command=self.stop_video, state=tk.DISABLED)
         self.start_video_button.grid(row=8, column=0, sticky="w", padx=5, pady=5)
         self.stop_video_button.grid(row=8, column=1, sticky="w", padx=5, pady=5)
 
+        # every camera at once, each in its own process, OSC as /camN/..., NDI as <name>-camN
+        self.start_multicam_button = tk.Button(self.upper_canvas, text="Start All Cams", command=self.start_multicam)
+        self.stop_multicam_button = tk.Button(self.upper_canvas, text="Stop All Cams", command=self.stop_multicam, state=tk.DISABLED)
+        self.start_multicam_button.grid(row=9, column=0, sticky="w", padx=5, pady=5)
+        self.stop_multicam_button.grid(row=9, column=1, sticky="w", padx=5, pady=5)
+        multicam_ndi_check = tk.Checkbutton(self.upper_canvas, text="NDI Per Cam", variable=self.multicam_ndi)
+        multicam_ndi_check.grid(row=9, column=2, sticky="w", padx=5, pady=5)
+        self.multicam_stats_label = tk.Label(self.upper_canvas, text="", justify=tk.LEFT)
+        self.multicam_stats_label.grid(row=10, column=0, columnspan=4, sticky="w", padx=5, pady=5)
+
+        # record detected poses, replay them over OSC later without running the model
+        self.record_button = tk.Button(self.upper_canvas, text="Record Poses", command=self.toggle_recording)
+        self.record_button.grid(row=8, column=2, sticky="w", padx=5, pady=5)
+        self.replay_button = tk.Button(self.upper_canvas, text="Replay Poses", command=self.toggle_replay)
+        replay_speed_label = tk.Label(self.upper_canvas, text="Replay Speed:")
+        replay_speed_entry = tk.Entry(self.upper_canvas, textvariable=self.replay_speed, width=6)
+        self.replay_button.grid(row=11, column=0, sticky="w", padx=5, pady=5)
+        replay_speed_label.grid(row=11, column=1, sticky="w", padx=5, pady=5)
+        replay_speed_entry.grid(row=11, column=2, sticky="w", padx=5, pady=5)
+
+        inference_every_label = tk.Label(self.upper_canvas, text="Pose Every N Frames:")
+        inference_every_entry = tk.Entry(self.upper_canvas, textvariable=self.inference_every, width=6)
+        osc_rate_label = tk.Label(self.upper_canvas, text="OSC Rate Hz (0=off):")
+        osc_rate_entry = tk.Entry(self.upper_canvas, textvariable=self.osc_rate, width=6)
+        inference_every_label.grid(row=12, column=0, sticky="w", padx=5, pady=5)
+        inference_every_entry.grid(row=12, column=1, sticky="w", padx=5, pady=5)
+        osc_rate_label.grid(row=12, column=2, sticky="w", padx=5, pady=5)
+        osc_rate_entry.grid(row=12, column=3, sticky="w", padx=5, pady=5)
+        roi_check = tk.Checkbutton(self.upper_canvas, text="Crop To People", variable=self.crop_to_roi)
+        roi_check.grid(row=3, column=3, sticky="w", padx=5, pady=5)
+        roi_include_label = tk.Label(self.upper_canvas, text="Include Zones x,y,w,h;...:")
+        roi_include_entry = tk.Entry(self.upper_canvas, textvariable=self.roi_include, width=20)
+        roi_exclude_label = tk.Label(self.upper_canvas, text="Exclude Zones:")
+        roi_exclude_entry = tk.Entry(self.upper_canvas, textvariable=self.roi_exclude, width=20)
+        roi_include_label.grid(row=15, column=0, sticky="w", padx=5, pady=5)
+        roi_include_entry.grid(row=15, column=1, sticky="w", padx=5, pady=5)
+        roi_exclude_label.grid(row=15, column=2, sticky="w", padx=5, pady=5)
+        roi_exclude_entry.grid(row=15, column=3, sticky="w", padx=5, pady=5)
+
+        inference_width_label = tk.Label(self.upper_canvas, text="Pose Input Width (0=full):")
+        inference_width_entry = tk.Entry(self.upper_canvas, textvariable=self.inference_width, width=6)
+        ndi_width_label = tk.Label(self.upper_canvas, text="NDI Width (0=full):")
+        ndi_width_entry = tk.Entry(self.upper_canvas, textvariable=self.ndi_width, width=6)
+        inference_width_label.grid(row=13, column=0, sticky="w", padx=5, pady=5)
+        inference_width_entry.grid(row=13, column=1, sticky="w", padx=5, pady=5)
+        ndi_width_label.grid(row=13, column=2, sticky="w", padx=5, pady=5)
+        ndi_width_entry.grid(row=13, column=3, sticky="w", padx=5, pady=5)
+
+        preview_check = tk.Checkbutton(self.upper_canvas, text="Show Preview",
+                                       variable=self.show_preview, command=self.toggle_preview)
+        preview_size_label = tk.Label(self.upper_canvas, text="Preview FPS / Width:")
+        preview_fps_entry = tk.Entry(self.upper_canvas, textvariable=self.preview_fps, width=6)
+        preview_width_entry = tk.Entry(self.upper_canvas, textvariable=self.preview_width, width=6)
+        preview_check.grid(row=14, column=0, sticky="w", padx=5, pady=5)
+        preview_size_label.grid(row=14, column=1, sticky="w", padx=5, pady=5)
+        preview_fps_entry.grid(row=14, column=2, sticky="w", padx=5, pady=5)
+        preview_width_entry.grid(row=14, column=3, sticky="w", padx=5, pady=5)
+
         self.height_upper = self.upper_canvas.winfo_height()
         # Create the bottom canvas
         self.bottom_canvas = tk.Canvas(self.root, width=100, height=100)
@@ -170,20 +285,28 @@ class PoseApp:
         self.looping_button["text"] = \
             f"{g_looping_prefix} {'ON' if self.video_looping.get() else 'OFF'}"
         print("looping is now", self.video_looping.get(), "and button text is", self.looping_button["text"])
+        if self.pipeline is not None:
+            self.pipeline.looping = self.video_looping.get()
 
     def start_ndi(self):
-        send_settings = ndi.SendCreate()
-        send_settings.ndi_name =  self.ndi_out_name.get()
-        self.ndi_send = ndi.send_create(send_settings)
-        self.video_frame = ndi.VideoFrameV2()
+        try:
+            self.ndi_sender = NdiSender(self.ndi_out_name.get(),
+                                        fps=self.pipeline.fps if self.pipeline is not None else None)
+        except Exception as e:
+            print("Error starting NDI: {}".format(e))
+            return
+        if self.pipeline is not None:
+            self.ndi_sender.metrics = self.pipeline.metrics
+            self.pipeline.ndi_out = self.ndi_sender.send
 
         self.start_ndi_button.config(state=tk.DISABLED)
         self.stop_ndi_button.config(state=tk.NORMAL)
     def stop_ndi(self):
-        ndi.send_destroy(self.ndi_send)
-        ndi.destroy()
-        self.ndi_send = None
-        self.video_frame = None
+        if self.pipeline is not None:
+            self.pipeline.ndi_out = None
+        if self.ndi_sender is not None:
+            self.ndi_sender.close()
+            self.ndi_sender = None
 
         self.start_ndi_button.config(state=tk.NORMAL)
         self.stop_ndi_button.config(state=tk.DISABLED)
@@ -198,10 +321,22 @@ class PoseApp:
         except Exception as e:
             print("Error opening OSC socket: {}".format(e))
             self.osc_terminate()
+        if self.pipeline is not None:
+            self.pipeline.osc_client = self.osc_client
         self.start_osc_button.config(state=tk.DISABLED)
         self.stop_osc_button.config(state=tk.NORMAL)
 
+    def toggle_osc_bundle(self):
+        self.pose_detector.osc_bundle = self.osc_bundle.get()
+        print("OSC bundle mode is now", self.pose_detector.osc_bundle)
+
+    def update_osc_pose_format(self, *args):
+        self.pose_detector.osc_pose_format = self.osc_pose_format.get()
+        print("OSC pose format is now", self.pose_detector.osc_pose_format)
+
     def stop_osc(self):
+        if self.pipeline is not None:
+            self.pipeline.osc_client = None
         if self.osc_client is not None:
             self.osc_client = None
         self.start_osc_button.config(state=tk.NORMAL)
@@ -265,93 +400,224 @@ class PoseApp:
             #print("FPS too small", fps)
         # Calculate the delay based on the frame rate
         self.video_delay = int(1000 / fps)  # Delay in milliseconds
+        if self.ndi_sender is not None:
+            self.ndi_sender.set_frame_rate(fps)
 
-        # Resize the app window to match the video size
+        # Resize the app window to match the preview size, the video downscaled to the preview width
         frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         print("video size: {} x {}".format(frame_width, frame_height))
-        self.root.geometry(f"{frame_width}x{frame_height + self.height_upper}")
-        self.bottom_canvas.configure(width=frame_width, height=frame_height)
+        preview_width = min(int(self.preview_width.get() or 0) or frame_width, frame_width)
+        preview_height = max(1, round(frame_height * preview_width / frame_width))
+        self.root.geometry(f"{preview_width}x{preview_height + self.height_upper}")
+        self.bottom_canvas.configure(width=preview_width, height=preview_height)
+        preview_fps = float(self.preview_fps.get() or 0)
+        # poll a little faster than the preview rate so we never fall a frame behind
+        self.preview_delay = max(int(1000 / (preview_fps or fps) / 2), 1)
+
+        inference_size = int(self.inference_width.get() or 0) or None
+        roi = None
+        if self.crop_to_roi.get():
+            try:
+                roi = RoiTracker(include_zones=parse_zones(self.roi_include.get()),
+                                 exclude_zones=parse_zones(self.roi_exclude.get()))
+            except ValueError as e:
+                print("Error in the zones, cropping without them: {}".format(e))
+                roi = RoiTracker()
+        self.detection_cache = None
+        if self.video_input_source.get() == g_file and self.cache_detections.get():
+            try:
+                self.detection_cache = DetectionCache(
+                    self.video_input_file.get(), self.pose_detector,
+                    pipeline_settings={"inference_size": inference_size,
+                                       "roi": roi.get_settings() if roi else False})
+                print("detection cache:", self.detection_cache.directory)
+            except Exception as e:
+                print("Error opening detection cache: {}".format(e))
+
+        # capture, inference, NDI, OSC and preview each run on their own thread,
+        # the Tk loop below only displays the frames the preview stage hands back
+        self.pipeline = PosePipeline(self.cap, self.pose_detector, fps=fps,
+                                     is_file=self.video_input_source.get() == g_file,
+                                     looping=self.video_looping.get(),
+                                     ndi_out=self.ndi_sender.send if self.ndi_sender is not None else None,
+                                     osc_client=self.osc_client,
+                                     recorder=self.recorder,
+                                     detection_cache=self.detection_cache,
+                                     inference_every=int(self.inference_every.get() or 1),
+                                     osc_rate=float(self.osc_rate.get() or 0),
+                                     roi=roi,
+                                     inference_size=inference_size,
+                                     ndi_size=int(self.ndi_width.get() or 0) or None,
+                                     preview=self.show_preview.get(),
+                                     preview_size=(preview_width, preview_height),
+                                     preview_fps=preview_fps)
+        if self.ndi_sender is not None:
+            self.ndi_sender.metrics = self.pipeline.metrics
+        self.pipeline.start()
+        self.metrics_reporter = MetricsReporter(
+            self.pipeline.metrics, console_interval=10.0,
+            get_osc_client=lambda: self.osc_client if self.send_stats.get() else None)
+        self.metrics_reporter.start()
         self.running = True
-        self.frameCount = 0
-        self.loopcount = 1
         print("running is", self.running)
+        self.display_frame()
 
-        def display_frame():
-            print("display_frame {} {} {}".format(self.running, self.frameCount, self.loopcount))
-            start_time = time.time()
-            if not self.running:
-                print("display_frame: not running, so return")
-                return
+    def display_frame(self):
+        if not self.running or self.pipeline is None:
+            return
+        if self.pipeline.finished:
+            print("not looping video, so break from running loop")
+            print("GUI should give error dialog here, update ui")
+            self.stop_video()
+            return
 
-            # Code to read the input and process frames using pose_detector.process_frame()
-            ret, frame = self.cap.read()
-            if not ret:
-                print("Video capture read failed")
-                if self.video_looping.get():
-                    print("looping video, so retry)")
-                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    self.loopcount += 1
-                    self.frameCount = 0
-                    ret, frame = self.cap.read()
+        packet = self.pipeline.get_display_frame()
+        if packet is not None and self.show_preview.get():
+            image = Image.fromarray(packet.preview)
+            if self.preview_photo is None or \
+                    (self.preview_photo.width(), self.preview_photo.height()) != image.size:
+                # Create a PIL ImageTk object, only when the size changes
+                self.preview_photo = ImageTk.PhotoImage(image=image)
+                if self.preview_item is None:
+                    # one canvas item for the whole session, updated in place
+                    self.preview_item = self.bottom_canvas.create_image(0, 0, anchor=tk.NW,
+                                                                        image=self.preview_photo)
                 else:
-                    print("not looping video, so break from running loop")
-                    print("GUI should give error dialog here, update ui")
-                    self.stop_video()
-                    return
-
-            if self.frameCount % 30:
-                frame_height, frame_width, _  = frame.shape
-                frame_width = int(frame_width)
-                frame_height = int(frame_height)
-                print("video size: {} x {}".format(frame_width, frame_height))
-
-            # send the image via NDI
-            if self.ndi_send is not None:
-                frame_rgbA = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-                self.video_frame.data = frame_rgbA
-                self.video_frame.FourCC = ndi.FOURCC_VIDEO_TYPE_RGBX
-                #self.video_frame.frame_rate_D = 1
-                #self.video_frame.frame_rate_N = 120
-                ndi.send_send_video_v2(self.ndi_send,self.video_frame)
+                    self.bottom_canvas.itemconfigure(self.preview_item, image=self.preview_photo)
             else:
-                print("ndi_send is None")
+                # copy the pixels into the existing Tk image
+                self.preview_photo.paste(image)
+
+        # with the preview off we still poll, slowly, to notice the end of the video
+        self.root.after(self.preview_delay if self.show_preview.get() else 200, self.display_frame)
+
+    def toggle_preview(self):
+        show = self.show_preview.get()
+        if self.pipeline is not None:
+            self.pipeline.preview_enabled = show
+        if self.preview_item is not None:
+            self.bottom_canvas.itemconfigure(self.preview_item, state="normal" if show else "hidden")
+        print("preview is now", show)
+
+    def toggle_recording(self):
+        if self.recorder is None:
+            file_path = filedialog.asksaveasfilename(
+                initialdir=self.last_directory,
+                title="Record Poses To",
+                defaultextension=".poserec",
+                filetypes=[("Pose Recordings", "*.poserec"), ("All Files", "*.*")]
+            )
+            if not file_path:
+                return
+            self.last_directory = os.path.dirname(file_path)
+            self.recorder = PoseRecorder(file_path, len(self.pose_detector.pose_id_to_name),
+                                         detector_schema(self.pose_detector))
+            self.record_button["text"] = "Stop Recording"
+            print("recording poses to", file_path)
+        else:
+            recorder, self.recorder = self.recorder, None
+            if self.pipeline is not None:
+                self.pipeline.recorder = None
+            recorder.close()
+            self.record_button["text"] = "Record Poses"
+            print("recorded", recorder.num_records, "frames to", recorder.path)
+        if self.pipeline is not None:
+            self.pipeline.recorder = self.recorder
+
+    def toggle_replay(self):
+        if self.replayer is not None:
+            self.stop_replay()
+            return
+        file_path = filedialog.askopenfilename(
+            initialdir=self.last_directory,
+            title="Select Pose Recording",
+            filetypes=[("Pose Recordings", "*.poserec"), ("All Files", "*.*")]
+        )
+        if not file_path:
+            return
+        self.last_directory = os.path.dirname(file_path)
+        osc_client = self.osc_client
+        if osc_client is None:
+            osc_client = udp_client.SimpleUDPClient(self.osc_output_ip.get(), int(self.osc_output_port.get()))
+        recording = PoseRecording(file_path)
+        print(f"replaying {len(recording)} frames, {recording.duration:.1f}s from {file_path}")
+        self.replayer = PoseReplayer(recording, osc_client, speed=float(self.replay_speed.get()),
+                                     looping=self.video_looping.get())
+        # same OSC output settings as the live detector
+        self.replayer.pose_detector.osc_bundle = self.osc_bundle.get()
+        self.replayer.pose_detector.osc_pose_format = self.osc_pose_format.get()
+        self.replayer.start()
+        self.replay_button["text"] = "Stop Replay"
+        self.check_replay()
+
+    def check_replay(self):
+        if self.replayer is None:
+            return
+        if not self.replayer.running:
+            self.stop_replay()
+            return
+        self.root.after(500, self.check_replay)
+
+    def stop_replay(self):
+        if self.replayer is not None:
+            self.replayer.stop()
+            self.replayer.recording.close()
+            self.replayer = None
+        self.replay_button["text"] = "Replay Poses"
+
+    def start_multicam(self):
+        # the single camera pipeline and the multi camera processes would fight over the webcams
+        if self.running:
+            self.stop_video()
+        # no NDI senders unless asked for and named
+        ndi_name = self.ndi_out_name.get().strip() if self.multicam_ndi.get() else ""
+        self.multicam = MultiCameraRunner(list(self.cameraNames.keys()),
+                                          osc_host=self.osc_output_ip.get(),
+                                          osc_port=int(self.osc_output_port.get()),
+                                          ndi_name=ndi_name or None,
+                                          osc_bundle=self.osc_bundle.get(),
+                                          osc_pose_format=self.osc_pose_format.get(),
+                                          api_preference=cv2.CAP_DSHOW,
+                                          inference_size=int(self.inference_width.get() or 0) or None,
+                                          ndi_size=int(self.ndi_width.get() or 0) or None)
+        self.multicam.start()
+        self.start_video_button.config(state=tk.DISABLED)
+        self.start_multicam_button.config(state=tk.DISABLED)
+        self.stop_multicam_button.config(state=tk.NORMAL)
+        self.update_multicam_stats()
 
-            # process the frame with PoseDetector
-            results = pose_detector.process_image(frame)
-            if results and self.osc_client is not None:
-                pose_detector.send_landmarks_via_osc(self.osc_client)
-                pose_detector.draw_landmarks(frame)
-            else:
-                print("No pose detected")
-                #return
-
-            # convert pose+frame image to TK format and display
-            # Create a PIL ImageTk object
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            tkimage = ImageTk.PhotoImage(image=Image.fromarray(frame))
-            #print("created tkimage : {}x{}".format(tkimage.width(), tkimage.height()))
-            #image = tk.PhotoImage(master=self.bottom_canvas, width=frame_width, height=frame_height)                # Display the frame on the bottom canvas
-            self.bottom_canvas.create_image(0, 0, anchor=tk.NW, image=tkimage, state="normal")
-            self.bottom_canvas.image = tkimage  # Save a reference to prevent garbage collection
-            self.bottom_canvas.update()
-
-            self.frameCount += 1
-            #print("frameCount: {}".format(frameCount), "loopcount: {}".format(loopcount))
-            # calculate the remaining frame delay to match the video frame rate
-            end_time = time.time()
-            elapsed_time = (end_time - start_time) * 1000  # Convert to milliseconds
-            delay = max(self.video_delay - int(elapsed_time), 1)
-            print("elapsed_time {} vidDelay {} remaining delay: {}".format(elapsed_time, self.video_delay,delay))
-            self.root.after(delay, display_frame)
-            print("after root delay", delay)
-
-        display_frame()
-        print("End Video")
+    def update_multicam_stats(self):
+        if self.multicam is None:
+            return
+        lines = [f"{stat['camera']} {self.cameraNames.get(stat['camera_id'], '')}: "
+                 f"capture {stat['capture_fps']:.1f} fps, pose {stat['inference_fps']:.1f} fps, "
+                 f"dropped {stat['dropped']}{'' if stat['alive'] else ' (stopped)'}"
+                 for stat in self.multicam.get_stats()]
+        self.multicam_stats_label["text"] = "\n".join(lines)
+        self.root.after(1000, self.update_multicam_stats)
+
+    def stop_multicam(self):
+        if self.multicam is not None:
+            self.multicam.stop()
+            self.multicam = None
+        self.multicam_stats_label["text"] = ""
+        self.start_video_button.config(state=tk.NORMAL)
+        self.start_multicam_button.config(state=tk.NORMAL)
+        self.stop_multicam_button.config(state=tk.DISABLED)
 
     def stop_video(self):
         print("stop video loop")
         self.running = False
+        if self.metrics_reporter is not None:
+            self.metrics_reporter.stop()
+            self.metrics_reporter = None
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+        if self.detection_cache is not None:
+            print(f"detection cache: {self.detection_cache.hits} hits, {self.detection_cache.misses} misses")
+            self.detection_cache = None
         if self.cap is not None:
             print("stop_video: cap is not None, release")
             self.cap.release()
@@ -361,6 +627,19 @@ class PoseApp:
 
     def on_closing(self):
         print("on_closing")
+        self.running = False
+        if self.metrics_reporter is not None:
+            self.metrics_reporter.stop()
+            self.metrics_reporter = None
+        self.stop_replay()
+        if self.recorder is not None:
+            self.toggle_recording()
+        if self.multicam is not None:
+            self.multicam.stop()
+            self.multicam = None
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
         if self.cap is not None:
             self.cap.release()
             self.cap = None
@@ -369,11 +648,13 @@ class PoseApp:
         self.root.destroy()
         self.root = None
 
-# Create an instance of PoseDetector
-pose_detector = PoseDetectorMediapipe()
+# guarded: the multi camera processes re-import this module on windows (spawn)
+if __name__ == "__main__":
+    # Create an instance of PoseDetector
+    pose_detector = PoseDetectorMediapipe()
 
-# Create an instance of VideoApp and pass the PoseDetector instance
-app = PoseApp(pose_detector)
+    # Create an instance of VideoApp and pass the PoseDetector instance
+    app = PoseApp(pose_detector)
 
-# Run the application
-app.run()
+    # Run the application
+    app.run()
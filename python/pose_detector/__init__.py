@@ -1,3 +1,13 @@
 from .pose_detector import PoseDetector
-from .pose_detector_mediapipe import PoseDetectorMediapipe
-from .pose_detector_alphapose import PoseDetectorAlphaPose
+
+
+def __getattr__(name):
+    # backends are imported on first use, so the rest of the package (pipeline, encoding,
+    # recording, benchmarks) works on a machine without mediapipe
+    if name == "PoseDetectorMediapipe":
+        from .pose_detector_mediapipe import PoseDetectorMediapipe
+        return PoseDetectorMediapipe
+    if name == "PoseDetectorAlphaPose":
+        from .pose_detector_alphapose import PoseDetectorAlphaPose
+        return PoseDetectorAlphaPose
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,362 @@
+"""
+Benchmark the pose detector backends against each other on this machine.
+
+    python -m pose_detector.benchmark --clip dancer.mp4 --widths 320,640,1280 --persons 1,2,4
+    python -m pose_detector.benchmark --backends mediapipe,movenet --baseline bench_baseline.json
+    python -m pose_detector.benchmark --save-baseline bench_baseline.json
+
+Run from the python folder. Every backend (serve.DETECTORS) runs in its own python process,
+so their libraries don't interfere and each gets its own peak RSS. Frames are decoded
+up front and held in memory, only process_image is timed. For each width and person count:
+    frames    the clip (or synthetic frames) tiled persons times in a grid, resized to width
+    latency   mean, p50, p90, p95, p99, max of process_image in ms after warm up
+    fps       throughput over the timed frames
+    warmup_s  time of the first --warmup frames (model graph setup, caches...), first_frame_ms
+    peak_rss_mb  process peak so far (grows over the cases of a backend, never shrinks)
+plus startup_s per backend (constructor, model load). Backends that are not installed are
+listed under "errors" and skipped.
+
+Results are written as JSON (--results). With --baseline, cases are matched by backend,
+width and persons and anything more than --tolerance worse is reported as a regression
+(exit code 1). Baselines are per machine, compare results from the same box.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+DEFAULT_WIDTHS = (320, 640, 1280)
+DEFAULT_PERSONS = (1, 2)
+DEFAULT_FRAMES = 100
+DEFAULT_WARMUP = 10
+DEFAULT_TOLERANCE = 0.15
+DEFAULT_RESULTS = "benchmark_results.json"
+SYNTHETIC_SIZE = (640, 480)
+# the worker prints its result on a line starting with this, everything else is the backend's chatter
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+# metric, worse when it goes up (True) or down (False), smallest difference worth reporting
+COMPARED_METRICS = (
+    ("latency_ms.p50", True, 0.5),
+    ("latency_ms.p95", True, 0.5),
+    ("fps", False, 0.5),
+    ("peak_rss_mb", True, 20.0),
+    ("startup_s", True, 0.2),
+)
+
+
+def peak_rss_mb():
+    """ peak resident memory of this process in MB, None if it can't be read here """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def machine_info():
+    return {"node": platform.node(), "platform": platform.platform(), "processor": platform.processor(),
+            "cpu_count": os.cpu_count(), "python": platform.python_version(), "opencv": cv2.__version__}
+
+
+def load_clip_frames(path, count):
+    """ up to count BGR frames from the start of a video file """
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise ValueError(f"no frames in {path}")
+    return frames
+
+
+def synthetic_frames(count, size=SYNTHETIC_SIZE, seed=0):
+    """
+    Noisy frames with a moving stick figure, for machines without a clip.
+    Real detectors mostly find nobody in these, so they measure the empty scene path.
+    """
+    width, height = size
+    rng = np.random.default_rng(seed)
+    background = rng.integers(60, 120, (height, width, 3), dtype=np.uint8)
+    frames = []
+    for index in range(count):
+        frame = background.copy()
+        x = int(width * (0.3 + 0.4 * (index % 30) / 30))
+        head, hip = (x, height // 5), (x, height // 2)
+        cv2.circle(frame, head, height // 14, (180, 200, 230), -1)
+        cv2.line(frame, head, hip, (60, 60, 200), height // 20)
+        for dx in (-1, 1):
+            cv2.line(frame, (x, height // 3), (x + dx * width // 8, height // 4), (180, 200, 230), height // 40)
+            cv2.line(frame, hip, (x + dx * width // 12, height * 9 // 10), (90, 60, 40), height // 30)
+        frames.append(frame)
+    return frames
+
+
+def compose_frame(frame, persons, width):
+    """
+    persons copies of frame in a grid with the frame's aspect ratio, resized to width,
+    so a one person clip becomes an N person scene at the same frame size
+    """
+    height, frame_width = frame.shape[:2]
+    columns = math.ceil(math.sqrt(persons))
+    rows = math.ceil(persons / columns)
+    out_height = max(2, round(height * width / frame_width))
+    if persons == 1:
+        return cv2.resize(frame, (width, out_height), interpolation=cv2.INTER_AREA)
+    cell_width, cell_height = width // columns, out_height // rows
+    cell = cv2.resize(frame, (cell_width, cell_height), interpolation=cv2.INTER_AREA)
+    out = np.zeros((out_height, width, 3), dtype=np.uint8)
+    for index in range(persons):
+        row, column = divmod(index, columns)
+        out[row * cell_height:(row + 1) * cell_height, column * cell_width:(column + 1) * cell_width] = cell
+    return out
+
+
+def latency_summary(latencies):
+    """ latencies in seconds -> dict of mean and percentiles in ms """
+    ms = np.asarray(latencies) * 1000
+    summary = {"mean": float(ms.mean())}
+    for percent in (50, 90, 95, 99):
+        summary[f"p{percent}"] = float(np.percentile(ms, percent))
+    summary["max"] = float(ms.max())
+    return summary
+
+
+def detected_persons(pose_detector):
+    from .pose_recording import detector_num_landmarks, detector_pose_arrays
+    landmarks = detector_pose_arrays(pose_detector, detector_num_landmarks(pose_detector))[0]
+    return len(landmarks)
+
+
+def run_case(pose_detector, frames, num_frames, warmup):
+    """
+    Time process_image over frames (cycled), after warmup frames that are only timed as a whole
+    :return: dict with warmup_s, first_frame_ms, latency_ms, fps, persons_detected
+    """
+    start = time.perf_counter()
+    pose_detector.process_image(frames[0])
+    first_frame = time.perf_counter() - start
+    for index in range(1, warmup):
+        pose_detector.process_image(frames[index % len(frames)])
+    warmup_time = time.perf_counter() - start
+
+    latencies = []
+    persons = 0
+    timed_start = time.perf_counter()
+    for index in range(num_frames):
+        frame = frames[(warmup + index) % len(frames)]
+        frame_start = time.perf_counter()
+        pose_detector.process_image(frame)
+        latencies.append(time.perf_counter() - frame_start)
+        persons += detected_persons(pose_detector)
+    timed = time.perf_counter() - timed_start
+    return {"warmup_s": warmup_time, "first_frame_ms": first_frame * 1000,
+            "latency_ms": latency_summary(latencies), "fps": num_frames / timed if timed > 0 else 0.0,
+            "persons_detected": persons / num_frames}
+
+
+def run_backend(backend, spec):
+    """
+    Benchmark one backend in this process
+    :param spec: dict of clip, frames, warmup, widths, persons, options
+    :return: dict with startup_s and a list of cases
+    """
+    from .serve import DETECTORS
+    if spec["clip"]:
+        source_frames = load_clip_frames(spec["clip"], max(spec["frames"], 30))
+    else:
+        source_frames = synthetic_frames(max(spec["frames"], 30))
+    result = {"backend": backend, "rss_before_mb": peak_rss_mb()}
+    start = time.perf_counter()
+    pose_detector = DETECTORS[backend](**spec["options"].get(backend, {}))
+    result["startup_s"] = time.perf_counter() - start
+    result["settings"] = pose_detector.get_model_settings()
+    result["cases"] = []
+    for width in spec["widths"]:
+        for persons in spec["persons"]:
+            frames = [compose_frame(frame, persons, width) for frame in source_frames]
+            case = {"backend": backend, "width": width, "height": frames[0].shape[0], "persons": persons,
+                    "frames": spec["frames"]}
+            case.update(run_case(pose_detector, frames, spec["frames"], spec["warmup"]))
+            case["peak_rss_mb"] = peak_rss_mb()
+            case["startup_s"] = result["startup_s"]
+            print(f"  {backend} {width}x{case['height']} x{persons}: "
+                  f"p50 {case['latency_ms']['p50']:.1f}ms p95 {case['latency_ms']['p95']:.1f}ms "
+                  f"{case['fps']:.1f} fps, found {case['persons_detected']:.1f} persons", file=sys.stderr)
+            result["cases"].append(case)
+    return result
+
+
+def run_worker(backend, spec_json):
+    """ entry of the per backend subprocess, prints one RESULT_PREFIX line """
+    try:
+        result = run_backend(backend, json.loads(spec_json))
+    except Exception as e:
+        result = {"backend": backend, "error": f"{type(e).__name__}: {e}"}
+    print(RESULT_PREFIX + json.dumps(result, default=str), flush=True)
+    return 0
+
+
+def run_backend_process(backend, spec, timeout=None):
+    """ run_backend in a fresh python, so each backend has its own memory and libraries """
+    command = [sys.executable, "-m", "pose_detector.benchmark", "--worker", backend, "--spec", json.dumps(spec)]
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        completed = subprocess.run(command, cwd=package_parent, stdout=subprocess.PIPE, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"backend": backend, "error": f"timed out after {timeout}s"}
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    return {"backend": backend, "error": f"worker exited with {completed.returncode} and no result"}
+
+
+def metric_value(case, metric):
+    value = case
+    for key in metric.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Cases more than tolerance (fraction) worse than the same backend/width/persons in baseline
+    :return: list of regression descriptions, empty if none
+    """
+    baseline_cases = {(case["backend"], case["width"], case["persons"]): case for case in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        key = (case["backend"], case["width"], case["persons"])
+        old_case = baseline_cases.get(key)
+        if old_case is None:
+            continue
+        for metric, higher_is_worse, min_difference in COMPARED_METRICS:
+            old, new = metric_value(old_case, metric), metric_value(case, metric)
+            if old is None or new is None or old <= 0:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if higher_is_worse else change < -tolerance
+            if worse and abs(new - old) >= min_difference:
+                regressions.append(f"{case['backend']} {case['width']}px x{case['persons']}: "
+                                   f"{metric} {old:.2f} -> {new:.2f} ({100 * change:+.0f}%)")
+    return regressions
+
+
+def format_results(results):
+    lines = [f"{'backend':16} {'size':>10} {'persons':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+             f"{'fps':>7} {'warmup s':>8} {'rss MB':>8}"]
+    for case in results["cases"]:
+        latency = case["latency_ms"]
+        rss = case["peak_rss_mb"]
+        lines.append(f"{case['backend']:16} {case['width']:>5}x{case['height']:<4} {case['persons']:>7} "
+                     f"{latency['p50']:8.1f} {latency['p95']:8.1f} {latency['p99']:8.1f} {case['fps']:7.1f} "
+                     f"{case['warmup_s']:8.2f} {rss if rss is not None else float('nan'):8.0f}")
+    for backend, error in results["errors"].items():
+        lines.append(f"{backend:16} skipped: {error}")
+    return "\n".join(lines)
+
+
+def parse_int_list(text):
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def build_parser():
+    from .serve import DETECTORS
+    parser = argparse.ArgumentParser(prog="python -m pose_detector.benchmark",
+                                     description="Latency, throughput and memory of the pose detector backends")
+    parser.add_argument("--backends", default="all",
+                        help=f"comma separated, from {', '.join(sorted(DETECTORS))} (default all)")
+    parser.add_argument("--clip", help="video file to run on, synthetic frames if not given")
+    parser.add_argument("--widths", type=parse_int_list, default=list(DEFAULT_WIDTHS), help="frame widths, e.g. 320,640")
+    parser.add_argument("--persons", type=parse_int_list, default=list(DEFAULT_PERSONS),
+                        help="person counts, the clip is tiled this many times")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="timed frames per case")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="untimed frames before each case")
+    parser.add_argument("--options", default="{}",
+                        help='JSON constructor options per backend, e.g. {"movenet": {"num_poses": 4}}')
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results file, exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="fraction worse than the baseline that counts as a regression")
+    parser.add_argument("--save-baseline", help="also write the results here as the new baseline")
+    parser.add_argument("--timeout", type=float, help="seconds before a backend is given up on")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--spec", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.worker:
+        return run_worker(args.worker, args.spec)
+
+    from .serve import DETECTORS
+    backends = sorted(DETECTORS) if args.backends == "all" else args.backends.split(",")
+    unknown = [backend for backend in backends if backend not in DETECTORS]
+    if unknown:
+        print(f"benchmark: unknown backends {unknown}, choose from {sorted(DETECTORS)}")
+        return 2
+    spec = {"clip": os.path.abspath(args.clip) if args.clip else None, "frames": args.frames,
+            "warmup": args.warmup, "widths": args.widths, "persons": args.persons,
+            "options": json.loads(args.options)}
+
+    results = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "machine": machine_info(), "spec": spec,
+               "backends": {}, "cases": [], "errors": {}}
+    for backend in backends:
+        print(f"benchmark: {backend}", file=sys.stderr)
+        result = run_backend_process(backend, spec, args.timeout)
+        if "error" in result:
+            print(f"benchmark: {backend} skipped, {result['error']}", file=sys.stderr)
+            results["errors"][backend] = result["error"]
+            continue
+        results["backends"][backend] = {key: result[key] for key in ("startup_s", "rss_before_mb", "settings")}
+        results["cases"].extend(result["cases"])
+
+    with open(args.results, "w") as f:
+        json.dump(results, f, indent=2)
+    print(format_results(results))
+    print(f"benchmark: results in {args.results}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"benchmark: baseline saved to {args.save_baseline}")
+    if not results["cases"]:
+        return 2
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("machine", {}).get("node") != results["machine"]["node"]:
+            print(f"benchmark: baseline is from {baseline.get('machine', {}).get('node')}, "
+                  f"numbers from different machines don't compare")
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"benchmark: no regressions against {args.baseline} (tolerance {100 * args.tolerance:.0f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
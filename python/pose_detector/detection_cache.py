@@ -0,0 +1,182 @@
+"""
+DetectionCache memoizes the pose detections of a video file, so a clip that
+loops all day only pays for inference on its first pass (and not at all on
+later runs of the same clip with the same detector settings).
+
+Entries are keyed by (clip content hash, detector class, detector.get_model_settings(), frame index).
+Hits are served from an in-memory LRU of PoseRecords, backed by an on-disk store:
+    <cache_dir>/<key hash>/key.json            what the folder holds, for humans
+    <cache_dir>/<key hash>/<frame index>.pose  poserec file header + one record (see pose_recording)
+The disk store has a total size cap shared by every clip, the least recently used
+entries (by file mtime, touched on every hit) are deleted first.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from .pose_recording import (FILE_HEADER, MAGIC, SCHEMAS, VALUES_PER_LANDMARK, detector_num_landmarks,
+                             detector_pose_arrays, detector_schema, pack_record, unpack_record)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".pose2art", "detection_cache")
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024
+# a 30 second clip at 30 fps is 900 entries of a few KB each
+DEFAULT_MAX_MEMORY_ENTRIES = 10000
+ENTRY_SUFFIX = ".pose"
+
+
+def file_content_hash(path, chunk_size=1 << 20):
+    """ sha1 hex digest of a file's bytes, so renamed or copied clips still hit the cache """
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def detector_cache_key(pose_detector):
+    """ the part of the cache key that identifies the backend and its settings """
+    detector_class = type(pose_detector)
+    return {"backend": f"{detector_class.__module__}.{detector_class.__qualname__}",
+            "settings": pose_detector.get_model_settings()}
+
+
+class DetectionCache:
+    """
+    Detection results of one clip for one detector configuration, looked up by frame index.
+    get() and put() are called from the pipeline inference thread.
+    """
+    def __init__(self, clip_path, pose_detector, cache_dir=DEFAULT_CACHE_DIR,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES, max_memory_entries=DEFAULT_MAX_MEMORY_ENTRIES,
+                 pipeline_settings=None):
+        """
+        :param clip_path: the video file, hashed once here (a 50MB clip takes a fraction of a second)
+        :param pose_detector: detector whose class and get_model_settings() go into the key
+        :param cache_dir: root of the on-disk store, shared by all clips
+        :param max_disk_bytes: size cap of everything under cache_dir
+        :param max_memory_entries: frames kept in memory
+        :param pipeline_settings: dict of anything else that changes the results, e.g. the inference size
+        """
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_entries = max_memory_entries
+        self.num_landmarks = detector_num_landmarks(pose_detector)
+        self.schema = detector_schema(pose_detector)
+        self.clip_hash = file_content_hash(clip_path)
+
+        key = {"clip": self.clip_hash, **detector_cache_key(pose_detector),
+               "pipeline": pipeline_settings or {}}
+        key_json = json.dumps(key, sort_keys=True, default=str)
+        self.directory = os.path.join(cache_dir, hashlib.sha1(key_json.encode()).hexdigest()[:20])
+        os.makedirs(self.directory, exist_ok=True)
+        key_path = os.path.join(self.directory, "key.json")
+        if not os.path.exists(key_path):
+            with open(key_path, "w") as f:
+                json.dump({**key, "clip_path": clip_path}, f, indent=2, default=str)
+
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    def _entry_path(self, frame_index):
+        return os.path.join(self.directory, f"{frame_index}{ENTRY_SUFFIX}")
+
+    def _disk_entries(self):
+        """ (mtime, path, size) of every entry of every clip under cache_dir """
+        entries = []
+        for folder in os.scandir(self.cache_dir):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _remember(self, frame_index, record):
+        self.memory[frame_index] = record
+        self.memory.move_to_end(frame_index)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, frame_index):
+        """
+        Cached detection of a frame
+        :return: PoseRecord, or None if the frame has not been detected yet
+        """
+        with self.lock:
+            record = self.memory.get(frame_index)
+            if record is not None:
+                self.memory.move_to_end(frame_index)
+                self.hits += 1
+                return record
+
+            path = self._entry_path(frame_index)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                magic, num_landmarks, values, _ = FILE_HEADER.unpack_from(data, 0)
+                if magic != MAGIC or num_landmarks != self.num_landmarks or values != VALUES_PER_LANDMARK:
+                    raise ValueError("entry does not match this detector")
+                record, end = unpack_record(data, FILE_HEADER.size, self.num_landmarks)
+                if end != len(data):
+                    raise ValueError("truncated entry")
+                os.utime(path)  # mark as recently used for disk eviction
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            except Exception as e:
+                print(f"Detection cache: dropping bad entry {path}: {e}")
+                self._remove(path)
+                self.misses += 1
+                return None
+            self._remember(frame_index, record)
+            self.hits += 1
+            return record
+
+    def put(self, frame_index, pose_detector):
+        """ store the detector's last result as the detection of frame_index """
+        landmarks, confidence, bbox, width, height = detector_pose_arrays(pose_detector, self.num_landmarks)
+        data = (FILE_HEADER.pack(MAGIC, self.num_landmarks, VALUES_PER_LANDMARK, SCHEMAS.index(self.schema))
+                + pack_record(frame_index, 0.0, landmarks, confidence, bbox, width, height, self.num_landmarks))
+        record, _ = unpack_record(data, FILE_HEADER.size, self.num_landmarks)
+        with self.lock:
+            self._remember(frame_index, record)
+            path = self._entry_path(frame_index)
+            # write then rename, so another run on the same clip never reads half an entry
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"Detection cache: cannot write {path}: {e}")
+                return
+            self.disk_bytes += len(data)
+            if self.disk_bytes > self.max_disk_bytes:
+                self._evict()
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.disk_bytes -= size
+        except OSError:
+            pass
+
+    def _evict(self):
+        # rescan so entries written by other runs are counted, then drop the oldest down to 90% of the cap
+        entries = sorted(self._disk_entries())
+        self.disk_bytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self.disk_bytes <= self.max_disk_bytes * 0.9:
+                break
+            self._remove(path)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
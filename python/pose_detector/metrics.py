@@ -0,0 +1,276 @@
+"""
+Metrics for the pose pipeline: where does frame time go on the production box.
+
+MetricsRegistry holds
+    latency histograms per stage (read, inference, osc_encode, osc_send, ndi_convert, ndi_send, ...)
+    counters (frames per stage, OSC errors...), turned into per second rates (fps) by snapshot()
+    gauges (queue depths, dropped frames), filled in by collectors just before each snapshot
+MetricsReporter snapshots the registry every interval on its own thread and sends
+/stats/... OSC messages, appends CSV or JSON lines to a log file and prints a
+console summary at a (slower) console interval.
+
+log_limited() replaces per-frame prints: the first message of a kind is printed,
+repeats are counted and summarized at most once per interval.
+"""
+
+import csv
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# histogram buckets: 10 per decade from 10us to 100s, plus under/overflow
+HISTOGRAM_MIN = 1e-5
+HISTOGRAM_DECADES = 7
+BUCKETS_PER_DECADE = 10
+NUM_BUCKETS = HISTOGRAM_DECADES * BUCKETS_PER_DECADE + 2
+PERCENTILES = (50, 95, 99)
+
+
+def bucket_upper_bound(index):
+    """ upper edge in seconds of histogram bucket index """
+    return HISTOGRAM_MIN * 10 ** (index / BUCKETS_PER_DECADE)
+
+
+class LatencyHistogram:
+    """ log bucketed latency histogram, percentiles are accurate to a bucket (~26%) """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        if seconds <= HISTOGRAM_MIN:
+            index = 0
+        else:
+            index = min(int(math.log10(seconds / HISTOGRAM_MIN) * BUCKETS_PER_DECADE) + 1, NUM_BUCKETS - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """ upper bound of the bucket holding the given percentile, seconds """
+        if self.count == 0:
+            return 0.0
+        target = self.count * percent / 100
+        running = 0
+        for index, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+    def summary(self):
+        """ dict of count, mean, percentiles and max, times in milliseconds """
+        result = {"count": self.count,
+                  "mean_ms": 1000 * self.total / self.count if self.count else 0.0}
+        for percent in PERCENTILES:
+            result[f"p{percent}_ms"] = 1000 * self.percentile(percent)
+        result["max_ms"] = 1000 * self.max
+        return result
+
+
+class MetricsRegistry:
+    """ thread safe, every pipeline stage records into the same registry """
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+        self._last_counters = {}
+        self._last_time = time.perf_counter()
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    @contextmanager
+    def time(self, name):
+        """ with metrics.time("inference"): ... records the block's duration """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def increment(self, name, count=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def add_collector(self, collector):
+        """ collector(registry) is called before every snapshot, e.g. to set queue depth gauges """
+        self.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        if collector in self.collectors:
+            self.collectors.remove(collector)
+
+    def snapshot(self, reset=True):
+        """
+        Everything since the last snapshot
+        :param reset: start new histograms and rates for the next interval
+        :return: dict with interval (s), latency {name: summary}, counters, rates (per second), gauges
+        """
+        for collector in list(self.collectors):
+            collector(self)
+        now = time.perf_counter()
+        with self.lock:
+            interval = max(now - self._last_time, 1e-9)
+            rates = {name: (value - self._last_counters.get(name, 0)) / interval
+                     for name, value in self.counters.items()}
+            result = {
+                "time": time.time(),
+                "interval": interval,
+                "latency": {name: histogram.summary() for name, histogram in self.histograms.items()},
+                "counters": dict(self.counters),
+                "rates": rates,
+                "gauges": dict(self.gauges),
+            }
+            if reset:
+                for histogram in self.histograms.values():
+                    histogram.reset()
+                self._last_counters = dict(self.counters)
+                self._last_time = now
+        return result
+
+
+def flatten_snapshot(snapshot):
+    """ snapshot as flat {"latency/inference/p95_ms": value, ...}, for CSV columns and OSC addresses """
+    flat = {"time": snapshot["time"], "interval": snapshot["interval"]}
+    for name, summary in snapshot["latency"].items():
+        for field, value in summary.items():
+            flat[f"latency/{name}/{field}"] = value
+    for group in ("counters", "rates", "gauges"):
+        for name, value in snapshot[group].items():
+            flat[f"{group}/{name}"] = value
+    return flat
+
+
+def format_snapshot(snapshot):
+    """ one console line: fps per counter, mean/p95 per stage, gauges """
+    rates = " ".join(f"{name} {value:.1f}/s" for name, value in sorted(snapshot["rates"].items()))
+    latency = " ".join(f"{name} {summary['mean_ms']:.1f}/{summary['p95_ms']:.1f}ms"
+                       for name, summary in sorted(snapshot["latency"].items()) if summary["count"])
+    # idle queues and zero drops are the normal case, only list the others
+    gauges = " ".join(f"{name} {value:g}" for name, value in sorted(snapshot["gauges"].items()) if value)
+    return f"{rates} | mean/p95 {latency} | {gauges}"
+
+
+class MetricsReporter:
+    """
+    Snapshots a MetricsRegistry every interval seconds and publishes it:
+    OSC /stats/<group>/<name>[/<field>] to osc_client (or whatever get_osc_client() returns),
+    a CSV (.csv) or JSON lines (any other extension) log file, and a console line every console_interval.
+    """
+    def __init__(self, metrics, interval=1.0, osc_client=None, get_osc_client=None,
+                 osc_prefix="/stats", log_path=None, console_interval=10.0):
+        """
+        :param metrics: MetricsRegistry
+        :param interval: seconds between snapshots
+        :param osc_client: send /stats messages here, None for no OSC
+        :param get_osc_client: alternative to osc_client, called each interval (for a client that changes)
+        :param osc_prefix: address prefix, e.g. "/cam1/stats"
+        :param log_path: .csv or .jsonl file to append to, None for no log
+        :param console_interval: seconds between console lines, 0 for none
+        """
+        self.metrics = metrics
+        self.interval = interval
+        self.osc_client = osc_client
+        self.get_osc_client = get_osc_client
+        self.osc_prefix = osc_prefix
+        self.log_path = log_path
+        self.console_interval = console_interval
+        self.last_snapshot = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._csv_columns = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="pose-metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+
+    def _run(self):
+        last_console = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            snapshot = self.metrics.snapshot()
+            self.last_snapshot = snapshot
+            self.publish(snapshot)
+            now = time.perf_counter()
+            if self.console_interval and now - last_console >= self.console_interval:
+                print("stats:", format_snapshot(snapshot))
+                last_console = now
+
+    def publish(self, snapshot):
+        """ send a snapshot over OSC and append it to the log """
+        osc_client = self.get_osc_client() if self.get_osc_client is not None else self.osc_client
+        flat = flatten_snapshot(snapshot)
+        if osc_client is not None:
+            try:
+                for name, value in flat.items():
+                    if name != "time":
+                        osc_client.send_message(f"{self.osc_prefix}/{name}", float(value))
+            except Exception as e:
+                log_limited("stats-osc", f"Error: Cannot send OSC stats {e}")
+        if self.log_path:
+            try:
+                self._append_log(snapshot, flat)
+            except OSError as e:
+                log_limited("stats-log", f"Error: Cannot write stats log {self.log_path}: {e}")
+
+    def _append_log(self, snapshot, flat):
+        if not self.log_path.lower().endswith(".csv"):
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(snapshot) + "\n")
+            return
+        # CSV columns are fixed by the first row; stages that show up later go in a new header
+        columns = sorted(flat)
+        new_header = columns != self._csv_columns
+        self._csv_columns = columns
+        with open(self.log_path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            if new_header:
+                writer.writeheader()
+            writer.writerow(flat)
+
+
+_log_lock = threading.Lock()
+_log_state = {}
+
+
+def log_limited(key, message, interval=10.0):
+    """
+    print(message), at most once per interval for each key; repeats in between are
+    counted and reported with the next message that gets through.
+    """
+    now = time.monotonic()
+    with _log_lock:
+        last_time, suppressed = _log_state.get(key, (None, 0))
+        if last_time is not None and now - last_time < interval:
+            _log_state[key] = (last_time, suppressed + 1)
+            return
+        _log_state[key] = (now, 0)
+    if suppressed:
+        message = f"{message} ({suppressed} more in the last {now - last_time:.0f}s)"
+    print(message)
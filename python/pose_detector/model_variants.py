@@ -0,0 +1,307 @@
+"""
+Pick the fastest model variant that is still accurate enough, measured on this machine
+with a calibration clip of the installation.
+
+    python -m pose_detector.model_variants --clip gallery.mp4 --model-dir models --floor 0.9
+    python -m pose_detector.model_variants --clip gallery.mp4 --variants variants.json
+    python -m pose_detector.serve --model-selection ~/.pose2art/model_selection.json ...
+
+Run from the python folder. A variant is a serve backend plus its constructor options:
+    {"name": "yolov8n-pose-int8", "backend": "yolo", "options": {"model_path": "models/yolov8n-pose-int8.onnx"},
+     "precision": "int8"}
+--variants is a JSON list of those, --model-dir finds them by file type and name:
+    *.tflite -> movenet-tflite, *.onnx -> yolo, *.task -> mediapipe-multi,
+    precision from the name (int8 / quant, fp16 / float16, else fp32)
+--mediapipe adds the single person MediaPipe model_complexity 0/1/2 (lite/full/heavy).
+
+Every variant runs over the same frames of the clip. Its accuracy is the share of the
+reference variant's keypoints it puts within PCK_THRESHOLD of the person's size (PCK).
+There is one reference for all variants, so the floor holds across backends: --reference,
+or the first variant listed (list the full precision, heaviest model first; --mediapipe
+puts MediaPipe heavy first). Backends with different landmark sets are compared on the
+17 COCO keypoints they share (COCO_KEYPOINTS). The fastest variant (p50 latency) with
+accuracy at or above --floor is selected, written with all measurements to --output.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from .benchmark import latency_summary, load_clip_frames, machine_info
+
+PRECISION_FP32 = "fp32"
+PRECISION_FP16 = "fp16"
+PRECISION_INT8 = "int8"
+DEFAULT_ACCURACY_FLOOR = 0.9
+DEFAULT_FRAMES = 150
+DEFAULT_WARMUP = 5
+DEFAULT_SELECTION_PATH = os.path.join(os.path.expanduser("~"), ".pose2art", "model_selection.json")
+# a keypoint counts as right within this fraction of the reference person's box diagonal
+PCK_THRESHOLD = 0.1
+# reference keypoints below this visibility are not scored
+MIN_VISIBILITY = 0.5
+
+# landmarks per person -> indices of the 17 COCO keypoints (MoveNet / YOLO order) in that landmark set
+COCO_KEYPOINTS = {
+    17: list(range(17)),
+    33: [0, 2, 5, 7, 8, 11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28],   # MediaPipe
+    25: [0, 16, 15, 18, 17, 5, 2, 6, 3, 7, 4, 12, 9, 13, 10, 14, 11],      # OpenPose BODY_25
+}
+
+# model file extension -> serve backend
+BACKEND_BY_EXTENSION = {".tflite": "movenet-tflite", ".onnx": "yolo", ".task": "mediapipe-multi"}
+MEDIAPIPE_COMPLEXITY_VARIANTS = [
+    {"name": "mediapipe-heavy", "backend": "mediapipe", "options": {"model_complexity": 2}, "precision": PRECISION_FP32},
+    {"name": "mediapipe-full", "backend": "mediapipe", "options": {"model_complexity": 1}, "precision": PRECISION_FP32},
+    {"name": "mediapipe-lite", "backend": "mediapipe", "options": {"model_complexity": 0}, "precision": PRECISION_FP32},
+]
+
+
+def precision_from_name(path):
+    name = os.path.basename(path).lower()
+    if "int8" in name or "quant" in name:
+        return PRECISION_INT8
+    if "fp16" in name or "float16" in name or name.endswith(".task"):
+        # MediaPipe's .task bundles are float16 models
+        return PRECISION_FP16
+    return PRECISION_FP32
+
+
+def find_variants(model_dir, include_mediapipe=False):
+    """
+    Variants for the model files in model_dir, heaviest and most precise first within each backend
+    :return: list of variant dicts
+    """
+    variants = list(MEDIAPIPE_COMPLEXITY_VARIANTS) if include_mediapipe else []
+    precision_rank = {PRECISION_FP32: 0, PRECISION_FP16: 1, PRECISION_INT8: 2}
+    found = []
+    for name in os.listdir(model_dir):
+        backend = BACKEND_BY_EXTENSION.get(os.path.splitext(name)[1].lower())
+        if backend is None:
+            continue
+        path = os.path.join(model_dir, name)
+        found.append({"name": os.path.splitext(name)[0], "backend": backend,
+                      "options": {"model_path": path}, "precision": precision_from_name(path)})
+    # bigger files first (heavy/thunder before lite/lightning), then by precision
+    found.sort(key=lambda variant: (variant["backend"], precision_rank[variant["precision"]],
+                                    -os.path.getsize(variant["options"]["model_path"])))
+    return variants + found
+
+
+def load_variants(path):
+    with open(path) as f:
+        variants = json.load(f)
+    for variant in variants:
+        variant.setdefault("options", {})
+        variant.setdefault("precision", precision_from_name(variant["options"].get("model_path", "")))
+        variant.setdefault("name", f"{variant['backend']}-{variant['precision']}")
+    return variants
+
+
+def pose_agreement(reference, landmarks, threshold=PCK_THRESHOLD):
+    """
+    How many of the reference's visible keypoints landmarks reproduces (PCK)
+    :param reference: (P, K, 4) landmarks of the reference variant
+    :param landmarks: (Q, K, 4) landmarks of the variant, people in any order
+    :return: (keypoints within threshold, visible reference keypoints)
+    """
+    visible = reference[:, :, 3] >= MIN_VISIBILITY
+    total = int(visible.sum())
+    if total == 0 or len(landmarks) == 0:
+        return 0, total
+    reference_xy, xy = reference[:, :, :2], landmarks[:, :, :2]
+    # match people by centroid, greedy closest pair first
+    distances = np.linalg.norm(reference_xy.mean(axis=1)[:, np.newaxis] - xy.mean(axis=1)[np.newaxis], axis=2)
+    matched = {}
+    for flat in np.argsort(distances, axis=None):
+        reference_id, other_id = divmod(int(flat), len(landmarks))
+        if reference_id not in matched and other_id not in matched.values():
+            matched[reference_id] = other_id
+    correct = 0
+    for reference_id, other_id in matched.items():
+        points = reference_xy[reference_id][visible[reference_id]]
+        if len(points) == 0:
+            continue
+        size = max(float(np.linalg.norm(points.max(axis=0) - points.min(axis=0))), 1e-3)
+        errors = np.linalg.norm(xy[other_id][visible[reference_id]] - points, axis=1)
+        correct += int((errors <= threshold * size).sum())
+    return correct, total
+
+
+def comparable_landmarks(reference, landmarks):
+    """
+    reference and landmarks on the keypoints they share
+    :param reference: (P, K, 4) landmarks of the reference variant
+    :param landmarks: (Q, L, 4) landmarks of another variant
+    :return: (reference, landmarks) with the same keypoints, None if the landmark sets can't be matched
+    """
+    if reference.shape[1] == landmarks.shape[1]:
+        return reference, landmarks
+    reference_keypoints = COCO_KEYPOINTS.get(reference.shape[1])
+    keypoints = COCO_KEYPOINTS.get(landmarks.shape[1])
+    if reference_keypoints is None or keypoints is None:
+        return None
+    return reference[:, reference_keypoints], landmarks[:, keypoints]
+
+
+def run_variant(variant, frames, warmup=DEFAULT_WARMUP):
+    """
+    Run one variant over frames
+    :return: (list of (P, K, 4) landmark arrays per frame, latencies in seconds, startup seconds)
+    """
+    from .pose_recording import detector_num_landmarks, detector_pose_arrays
+    from .serve import DETECTORS
+    start = time.perf_counter()
+    pose_detector = DETECTORS[variant["backend"]](**variant["options"])
+    startup = time.perf_counter() - start
+    num_landmarks = detector_num_landmarks(pose_detector)
+    for frame in frames[:warmup]:
+        pose_detector.process_image(frame)
+    results, latencies = [], []
+    for frame in frames:
+        frame_start = time.perf_counter()
+        pose_detector.process_image(frame)
+        latencies.append(time.perf_counter() - frame_start)
+        results.append(np.array(detector_pose_arrays(pose_detector, num_landmarks)[0], dtype=np.float32))
+    if hasattr(pose_detector, "close"):
+        pose_detector.close()
+    return results, latencies, startup
+
+
+def select_variant(measured, accuracy_floor=DEFAULT_ACCURACY_FLOOR):
+    """
+    Fastest measured variant with accuracy >= accuracy_floor, the most accurate one if none is
+    :param measured: list of variant dicts with latency_ms and accuracy, as calibrate makes them
+    :return: the chosen variant dict, None if nothing could be measured
+    """
+    usable = [variant for variant in measured if variant.get("accuracy") is not None]
+    if not usable:
+        return None
+    good_enough = [variant for variant in usable if variant["accuracy"] >= accuracy_floor]
+    if good_enough:
+        return min(good_enough, key=lambda variant: variant["latency_ms"]["p50"])
+    return max(usable, key=lambda variant: (variant["accuracy"], -variant["latency_ms"]["p50"]))
+
+
+def calibrate(variants, frames, accuracy_floor=DEFAULT_ACCURACY_FLOOR, reference=None, warmup=DEFAULT_WARMUP):
+    """
+    Measure every variant on frames and select one
+    :param variants: list of variant dicts
+    :param frames: BGR frames of the calibration clip
+    :param reference: name of the variant every variant is scored against, default the first one
+    :return: results dict with reference, variants (measured), errors, selected
+    """
+    reference = reference or variants[0]["name"]
+    if reference not in [variant["name"] for variant in variants]:
+        raise ValueError(f"reference {reference} is not one of the variants")
+
+    measured, errors, outputs = [], {}, {}
+    for variant in variants:
+        print(f"model_variants: running {variant['name']}", file=sys.stderr)
+        try:
+            outputs[variant["name"]], latencies, startup = run_variant(variant, frames, warmup)
+        except Exception as e:
+            print(f"model_variants: {variant['name']} skipped, {e}", file=sys.stderr)
+            errors[variant["name"]] = f"{type(e).__name__}: {e}"
+            continue
+        total = sum(latencies)
+        measured.append(dict(variant, reference=reference, startup_s=startup,
+                             latency_ms=latency_summary(latencies), fps=len(latencies) / total if total else 0.0,
+                             persons=float(np.mean([len(landmarks) for landmarks in outputs[variant["name"]]]))))
+
+    reference_output = outputs.get(reference)
+    if reference_output is None:
+        print(f"model_variants: the reference {reference} did not run, nothing can be scored", file=sys.stderr)
+    for variant in measured:
+        if reference_output is None:
+            variant["accuracy"] = None
+            continue
+        correct = total = 0
+        for reference_landmarks, landmarks in zip(reference_output, outputs[variant["name"]]):
+            comparable = comparable_landmarks(reference_landmarks, landmarks)
+            if comparable is None:
+                break
+            frame_correct, frame_total = pose_agreement(*comparable)
+            correct += frame_correct
+            total += frame_total
+        variant["accuracy"] = correct / total if total else None
+
+    selected = select_variant(measured, accuracy_floor)
+    return {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "machine": machine_info(),
+            "accuracy_floor": accuracy_floor, "frames": len(frames), "reference": reference,
+            "variants": measured, "errors": errors,
+            "selected": selected["name"] if selected else None}
+
+
+def load_selection(path=DEFAULT_SELECTION_PATH):
+    """
+    The selected variant of a calibrate results file
+    :return: (backend, options)
+    """
+    with open(path) as f:
+        results = json.load(f)
+    for variant in results["variants"]:
+        if variant["name"] == results["selected"]:
+            return variant["backend"], dict(variant["options"])
+    raise ValueError(f"{path} has no selected model variant")
+
+
+def format_results(results):
+    lines = [f"{'variant':28} {'backend':16} {'precision':9} {'p50 ms':>8} {'p95 ms':>8} {'fps':>7} {'accuracy':>8}"]
+    for variant in results["variants"]:
+        accuracy = variant["accuracy"]
+        mark = " <- selected" if variant["name"] == results["selected"] else ""
+        lines.append(f"{variant['name']:28} {variant['backend']:16} {variant['precision']:9} "
+                     f"{variant['latency_ms']['p50']:8.1f} {variant['latency_ms']['p95']:8.1f} {variant['fps']:7.1f} "
+                     f"{'-' if accuracy is None else f'{100 * accuracy:.1f}%':>8}{mark}")
+    for name, error in results["errors"].items():
+        lines.append(f"{name:28} skipped: {error}")
+    return "\n".join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m pose_detector.model_variants",
+                                     description="Select the fastest model variant above an accuracy floor")
+    parser.add_argument("--clip", required=True, help="calibration video, people moving like in the installation")
+    parser.add_argument("--variants", help="JSON list of variants")
+    parser.add_argument("--model-dir", help="find variants from the model files in this folder")
+    parser.add_argument("--mediapipe", action="store_true", help="add MediaPipe model_complexity 0/1/2")
+    parser.add_argument("--reference", help="variant every variant is scored against (default the first listed)")
+    parser.add_argument("--floor", type=float, default=DEFAULT_ACCURACY_FLOOR, help="minimum accuracy, 0-1")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="clip frames to run")
+    parser.add_argument("--output", default=DEFAULT_SELECTION_PATH, help="write the results and selection here")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    variants = []
+    if args.variants:
+        variants += load_variants(args.variants)
+    if args.model_dir:
+        variants += find_variants(args.model_dir, args.mediapipe)
+    elif args.mediapipe:
+        variants += list(MEDIAPIPE_COMPLEXITY_VARIANTS)
+    if not variants:
+        print("model_variants: no variants, give --variants, --model-dir or --mediapipe")
+        return 2
+
+    results = calibrate(variants, load_clip_frames(args.clip, args.frames), args.floor, args.reference)
+    results["clip"] = os.path.abspath(args.clip)
+    print(format_results(results))
+    if results["selected"] is None:
+        print("model_variants: no variant could be measured")
+        return 1
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"model_variants: selected {results['selected']}, written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
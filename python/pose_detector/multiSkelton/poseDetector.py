@@ -1,7 +1,14 @@
 import cv2
-import mediapipe as mp
+import numpy as np
 from pythonosc import udp_client
 
+from pose_detector.osc_bundle import DEFAULT_MAX_DATAGRAM_SIZE, osc_sink
+from pose_detector.osc_encoder import LandmarkOscEncoder
+from pose_detector.pose_encoding import POSE_FORMAT_LANDMARKS, encode_pose
+
+# x, y, visibility: what the per landmark messages of 2D models carry instead of x, y, z
+LANDMARK_COLUMNS_2D = [0, 1, 3]
+
 # Define landmark names (MediaPipe's 33 landmarks)
 # This mapping is crucial for consistent OSC addressing
 LANDMARK_NAMES = [
@@ -18,106 +25,306 @@ LANDMARK_NAMES = [
 class PoseData:
     """
     A simple data structure to hold pose information for a single person.
+    Returned by PoseDetector.detected_poses as a view into the detector's PoseFrame.
     """
     def __init__(self, landmarks, confidence=None, bbox=None):
-        # landmarks: List of MediaPipe NormalizedLandmark objects or similar
+        # landmarks: (K, 4) array of x, y, z, visibility rows (a view into PoseFrame.landmarks)
         self.landmarks = landmarks
         # confidence: Overall pose confidence (float)
         self.confidence = confidence
         # bbox: Normalized bounding box [x_min, y_min, width, height] (list of floats)
         self.bbox = bbox
 
+class PoseFrame:
+    """
+    All people detected in one image, held in contiguous numpy arrays
+    instead of a python object per landmark.
+
+    landmarks:  (persons, K, 4) float32, columns x, y, z, visibility/confidence, normalized 0-1
+    confidence: (persons,) float32 overall pose confidence, NaN if the model has none
+    bbox:       (persons, 4) float32 [x_min, y_min, width, height] normalized, NaN if unknown
+
+    The properties are views of the first num_persons rows of preallocated buffers,
+    so a detector can reuse one PoseFrame for every image (see PoseDetector.reuse_pose_frame).
+    """
+    __slots__ = ('_landmarks', '_confidence', '_bbox', 'num_persons')
+
+    def __init__(self, max_persons=1, num_landmarks=len(LANDMARK_NAMES)):
+        self._allocate(max_persons, num_landmarks)
+        self.num_persons = 0
+
+    def _allocate(self, max_persons, num_landmarks):
+        max_persons = max(1, max_persons)
+        self._landmarks = np.zeros((max_persons, num_landmarks, 4), dtype=np.float32)
+        self._confidence = np.full(max_persons, np.nan, dtype=np.float32)
+        self._bbox = np.full((max_persons, 4), np.nan, dtype=np.float32)
+
+    def reset(self, num_persons, num_landmarks):
+        """
+        Prepare for num_persons people of num_landmarks each, growing the buffers only if needed.
+        Landmarks are left for the caller to fill, confidence and bbox are cleared to NaN.
+        """
+        capacity, current_landmarks, _ = self._landmarks.shape
+        if num_persons > capacity or num_landmarks != current_landmarks:
+            self._allocate(max(num_persons, capacity), num_landmarks)
+        self.num_persons = num_persons
+        self._confidence[:num_persons] = np.nan
+        self._bbox[:num_persons] = np.nan
+        return self
+
+    @property
+    def landmarks(self):
+        return self._landmarks[:self.num_persons]
+
+    @property
+    def confidence(self):
+        return self._confidence[:self.num_persons]
+
+    @property
+    def bbox(self):
+        return self._bbox[:self.num_persons]
+
+    @property
+    def num_landmarks(self):
+        return self._landmarks.shape[1]
+
+    def __len__(self):
+        return self.num_persons
+
+    def select(self, mask):
+        """
+        Keep only the people where mask is True, compacting them to the front in place
+        :param mask: boolean array of length num_persons
+        """
+        keep = np.flatnonzero(mask)
+        count = len(keep)
+        self._landmarks[:count] = self._landmarks[keep]
+        self._confidence[:count] = self._confidence[keep]
+        self._bbox[:count] = self._bbox[keep]
+        self.num_persons = count
+        return self
+
+    def copy(self):
+        """ independent copy holding just the current people """
+        other = PoseFrame(self.num_persons, self.num_landmarks)
+        other.num_persons = self.num_persons
+        other._landmarks[:self.num_persons] = self.landmarks
+        other._confidence[:self.num_persons] = self.confidence
+        other._bbox[:self.num_persons] = self.bbox
+        return other
+
+    def get_pose(self, person_id):
+        """ PoseData view of one person, None for missing confidence/bbox """
+        confidence = self._confidence[person_id]
+        bbox = self._bbox[person_id]
+        return PoseData(landmarks=self._landmarks[person_id],
+                        confidence=None if np.isnan(confidence) else float(confidence),
+                        bbox=None if np.isnan(bbox).any() else bbox.tolist())
+
 class PoseDetector:
     """
     Base class for pose detection. Subclasses will implement specific ML models.
+    Subclasses fill a PoseFrame (see new_pose_frame) and return it from process_image.
     """
     def __init__(self):
-        self.detected_poses = []  # List of PoseData objects, one for each person
+        self.pose_frame = None  # PoseFrame holding everybody in the last processed image
+        # False when process_image returned the previous result again (asynchronous detectors
+        # that haven't finished a newer frame yet), so nothing new needs sending
+        self.has_new_result = True
+        # Asynchronous detectors: timestamp (ms) given to the frame handed over by the last
+        # process_image, and the one of the frame the current result belongs to, so callers can
+        # match the result to what they submitted. None for detectors that answer synchronously.
+        self.submitted_timestamp_ms = None
+        self.result_timestamp_ms = None
+        # Reuse the same PoseFrame arrays every image. Turn off if results are kept across frames
+        self.reuse_pose_frame = True
+        # Pairs of landmark indices drawn as skeleton lines, None draws only the points
+        self.connections = None
         self.image_width = 0
         self.image_height = 0
         self.num_landmarks_per_person = len(LANDMARK_NAMES)
+        # False for 2D models (MoveNet, OpenPose, YOLO): z is always 0, and their
+        # /personN/landmark/<name> messages send the keypoint confidence in its place
+        self.has_depth = True
+        # Send each frame as timetagged OSC bundle(s), split at max datagram size
+        self.osc_bundle = False
+        self.osc_max_datagram_size = DEFAULT_MAX_DATAGRAM_SIZE
+        # POSE_FORMAT_LANDMARKS sends /personN/landmark/<name> per landmark,
+        # the compact formats send one /personN/pose message per person (see pose_encoding)
+        self.osc_pose_format = POSE_FORMAT_LANDMARKS
+        # Per landmark messages from precompiled address/type tag bytes (see osc_encoder)
+        self.osc_precompiled = True
+        self.landmark_encoder = None
+        # Prepended to every OSC address, e.g. "/cam1" gives /cam1/person0/...
+        self.osc_address_prefix = ""
+
+    @property
+    def detected_poses(self):
+        """ List of PoseData, one for each person (views into self.pose_frame) """
+        if self.pose_frame is None:
+            return []
+        return [self.pose_frame.get_pose(person_id) for person_id in range(self.pose_frame.num_persons)]
+
+    def new_pose_frame(self, num_persons):
+        """
+        Returns the PoseFrame a subclass should fill for the current image,
+        the preallocated one when reuse_pose_frame is set, otherwise a fresh one.
+        """
+        if self.pose_frame is None or not self.reuse_pose_frame:
+            self.pose_frame = PoseFrame(num_persons, self.num_landmarks_per_person)
+        return self.pose_frame.reset(num_persons, self.num_landmarks_per_person)
 
     def process_image(self, image):
         """
         Abstract method to be implemented by subclasses.
-        Processes an image to detect poses and populates self.detected_poses.
+        Processes an image to detect poses and populates self.pose_frame.
+        Returns the PoseFrame (len() is the number of people found).
         """
         raise NotImplementedError("Subclasses must implement process_image()")
 
+    def get_model_settings(self):
+        """
+        Settings that change what process_image returns (model file, num_poses, thresholds...).
+        Together with the class name they identify cached detections, see detection_cache.
+        Subclasses add their own settings.
+        """
+        return {"num_landmarks": self.num_landmarks_per_person}
+
+    def load_pose_arrays(self, landmarks, confidence, bbox, image_width, image_height):
+        """
+        Make a stored result (cache or recording) the current detection, as if process_image produced it.
+        Returns the PoseFrame, like process_image.
+        """
+        self.image_width, self.image_height = image_width, image_height
+        self.has_new_result = True
+        frame = self.new_pose_frame(len(landmarks))
+        frame.landmarks[:] = landmarks
+        frame.confidence[:] = confidence
+        frame.bbox[:] = bbox
+        return frame
+
+    def map_to_frame(self, left, top, width, height, frame_width, frame_height):
+        """
+        The last image was a crop of a bigger frame (see pose_detector.roi):
+        convert self.pose_frame to normalized coordinates of the full frame.
+        Crop position and size are normalized to the full frame.
+        """
+        self.image_width, self.image_height = frame_width, frame_height
+        frame = self.pose_frame
+        if frame is None or len(frame) == 0:
+            return
+        scale = np.array([width, height, width], dtype=np.float32)
+        frame.landmarks[:, :, :3] *= scale
+        frame.landmarks[:, :, :2] += (left, top)
+        frame.bbox[:] *= (width, height, width, height)
+        frame.bbox[:, :2] += (left, top)
+
     def send_landmarks_via_osc(self, osc_client: udp_client.SimpleUDPClient):
         """
         Sends detected multi-person pose landmarks via OSC.
+        With osc_bundle set, the frame goes out as one timetagged bundle, split into several
+        if it won't fit one datagram. With a compact osc_pose_format each bundle holds whole
+        persons; per landmark messages take more than a datagram per person and are split.
         """
         if not osc_client:
             print("OSC client not initialized.")
             return
+        sink = self.get_osc_sink(osc_client)
+        bundler = sink if sink is not osc_client else None
+        frame = self.pose_frame
+        num_persons = len(frame) if frame is not None else 0
+        prefix = self.osc_address_prefix
 
         # Send global frame info
-        osc_client.send_message("/image-height", self.image_height)
-        osc_client.send_message("/image-width", self.image_width)
-        osc_client.send_message("/numLandmarks", self.num_landmarks_per_person)
-        osc_client.send_message("/numPersons", len(self.detected_poses))
+        sink.send_message(f"{prefix}/image-height", self.image_height)
+        sink.send_message(f"{prefix}/image-width", self.image_width)
+        sink.send_message(f"{prefix}/numLandmarks", self.num_landmarks_per_person)
+        sink.send_message(f"{prefix}/numPersons", num_persons)
+        if bundler:
+            bundler.end_group()
 
         # Send per-person data
-        for person_id, pose_data in enumerate(self.detected_poses):
-            # Send landmark data
-            for idx, landmark in enumerate(pose_data.landmarks):
-                # Ensure landmark has x, y, z attributes (MediaPipe NormalizedLandmark)
-                if hasattr(landmark, 'x') and hasattr(landmark, 'y') and hasattr(landmark, 'z'):
-                    landmark_name = LANDMARK_NAMES[idx] if idx < len(LANDMARK_NAMES) else f"unknown_{idx}"
-                    osc_address = f"/person{person_id}/landmark/{landmark_name}"
-                    osc_client.send_message(osc_address, [landmark.x, landmark.y, landmark.z])
+        for person_id in range(num_persons):
+            landmarks = frame.landmarks[person_id]
+            if self.osc_pose_format != POSE_FORMAT_LANDMARKS:
+                # Whole skeleton in one message: K x (x, y, z, visibility)
+                sink.send_message(f"{prefix}/person{person_id}/pose", encode_pose(landmarks, self.osc_pose_format))
+            else:
+                if not self.has_depth:
+                    # 2D models send x, y, confidence per landmark, as they always have
+                    landmarks = landmarks[:, LANDMARK_COLUMNS_2D]
+                if self.osc_precompiled:
+                    # Send landmark data, only the float payloads are encoded per frame
+                    self.get_landmark_encoder().send_person(sink, person_id, landmarks)
                 else:
-                    print(f"Warning: Landmark {idx} for person {person_id} missing x, y, z attributes.")
+                    # Send landmark data
+                    for idx, (x, y, z) in enumerate(landmarks[:, :3].tolist()):
+                        landmark_name = LANDMARK_NAMES[idx] if idx < len(LANDMARK_NAMES) else f"unknown_{idx}"
+                        sink.send_message(f"{prefix}/person{person_id}/landmark/{landmark_name}", [x, y, z])
 
             # Send optional confidence and bbox
-            if pose_data.confidence is not None:
-                osc_client.send_message(f"/person{person_id}/confidence", pose_data.confidence)
-            if pose_data.bbox is not None and len(pose_data.bbox) == 4:
-                osc_client.send_message(f"/person{person_id}/bbox", pose_data.bbox)
+            confidence = frame.confidence[person_id]
+            if not np.isnan(confidence):
+                sink.send_message(f"{prefix}/person{person_id}/confidence", float(confidence))
+            bbox = frame.bbox[person_id]
+            if not np.isnan(bbox).any():
+                sink.send_message(f"{prefix}/person{person_id}/bbox", bbox.tolist())
+            if bundler:
+                bundler.end_group()
+
+        if bundler:
+            bundler.flush()
+
+    def get_landmark_encoder(self):
+        """
+        LandmarkOscEncoder for /personN/landmark/<name>, rebuilt if the landmark count or prefix changed.
+        """
+        num_landmarks = self.num_landmarks_per_person
+        address_format = self.osc_address_prefix + "/person{person}/landmark/{name}"
+        if (self.landmark_encoder is None or len(self.landmark_encoder.landmark_names) != num_landmarks
+                or self.landmark_encoder.address_format != address_format):
+            names = [LANDMARK_NAMES[idx] if idx < len(LANDMARK_NAMES) else f"unknown_{idx}"
+                     for idx in range(num_landmarks)]
+            self.landmark_encoder = LandmarkOscEncoder(address_format, names)
+        return self.landmark_encoder
+
+    def get_osc_sink(self, osc_client):
+        """
+        Returns the osc_client itself, or an OscFrameBundler wrapping it when self.osc_bundle is set.
+        """
+        return osc_sink(osc_client, self.osc_bundle, self.osc_max_datagram_size)
 
     def draw_landmarks(self, image):
         """
         Draws detected multi-person pose landmarks on the image.
-        This is a generic drawing; subclasses might override for specific model visualizations.
+        Points (and self.connections lines, if set) come straight from the PoseFrame arrays.
         """
-        if not self.detected_poses:
+        frame = self.pose_frame
+        if frame is None or len(frame) == 0:
             return image
 
-        for person_id, pose_data in enumerate(self.detected_poses):
-            if not pose_data.landmarks:
-                continue
+        # Convert normalized landmarks to pixel coordinates for drawing, all people at once
+        h, w, _ = image.shape
+        points = (frame.landmarks[:, :, :2] * (w, h)).astype(np.int32)
 
-            # Convert normalized landmarks to pixel coordinates for drawing
-            h, w, _ = image.shape
-            points = []
-            for landmark in pose_data.landmarks:
-                cx, cy = int(landmark.x * w), int(landmark.y * h)
-                points.append((cx, cy))
+        for person_id, person_points in enumerate(points.tolist()):
+            if self.connections:
+                for start, end in self.connections:
+                    cv2.line(image, person_points[start], person_points[end], (245, 66, 230), 2)
+            for point in person_points:
                 # Draw circles on landmarks
-                cv2.circle(image, (cx, cy), 5, (0, 255, 0), cv2.FILLED) # Green circles
-
-            # Draw connections (simplified for generic base class, subclasses will use mpDraw.POSE_CONNECTIONS)
-            # This part is illustrative; a full connection drawing depends on specific skeleton definition.
-            # For MediaPipe, you'd typically use mp.solutions.drawing_utils.draw_landmarks
-            # You can add simple lines between key points for a basic visualization, e.g.:
-            # if len(points) > 1:
-            #     for i in range(len(points) - 1):
-            #         cv2.line(image, points[i], points[i+1], (255, 0, 0), 2) # Blue lines
+                cv2.circle(image, point, 5, (0, 255, 0), cv2.FILLED) # Green circles
 
             # Add person ID text
-            if points:
-                text_pos = (points[0][0] + 10, points[0][1] - 10) # Near the first landmark (nose)
-                cv2.putText(image, f"P{person_id}", text_pos, cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2, cv2.LINE_AA) # Yellow text
-
-            # Draw bounding box if available
-            if pose_data.bbox:
-                x_min, y_min, width_norm, height_norm = pose_data.bbox
-                x1 = int(x_min * w)
-                y1 = int(y_min * h)
-                x2 = int((x_min + width_norm) * w)
-                y2 = int((y_min + height_norm) * h)
-                cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), 2) # Red bounding box
+            text_pos = (person_points[0][0] + 10, person_points[0][1] - 10) # Near the first landmark (nose)
+            cv2.putText(image, f"P{person_id}", text_pos, cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2, cv2.LINE_AA) # Yellow text
 
-        return image
+        # Draw bounding box if available
+        for x_min, y_min, width_norm, height_norm in frame.bbox[~np.isnan(frame.bbox).any(axis=1)].tolist():
+            x1 = int(x_min * w)
+            y1 = int(y_min * h)
+            x2 = int((x_min + width_norm) * w)
+            y2 = int((y_min + height_norm) * h)
+            cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), 2) # Red bounding box
 
+        return image
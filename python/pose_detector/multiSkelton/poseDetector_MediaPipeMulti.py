@@ -1,16 +1,36 @@
+import threading
+import time
+
 import cv2
 import mediapipe as mp
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 
-# Assuming pose_detector.py is in the same directory or accessible via PYTHONPATH
-from pose_detector.pose_detector import PoseDetector, PoseData, LANDMARK_NAMES
+from pose_detector.multiSkelton.poseDetector import PoseDetector, LANDMARK_NAMES
+
+# PoseLandmarker running modes
+RUNNING_MODE_IMAGE = "image"              # every frame detected from scratch
+RUNNING_MODE_VIDEO = "video"              # detect_for_video, tracks people from frame to frame
+RUNNING_MODE_LIVE_STREAM = "live_stream"  # detect_async, process_image returns without waiting
+RUNNING_MODES = (RUNNING_MODE_IMAGE, RUNNING_MODE_VIDEO, RUNNING_MODE_LIVE_STREAM)
 
 class PoseDetectorMediapipe(PoseDetector):
     """
     Implements multi-person pose detection using MediaPipe Pose Landmarker.
+
+    In the video and live_stream running modes the landmarker only runs its person detector
+    when it loses someone and tracks the others from the previous frame, which is several
+    times cheaper per frame while people stay in view. Use image mode for unrelated images,
+    and with a RoiTracker (a moving crop breaks the tracking, serve --roi switches to image mode).
+
+    live_stream: process_image hands the frame to MediaPipe and returns the newest finished
+    result straight away, usually from an earlier frame. has_new_result is False when nothing
+    finished since the last call, the pipeline then sends nothing new for that frame.
+    submitted_timestamp_ms is the timestamp this call's frame went in with, result_timestamp_ms
+    the one of the frame the result came from: the pipeline and RoiTracker use them to file the
+    result under the frame (and crop) it was detected in.
     """
-    def __init__(self, model_path="pose_landmarker_heavy.task", num_poses=2):
+    def __init__(self, model_path="pose_landmarker_heavy.task", num_poses=2, running_mode=RUNNING_MODE_VIDEO):
         """
         Initializes the MediaPipe Pose Landmarker.
 
@@ -20,115 +40,125 @@ class PoseDetectorMediapipe(PoseDetector):
                               https://developers.google.com/mediapipe/solutions/vision/pose_landmarker/python#model_options
                               'pose_landmarker_heavy.task' is generally recommended for accuracy.
             num_poses (int): Maximum number of poses to detect.
+            running_mode (str): RUNNING_MODE_IMAGE, RUNNING_MODE_VIDEO or RUNNING_MODE_LIVE_STREAM.
         """
         super().__init__()
+        if running_mode not in RUNNING_MODES:
+            raise ValueError(f"Unknown running mode {running_mode}, use one of {RUNNING_MODES}")
         self.model_path = model_path
         self.num_poses = num_poses
+        self.running_mode = running_mode
         self.detector = None
+        # video and live_stream need strictly increasing timestamps
+        self.last_timestamp_ms = -1
+        # live_stream: newest (result, (height, width), timestamp_ms) from the callback thread, taken by process_image
+        self.async_result = None
+        self.async_lock = threading.Lock()
         self._initialize_detector()
         # MediaPipe's drawing utilities are very helpful
         self.mp_drawing = mp.solutions.drawing_utils
         self.mp_pose = mp.solutions.pose
+        # Skeleton lines for the base class draw_landmarks
+        self.connections = sorted(self.mp_pose.POSE_CONNECTIONS)
 
     def _initialize_detector(self):
         """Initializes the MediaPipe Pose Landmarker with multi-person options."""
         try:
             base_options = python.BaseOptions(model_asset_path=self.model_path)
+            mode_options = {}
+            if self.running_mode == RUNNING_MODE_VIDEO:
+                mode_options["running_mode"] = vision.RunningMode.VIDEO
+            elif self.running_mode == RUNNING_MODE_LIVE_STREAM:
+                mode_options["running_mode"] = vision.RunningMode.LIVE_STREAM
+                mode_options["result_callback"] = self._on_async_result
+            else:
+                mode_options["running_mode"] = vision.RunningMode.IMAGE
             options = vision.PoseLandmarkerOptions(
                 base_options=base_options,
+                **mode_options,
                 output_segmentation_masks=False, # Not needed for skeletal tracking
                 num_poses=self.num_poses,        # Crucial for multi-person detection
                 min_pose_detection_confidence=0.5,
                 min_tracking_confidence=0.5
             )
             self.detector = vision.PoseLandmarker.create_from_options(options)
-            print(f"MediaPipe Pose Landmarker initialized with model: {self.model_path}")
+            print(f"MediaPipe Pose Landmarker initialized with model: {self.model_path}, {self.running_mode} mode")
         except Exception as e:
             print(f"Error initializing MediaPipe Pose Landmarker: {e}")
             print("Please ensure the model file (e.g., 'pose_landmarker_heavy.task') is in the correct path.")
             self.detector = None # Ensure detector is None if initialization fails
 
+    def get_model_settings(self):
+        settings = super().get_model_settings()
+        settings.update(model_path=self.model_path, num_poses=self.num_poses, running_mode=self.running_mode)
+        return settings
+
+    def _next_timestamp_ms(self):
+        """ monotonic clock in ms, bumped so two frames in the same ms still increase """
+        timestamp_ms = max(int(time.monotonic() * 1000), self.last_timestamp_ms + 1)
+        self.last_timestamp_ms = timestamp_ms
+        return timestamp_ms
+
+    def _on_async_result(self, result, output_image, timestamp_ms):
+        """ live_stream result callback, runs on a MediaPipe thread: just keep the newest """
+        with self.async_lock:
+            self.async_result = (result, (output_image.height, output_image.width), timestamp_ms)
+
+    def _fill_pose_frame(self, detection_result):
+        poses = detection_result.pose_landmarks if detection_result else []
+        frame = self.new_pose_frame(len(poses))
+        for person_id, pose_landmarks in enumerate(poses):
+            # pose_landmarks is a list of NormalizedLandmark objects.
+            # For PoseLandmarker, confidence is per landmark (visibility), not a single pose confidence,
+            # so frame.confidence and frame.bbox stay NaN.
+            frame.landmarks[person_id] = [(lm.x, lm.y, lm.z, lm.visibility or 0.0) for lm in pose_landmarks]
+        return frame
+
     def process_image(self, image):
         """
         Processes an image to detect multiple poses using MediaPipe Pose Landmarker.
-        Populates self.detected_poses with PoseData objects.
+        Populates self.pose_frame with x, y, z, visibility for every landmark of every person.
 
         Args:
             image (numpy.ndarray): The input image (BGR format from OpenCV).
 
         Returns:
-            list: A list of PoseData objects if poses are detected, otherwise an empty list.
+            PoseFrame: The detected poses, empty (len 0) if nobody was found.
         """
-        self.detected_poses = [] # Clear previous detections
         if self.detector is None:
             print("Pose detector not initialized. Cannot process image.")
-            return []
+            return self.new_pose_frame(0)
 
         # Convert the OpenCV BGR image to MediaPipe's Image format (RGB)
-        mp_image = mp.Image(image_format=mp.ImageFormat. and RGB, data=image)
+        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+
+        if self.running_mode == RUNNING_MODE_LIVE_STREAM:
+            # queue the frame (MediaPipe drops it if it is still busy) and pick up whatever finished
+            self.submitted_timestamp_ms = self._next_timestamp_ms()
+            self.detector.detect_async(mp_image, self.submitted_timestamp_ms)
+            with self.async_lock:
+                finished, self.async_result = self.async_result, None
+            self.has_new_result = finished is not None
+            if finished is None:
+                return self.pose_frame if self.pose_frame is not None else self.new_pose_frame(0)
+            detection_result, (self.image_height, self.image_width), self.result_timestamp_ms = finished
+            return self._fill_pose_frame(detection_result)
 
         # Update image dimensions
         self.image_height, self.image_width, _ = image.shape
 
         # Perform pose detection
-        detection_result = self.detector.detect(mp_image)
-
-        if detection_result and detection_result.pose_landmarks:
-            for pose_landmarks in detection_result.pose_landmarks:
-                # pose_landmarks is a list of NormalizedLandmark objects
-                # MediaPipe's PoseLandmarker also provides a 'world_landmarks' attribute
-                # if 3D coordinates are available, and 'segmentation_masks' if enabled.
-                
-                # For simplicity, we'll use the NormalizedLandmark objects directly
-                # You might want to extract confidence or bounding box if the API provides it
-                # For PoseLandmarker, confidence is per landmark, not a single pose confidence.
-                # Bounding box can be inferred from min/max landmark coords, or some models provide it directly.
-                
-                # Create a PoseData object for each detected person
-                self.detected_poses.append(PoseData(landmarks=pose_landmarks))
-                
-            return self.detected_poses
-        return []
-
-    def draw_landmarks(self, image):
-        """
-        Draws detected multi-person pose landmarks on the image using MediaPipe's drawing utilities.
-        """
-        if not self.detected_poses:
-            return image
-
-        for person_id, pose_data in enumerate(self.detected_poses):
-            if not pose_data.landmarks:
-                continue
-
-            # Use MediaPipe's drawing utilities for accurate skeleton drawing
-            # The pose_landmarks object is directly compatible.
-            self.mp_drawing.draw_landmarks(
-                image,
-                pose_data.landmarks,
-                self.mp_pose.POSE_CONNECTIONS,
-                self.mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2), # Landmark color
-                self.mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2)  # Connection color
-            )
-
-            # Add person ID text
-            if pose_data.landmarks:
-                # Get approximate position for text (e.g., near the nose or top shoulder)
-                # Assuming nose is landmark 0, or pick a stable point
-                if len(pose_data.landmarks) > 0:
-                    x_px = int(pose_data.landmarks[0].x * self.image_width)
-                    y_px = int(pose_data.landmarks[0].y * self.image_height)
-                    text_pos = (x_px + 10, y_px - 10)
-                    cv2.putText(image, f"Person {person_id}", text_pos, cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2, cv2.LINE_AA)
-
-            # Bounding box drawing (optional, can be calculated from landmarks if not provided by model)
-            if pose_data.bbox:
-                x_min, y_min, width_norm, height_norm = pose_data.bbox
-                x1 = int(x_min * self.image_width)
-                y1 = int(y_min * self.image_height)
-                x2 = int((x_min + width_norm) * self.image_width)
-                y2 = int((y_min + height_norm) * self.image_height)
-                cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), 2) # Red bounding box
-
-        return image
-
+        if self.running_mode == RUNNING_MODE_VIDEO:
+            detection_result = self.detector.detect_for_video(mp_image, self._next_timestamp_ms())
+        else:
+            detection_result = self.detector.detect(mp_image)
+        return self._fill_pose_frame(detection_result)
+
+    def close(self):
+        """ Stops the landmarker (and its live_stream threads). """
+        if self.detector is not None:
+            self.detector.close()
+            self.detector = None
+
+    # The base class draw_landmarks draws self.pose_frame with the MediaPipe POSE_CONNECTIONS.
@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+
+from pose_detector.multiSkelton.poseDetector import PoseDetector, LANDMARK_NAMES
+
+class PoseDetectorFake(PoseDetector):
+    """
+    Deterministic stand-in for a pose model: every image gets num_poses people whose
+    landmarks sway with the frame count, without looking at the pixels.
+    Used to measure the pipeline around the model (see pose_detector.pipeline_benchmark)
+    and to try an install before any model is set up. Needs only numpy.
+    """
+    def __init__(self, num_poses=2, latency=0.0):
+        """
+        Initializes the fake detector.
+
+        Args:
+            num_poses (int): People "detected" in every image.
+            latency (float): Seconds each process_image call sleeps, to stand in for model time.
+        """
+        super().__init__()
+        self.num_poses = num_poses
+        self.latency = latency
+        self.frame_count = 0
+        self.connections = [(11, 12), (11, 23), (12, 24), (23, 24), (11, 13), (13, 15),
+                            (12, 14), (14, 16), (23, 25), (25, 27), (24, 26), (26, 28)]
+        # a standing figure in a unit box, shifted and swayed per person and frame
+        rng = np.random.default_rng(0)
+        self.base_pose = np.empty((len(LANDMARK_NAMES), 4), dtype=np.float32)
+        self.base_pose[:, 0] = rng.uniform(0.3, 0.7, len(LANDMARK_NAMES))
+        self.base_pose[:, 1] = np.linspace(0.05, 0.95, len(LANDMARK_NAMES))
+        self.base_pose[:, 2] = rng.uniform(-0.2, 0.2, len(LANDMARK_NAMES))
+        self.base_pose[:, 3] = 0.9
+
+    def get_model_settings(self):
+        settings = super().get_model_settings()
+        settings.update(num_poses=self.num_poses)
+        return settings
+
+    def process_image(self, image):
+        """
+        Fills self.pose_frame with num_poses people, side by side across the image.
+
+        Args:
+            image (numpy.ndarray): The input image, only its size is used.
+
+        Returns:
+            PoseFrame: The fake poses.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        self.image_height, self.image_width = image.shape[:2]
+        self.frame_count += 1
+        frame = self.new_pose_frame(self.num_poses)
+        if self.num_poses == 0:
+            return frame
+        person_width = 1.0 / self.num_poses
+        offsets = np.arange(self.num_poses, dtype=np.float32) * person_width
+        sway = 0.05 * np.sin(self.frame_count * 0.1 + np.arange(self.num_poses, dtype=np.float32))
+        landmarks = frame.landmarks
+        landmarks[:] = self.base_pose
+        landmarks[:, :, 0] = offsets[:, None] + (landmarks[:, :, 0] + sway[:, None]) * person_width
+        frame.bbox[:, 0] = offsets
+        frame.bbox[:, 1] = 0.05
+        frame.bbox[:, 2] = person_width
+        frame.bbox[:, 3] = 0.9
+        frame.confidence[:] = 0.9
+        return frame
@@ -1,16 +1,60 @@
 import cv2
 import numpy as np
-import tensorflow as tf
-import tensorflow_hub as hub
 
-from pose_detector.pose_detector import PoseDetector, PoseData, LANDMARK_NAMES
+from pose_detector.multiSkelton.poseDetector import PoseDetector, LANDMARK_NAMES
+
+MOVENET_NUM_KEYPOINTS = 17 # COCO keypoints
+# Skeleton lines between the 17 COCO keypoints, as drawn by the rPi_prototypes C++ tool
+MOVENET_CONNECTIONS = [(5, 6), (5, 7), (5, 11), (6, 8), (6, 12), (7, 9), (8, 10),
+                       (11, 12), (11, 13), (13, 15), (12, 14), (14, 16)]
+
+def decode_multipose_output(keypoints_with_scores, pose_frame, score_threshold=0.2, max_poses=None):
+    """
+    Decodes the MoveNet MultiPose output tensor into a PoseFrame with array operations only.
+
+    Each of the 6 candidate rows of output_0 (1, 6, 56) is
+    [y_0, x_0, s_0, ... y_16, x_16, s_16, ymin, xmin, ymax, xmax, score], all normalized.
+
+    Args:
+        keypoints_with_scores (numpy.ndarray): output_0, shape (1, 6, 56).
+        pose_frame (PoseFrame): Frame to fill, reset to the number of people kept.
+        score_threshold (float): Minimum overall pose score to keep a candidate.
+        max_poses (int): Keep at most this many people, highest scores first.
+
+    Returns:
+        PoseFrame: pose_frame holding the kept people.
+    """
+    candidates = keypoints_with_scores.reshape(-1, keypoints_with_scores.shape[-1])
+    scores = candidates[:, -1]
+    keep = np.flatnonzero(scores > score_threshold)
+    if max_poses is not None and len(keep) > max_poses:
+        keep = keep[np.argsort(-scores[keep], kind='stable')[:max_poses]]
+    people = candidates[keep]
+    num_people = len(people)
+
+    frame = pose_frame.reset(num_people, MOVENET_NUM_KEYPOINTS)
+    keypoints = people[:, :MOVENET_NUM_KEYPOINTS * 3].reshape(num_people, MOVENET_NUM_KEYPOINTS, 3)
+    landmarks = frame.landmarks
+    landmarks[..., 0] = keypoints[..., 1] # x
+    landmarks[..., 1] = keypoints[..., 0] # y
+    landmarks[..., 2] = 0.0               # 2D model, no depth
+    landmarks[..., 3] = keypoints[..., 2] # keypoint confidence
+
+    boxes = people[:, MOVENET_NUM_KEYPOINTS * 3:MOVENET_NUM_KEYPOINTS * 3 + 4] # ymin, xmin, ymax, xmax
+    bbox = frame.bbox
+    bbox[:, 0] = boxes[:, 1]
+    bbox[:, 1] = boxes[:, 0]
+    bbox[:, 2] = boxes[:, 3] - boxes[:, 1]
+    bbox[:, 3] = boxes[:, 2] - boxes[:, 0]
+    frame.confidence[:] = scores[keep]
+    return frame
 
 class PoseDetectorMoveNet(PoseDetector):
     """
     Implements multi-person pose detection using Google's MoveNet (MultiPose variant).
     Requires TensorFlow and TensorFlow Hub.
     """
-    def __init__(self, model_url="https://tfhub.dev/google/movenet/multipose/lightning/1", num_poses=2):
+    def __init__(self, model_url="https://tfhub.dev/google/movenet/multipose/lightning/1", num_poses=2, score_threshold=0.2):
         """
         Initializes the MoveNet detector.
 
@@ -18,20 +62,28 @@ class PoseDetectorMoveNet(PoseDetector):
             model_url (str): URL to the MoveNet MultiPose model from TensorFlow Hub.
                              'multipose/lightning/1' for speed, 'multipose/thunder/1' for accuracy.
             num_poses (int): Maximum number of poses to detect.
+            score_threshold (float): Minimum overall pose score to report a person.
         """
         super().__init__()
         self.model_url = model_url
         self.num_poses = num_poses
+        self.score_threshold = score_threshold
         self.interpreter = None
+        self.tf = None
         self.input_size = 256 # MoveNet Lightning's typical input size
         self._initialize_detector()
         # MoveNet typically outputs 17 keypoints (COCO format)
         # You might need to map these to your LANDMARK_NAMES if they differ.
-        self.num_landmarks_per_person = 17 # Default COCO keypoints for MoveNet
+        self.num_landmarks_per_person = MOVENET_NUM_KEYPOINTS # Default COCO keypoints for MoveNet
+        self.has_depth = False # 2D keypoints, the confidence goes out in place of z
 
     def _initialize_detector(self):
         """Initializes the MoveNet model from TensorFlow Hub."""
         try:
+            # TensorFlow is only needed here, so decode_multipose_output imports without it
+            import tensorflow as tf
+            import tensorflow_hub as hub
+            self.tf = tf
             # Load the model from TensorFlow Hub
             model = hub.load(self.model_url)
             self.interpreter = model.signatures['serving_default']
@@ -45,21 +97,26 @@ class PoseDetectorMoveNet(PoseDetector):
             print("Please ensure TensorFlow and TensorFlow Hub are installed and the model URL is correct.")
             self.interpreter = None
 
+    def get_model_settings(self):
+        settings = super().get_model_settings()
+        settings.update(model_url=self.model_url, num_poses=self.num_poses,
+                        score_threshold=self.score_threshold, input_size=self.input_size)
+        return settings
+
     def process_image(self, image):
         """
         Processes an image to detect multiple poses using MoveNet.
-        Populates self.detected_poses with PoseData objects.
+        Populates self.pose_frame with the detected people.
 
         Args:
             image (numpy.ndarray): The input image (BGR format from OpenCV).
 
         Returns:
-            list: A list of PoseData objects if poses are detected, otherwise an empty list.
+            PoseFrame: The detected poses, empty (len 0) if nobody was found.
         """
-        self.detected_poses = []
         if self.interpreter is None:
             print("MoveNet detector not initialized. Cannot process image.")
-            return []
+            return self.new_pose_frame(0)
 
         self.image_height, self.image_width, _ = image.shape
 
@@ -67,47 +124,21 @@ class PoseDetectorMoveNet(PoseDetector):
             # Resize image to model input size
             resized_image = cv2.resize(image, (self.input_size, self.input_size))
             # Convert to RGB and add batch dimension, normalize to [0, 1]
+            tf = self.tf
             input_tensor = tf.convert_to_tensor(resized_image, dtype=tf.float32)
             input_tensor = tf.expand_dims(input_tensor, axis=0)
             input_tensor = tf.image.convert_image_dtype(input_tensor, dtype=tf.float32)
 
             # Run inference
             outputs = self.interpreter(input_tensor)
-            # output_0 shape: (1, 6, 56) for MultiPose Lightning (6 people, 17 keypoints * 3 (y,x,conf) + 5 (bbox))
-            # The output format can vary slightly, refer to MoveNet documentation for exact structure.
+            # output_0 shape: (1, 6, 56) for MultiPose Lightning (6 people, 17 keypoints * 3 (y,x,conf) + 5 (bbox, score))
             keypoints_with_scores = outputs['output_0'].numpy()
 
-            # Process detections
-            for person_idx in range(keypoints_with_scores.shape[1]):
-                person_data = keypoints_with_scores[0, person_idx, :]
-                
-                # Each person's data is typically [y1, x1, y2, x2, score, keypoint_y, keypoint_x, keypoint_score, ...]
-                # Extract bounding box and overall score
-                # Note: MoveNet's output format for bbox and score can be tricky.
-                # This is a common interpretation for MultiPose:
-                person_score = person_data[4] # Overall pose confidence
-                
-                # Keypoints start from index 5, and are (y, x, score) triplets
-                keypoints_raw = person_data[5:].reshape(-1, 3) # (17, 3) for 17 keypoints
-                
-                landmarks = []
-                for kp_id in range(self.num_landmarks_per_person):
-                    y_norm, x_norm, conf = keypoints_raw[kp_id]
-                    # Create a dummy object with x, y, z for compatibility
-                    landmarks.append(type('obj', (object,), {'x': x_norm, 'y': y_norm, 'z': conf})())
-
-                # Calculate bounding box from keypoints if not directly provided or reliable
-                # MoveNet MultiPose output often has a bounding box at the start (y1, x1, y2, x2)
-                y1_bbox_norm, x1_bbox_norm, y2_bbox_norm, x2_bbox_norm = person_data[0], person_data[1], person_data[2], person_data[3]
-                bbox_norm = [x1_bbox_norm, y1_bbox_norm, x2_bbox_norm - x1_bbox_norm, y2_bbox_norm - y1_bbox_norm]
-
-                # Filter by overall pose confidence
-                if person_score > 0.2: # Adjust threshold as needed
-                    self.detected_poses.append(PoseData(landmarks=landmarks, confidence=person_score, bbox=bbox_norm))
-            
-            return self.detected_poses
+            # Decode all candidates at once, filtered by overall pose confidence
+            return decode_multipose_output(keypoints_with_scores, self.new_pose_frame(0),
+                                           self.score_threshold, self.num_poses)
         except Exception as e:
             print(f"Error processing image with MoveNet: {e}")
-            return []
+            return self.new_pose_frame(0)
 
-    # The base class draw_landmarks should work for MoveNet's output format.
+    # The base class draw_landmarks works on the PoseFrame arrays for MoveNet's output.
@@ -0,0 +1,193 @@
+import os
+
+import cv2
+import numpy as np
+
+from pose_detector.multiSkelton.poseDetector import PoseDetector
+from pose_detector.multiSkelton.poseDetector_movenet import (MOVENET_CONNECTIONS, MOVENET_NUM_KEYPOINTS,
+                                                             decode_multipose_output)
+
+def load_tflite_interpreter(model_path, num_threads):
+    """
+    Loads a .tflite model with the lightest TFLite runtime installed:
+    tflite_runtime, then ai_edge_litert, then full TensorFlow's tf.lite.
+    Float models run on the XNNPACK delegate, which these runtimes apply by default.
+
+    Args:
+        model_path (str): Path to the .tflite file.
+        num_threads (int): CPU threads for the interpreter (and XNNPACK).
+
+    Returns:
+        Interpreter with its tensors allocated.
+    """
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+    interpreter.allocate_tensors()
+    return interpreter
+
+class PoseDetectorMoveNetTFLite(PoseDetector):
+    """
+    MoveNet from a local .tflite file: Lightning or Thunder, SinglePose or MultiPose
+    (https://www.kaggle.com/models/google/movenet/tfLite). No TensorFlow Hub download and
+    no full TensorFlow needed, the same approach as rPi_prototypes/pose_rPi_TFLite.cpp,
+    for small CPUs where startup time and per frame cost matter.
+
+    SinglePose models take a uint8 192x192 (Lightning) or 256x256 (Thunder) image,
+    MultiPose takes int32 at any size that is a multiple of 32 (input_size, 256 by default).
+    float16 and int8 quantized files load the same way: a quantized (int8/uint8) output is
+    dequantized with the scale and zero point stored in the model.
+    The frame is letterboxed (aspect kept, zero padding) into one preallocated input array,
+    and the landmarks are mapped back to the unpadded frame.
+    """
+    def __init__(self, model_path="movenet_multipose_lightning.tflite", num_poses=2,
+                 score_threshold=0.2, input_size=256, num_threads=None):
+        """
+        Loads the MoveNet .tflite model.
+
+        Args:
+            model_path (str): Path to the MoveNet .tflite file.
+            num_poses (int): Maximum number of poses to report (MultiPose finds up to 6, SinglePose 1).
+            score_threshold (float): Minimum overall pose score to report a person.
+            input_size (int): MultiPose input width and height, a multiple of 32. SinglePose uses the model's size.
+            num_threads (int): Interpreter threads, None for up to 4 (the C++ tool's quad core setting).
+        """
+        super().__init__()
+        self.model_path = model_path
+        self.num_poses = num_poses
+        self.score_threshold = score_threshold
+        self.input_size = input_size
+        self.num_threads = num_threads or min(4, os.cpu_count() or 1)
+        self.num_landmarks_per_person = MOVENET_NUM_KEYPOINTS
+        self.connections = MOVENET_CONNECTIONS
+        self.has_depth = False
+        self.interpreter = None
+        self.multipose = True
+        self.input_index = None
+        self.output_index = None
+        # (scale, zero_point) of an int8/uint8 quantized output, None for a float output
+        self.output_quantization = None
+        self.input_tensor = None
+        # letterbox of the last image size: (image shape, scaled width, scaled height, left, top)
+        self.letterbox = None
+        self.resized = None
+        self._initialize_detector()
+
+    def _initialize_detector(self):
+        """Loads the model and preallocates its input."""
+        try:
+            self.interpreter = load_tflite_interpreter(self.model_path, self.num_threads)
+            input_details = self.interpreter.get_input_details()[0]
+            self.input_index = input_details["index"]
+            # SinglePose outputs (1, 1, 17, 3), MultiPose (1, 6, 56)
+            self.multipose = len(self.interpreter.get_output_details()[0]["shape"]) == 3
+            if self.multipose:
+                # dynamic input shape, fix it to the chosen size once
+                self.interpreter.resize_tensor_input(self.input_index, [1, self.input_size, self.input_size, 3])
+                self.interpreter.allocate_tensors()
+            else:
+                self.input_size = int(input_details["shape"][1])
+            self.input_tensor = np.zeros((1, self.input_size, self.input_size, 3), dtype=input_details["dtype"])
+            output_details = self.interpreter.get_output_details()[0]
+            self.output_index = output_details["index"]
+            scale, zero_point = output_details.get("quantization", (0.0, 0))
+            if np.issubdtype(output_details["dtype"], np.integer) and scale:
+                self.output_quantization = (scale, zero_point)
+            print(f"MoveNet TFLite initialized with model: {self.model_path}, "
+                  f"{'multipose' if self.multipose else 'singlepose'}, input {self.input_size}, "
+                  f"{self.num_threads} threads")
+        except Exception as e:
+            print(f"Error initializing MoveNet TFLite: {e}")
+            print("Please ensure tflite-runtime (or ai-edge-litert / tensorflow) is installed and model_path is a MoveNet .tflite file.")
+            self.interpreter = None
+
+    def get_model_settings(self):
+        settings = super().get_model_settings()
+        settings.update(model_path=self.model_path, num_poses=self.num_poses,
+                        score_threshold=self.score_threshold, input_size=self.input_size)
+        return settings
+
+    def _fill_input(self, image):
+        """ letterbox image as RGB into self.input_tensor, reusing the buffers while the image size stays """
+        if self.letterbox is None or self.letterbox[0] != image.shape:
+            height, width = image.shape[:2]
+            scale = self.input_size / max(width, height)
+            scaled_width, scaled_height = max(1, round(width * scale)), max(1, round(height * scale))
+            left, top = (self.input_size - scaled_width) // 2, (self.input_size - scaled_height) // 2
+            self.letterbox = (image.shape, scaled_width, scaled_height, left, top)
+            self.resized = np.empty((scaled_height, scaled_width, 3), dtype=np.uint8)
+            self.input_tensor[:] = 0
+        _, scaled_width, scaled_height, left, top = self.letterbox
+        cv2.resize(image, (scaled_width, scaled_height), dst=self.resized, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=self.resized)
+        self.input_tensor[0, top:top + scaled_height, left:left + scaled_width] = self.resized
+
+    def _unletterbox(self, frame):
+        """ map frame's landmarks and bbox from the padded model input to the image """
+        _, scaled_width, scaled_height, left, top = self.letterbox
+        scale_x, scale_y = self.input_size / scaled_width, self.input_size / scaled_height
+        offset_x, offset_y = left / scaled_width, top / scaled_height
+        landmarks = frame.landmarks
+        landmarks[..., 0] = landmarks[..., 0] * scale_x - offset_x
+        landmarks[..., 1] = landmarks[..., 1] * scale_y - offset_y
+        bbox = frame.bbox
+        bbox[:, 0] = bbox[:, 0] * scale_x - offset_x
+        bbox[:, 1] = bbox[:, 1] * scale_y - offset_y
+        bbox[:, 2] *= scale_x
+        bbox[:, 3] *= scale_y
+        return frame
+
+    def _decode_singlepose(self, keypoints_with_scores):
+        """ (1, 1, 17, 3) y, x, score -> a PoseFrame with one person, or nobody below score_threshold """
+        keypoints = keypoints_with_scores.reshape(MOVENET_NUM_KEYPOINTS, 3)
+        score = float(keypoints[:, 2].mean())
+        if score <= self.score_threshold or self.num_poses < 1:
+            return self.new_pose_frame(0)
+        frame = self.new_pose_frame(1)
+        landmarks = frame.landmarks[0]
+        landmarks[:, 0] = keypoints[:, 1] # x
+        landmarks[:, 1] = keypoints[:, 0] # y
+        landmarks[:, 2] = 0.0             # 2D model, no depth
+        landmarks[:, 3] = keypoints[:, 2] # keypoint confidence
+        frame.confidence[0] = score
+        return frame
+
+    def process_image(self, image):
+        """
+        Processes an image with the MoveNet .tflite model.
+        Populates self.pose_frame with the detected people.
+
+        Args:
+            image (numpy.ndarray): The input image (BGR format from OpenCV).
+
+        Returns:
+            PoseFrame: The detected poses, empty (len 0) if nobody was found.
+        """
+        if self.interpreter is None:
+            print("MoveNet TFLite detector not initialized. Cannot process image.")
+            return self.new_pose_frame(0)
+
+        self.image_height, self.image_width, _ = image.shape
+        try:
+            self._fill_input(image)
+            self.interpreter.set_tensor(self.input_index, self.input_tensor)
+            self.interpreter.invoke()
+            keypoints_with_scores = self.interpreter.get_tensor(self.output_index)
+            if self.output_quantization is not None:
+                scale, zero_point = self.output_quantization
+                keypoints_with_scores = (keypoints_with_scores.astype(np.float32) - zero_point) * scale
+            if self.multipose:
+                frame = decode_multipose_output(keypoints_with_scores, self.new_pose_frame(0),
+                                                self.score_threshold, self.num_poses)
+            else:
+                frame = self._decode_singlepose(keypoints_with_scores)
+            return self._unletterbox(frame)
+        except Exception as e:
+            print(f"Error processing image with MoveNet TFLite: {e}")
+            return self.new_pose_frame(0)
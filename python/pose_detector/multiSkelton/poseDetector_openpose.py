@@ -11,7 +11,51 @@ except ImportError:
     print("Error: pyopenpose not found. Please ensure OpenPose is installed with Python bindings.")
     op = None
 
-from pose_detector.pose_detector import PoseDetector, PoseData, LANDMARK_NAMES
+from pose_detector.multiSkelton.poseDetector import PoseDetector, LANDMARK_NAMES
+
+BBOX_MIN_CONFIDENCE = 0.05 # Only keypoints above this confidence count towards the bbox
+
+def keypoints_to_pose_frame(pose_keypoints, image_width, image_height, pose_frame,
+                            bbox_min_confidence=BBOX_MIN_CONFIDENCE):
+    """
+    Converts OpenPose poseKeypoints into a PoseFrame with whole-array operations.
+
+    Args:
+        pose_keypoints (numpy.ndarray): (persons, keypoints, 3) array of pixel x, y, confidence.
+        image_width (int): Width of the processed image, for normalization.
+        image_height (int): Height of the processed image, for normalization.
+        pose_frame (PoseFrame): Frame to fill, reset to the number of persons.
+        bbox_min_confidence (float): Keypoints at or below this confidence are ignored for the bbox.
+
+    Returns:
+        PoseFrame: pose_frame with normalized landmarks (z = 0, keypoint confidence as visibility),
+                   bbox from the confident keypoints (NaN if none) and mean keypoint confidence.
+    """
+    keypoints = np.asarray(pose_keypoints, dtype=np.float32)
+    num_persons, num_keypoints, _ = keypoints.shape
+    frame = pose_frame.reset(num_persons, num_keypoints)
+    if num_persons == 0:
+        return frame
+
+    xy = keypoints[..., :2] / np.array([image_width, image_height], dtype=np.float32)
+    confidence = keypoints[..., 2]
+    landmarks = frame.landmarks
+    landmarks[..., :2] = xy
+    landmarks[..., 2] = 0.0
+    landmarks[..., 3] = confidence
+
+    # Masked min/max over the confident keypoints of each person
+    confident = (confidence > bbox_min_confidence)[..., np.newaxis]
+    xy_min = np.where(confident, xy, np.inf).min(axis=1)
+    xy_max = np.where(confident, xy, -np.inf).max(axis=1)
+    found = confident.any(axis=1)[:, 0]
+    frame.bbox[found, :2] = xy_min[found]
+    frame.bbox[found, 2:] = xy_max[found] - xy_min[found]
+
+    # OpenPose doesn't provide a single pose confidence, use the mean keypoint confidence
+    if num_keypoints > 0:
+        frame.confidence[:] = confidence.mean(axis=1)
+    return frame
 
 class PoseDetectorOpenPose(PoseDetector):
     """
@@ -32,6 +76,7 @@ class PoseDetectorOpenPose(PoseDetector):
         self.model_folder = model_folder
         self.num_poses = num_poses # OpenPose handles this internally
         self.op_wrapper = None
+        self.has_depth = False # 2D keypoints, the confidence goes out in place of z
         self._initialize_detector()
         # OpenPose has its own drawing capabilities, but we'll adapt to base class draw_landmarks
 
@@ -66,21 +111,25 @@ class PoseDetectorOpenPose(PoseDetector):
             print(f"Error initializing OpenPose: {e}")
             self.op_wrapper = None
 
+    def get_model_settings(self):
+        settings = super().get_model_settings()
+        settings.update(model_folder=self.model_folder, num_poses=self.num_poses)
+        return settings
+
     def process_image(self, image):
         """
         Processes an image to detect multiple poses using OpenPose.
-        Populates self.detected_poses with PoseData objects.
+        Populates self.pose_frame with the detected people.
 
         Args:
             image (numpy.ndarray): The input image (BGR format from OpenCV).
 
         Returns:
-            list: A list of PoseData objects if poses are detected, otherwise an empty list.
+            PoseFrame: The detected poses, empty (len 0) if nobody was found.
         """
-        self.detected_poses = []
         if self.op_wrapper is None:
             print("OpenPose detector not initialized. Cannot process image.")
-            return []
+            return self.new_pose_frame(0)
 
         self.image_height, self.image_width, _ = image.shape
 
@@ -91,47 +140,17 @@ class PoseDetectorOpenPose(PoseDetector):
             self.op_wrapper.emplaceAndPop([datum])
 
             # Extract pose keypoints
-            if datum.poseKeypoints is not None:
-                # poseKeypoints shape: (num_persons, num_keypoints, 3) where last dim is (x, y, confidence)
-                for person_keypoints in datum.poseKeypoints:
-                    landmarks = []
-                    bbox = [float('inf'), float('inf'), -float('inf'), -float('inf')] # x_min, y_min, x_max, y_max
-
-                    for kp_id, keypoint in enumerate(person_keypoints):
-                        x, y, conf = keypoint
-                        # Normalize coordinates (0-1)
-                        norm_x = x / self.image_width
-                        norm_y = y / self.image_height
-
-                        # OpenPose provides confidence per keypoint, not a single pose confidence.
-                        # For simplicity, we'll use a dummy z (depth) for now, or average confidence.
-                        # For now, we'll store confidence as z, and it's 2D.
-                        landmarks.append(type('obj', (object,), {'x': norm_x, 'y': norm_y, 'z': conf})())
-
-                        # Update bounding box
-                        if conf > 0.05: # Only consider confident keypoints for bbox
-                            bbox[0] = min(bbox[0], norm_x)
-                            bbox[1] = min(bbox[1], norm_y)
-                            bbox[2] = max(bbox[2], norm_x)
-                            bbox[3] = max(bbox[3], norm_y)
-
-                    # Convert bbox to [x_min, y_min, width, height]
-                    if bbox[0] != float('inf'): # If any keypoints were found
-                        bbox_final = [bbox[0], bbox[1], bbox[2] - bbox[0], bbox[3] - bbox[1]]
-                    else:
-                        bbox_final = None
-
-                    # OpenPose doesn't provide a single pose confidence directly,
-                    # so we can average keypoint confidences or set a default.
-                    avg_confidence = np.mean(person_keypoints[:, 2]) if person_keypoints.shape[0] > 0 else None
-
-                    self.detected_poses.append(PoseData(landmarks=landmarks, confidence=avg_confidence, bbox=bbox_final))
-            return self.detected_poses
+            if datum.poseKeypoints is None:
+                return self.new_pose_frame(0)
+
+            # poseKeypoints shape: (num_persons, num_keypoints, 3) where last dim is (x, y, confidence)
+            return keypoints_to_pose_frame(datum.poseKeypoints, self.image_width, self.image_height,
+                                           self.new_pose_frame(0))
         except Exception as e:
             print(f"Error processing image with OpenPose: {e}")
-            return []
+            return self.new_pose_frame(0)
 
     # You can override draw_landmarks if OpenPose's internal drawing is preferred,
     # or adapt the base class drawing to OpenPose's keypoint structure.
-    # For now, the base class draw_landmarks will attempt to draw based on the PoseData structure.
+    # For now, the base class draw_landmarks draws straight from the PoseFrame arrays.
 
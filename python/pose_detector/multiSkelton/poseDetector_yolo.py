@@ -1,113 +1,202 @@
+import os
+
 import cv2
 import numpy as np
-import tensorflow as tf
-import tensorflow_hub as hub
 
-from pose_detector.pose_detector import PoseDetector, PoseData, LANDMARK_NAMES
+from pose_detector.multiSkelton.poseDetector import PoseDetector
+# YOLO-pose uses the same 17 COCO keypoints, in the same order, as MoveNet
+from pose_detector.multiSkelton.poseDetector_movenet import MOVENET_CONNECTIONS, MOVENET_NUM_KEYPOINTS
+
+YOLO_LETTERBOX_PAD = 114 # grey padding, as in ultralytics' own letterbox
+
+def decode_yolo_pose_output(output, pose_frame, score_threshold=0.25, iou_threshold=0.45, max_poses=None):
+    """
+    Decodes a YOLOv8/11-pose ONNX output into a PoseFrame, all candidates at once plus OpenCV's NMS.
+    Coordinates stay in model input pixels, see PoseDetectorYolo for the mapping to the image.
+
+    Raw export, (1, 56, N) (or (1, N, 56)): per candidate cx, cy, w, h, score, then 17 x (x, y, visibility).
+    End to end export (nms=True), (1, N, 57): x1, y1, x2, y2, score, class, then the keypoints, already NMSed.
+
+    Args:
+        output (numpy.ndarray): The model's first output.
+        pose_frame (PoseFrame): Frame to fill, reset to the number of people kept.
+        score_threshold (float): Minimum person score.
+        iou_threshold (float): Boxes overlapping more than this with a better one are dropped.
+        max_poses (int): Keep at most this many people, highest scores first.
+
+    Returns:
+        PoseFrame: pose_frame, landmarks x/y and bbox in input pixels.
+    """
+    candidates = output[0]
+    keypoint_values = MOVENET_NUM_KEYPOINTS * 3
+    end_to_end = candidates.shape[-1] == 6 + keypoint_values
+    if not end_to_end and candidates.shape[0] == 5 + keypoint_values:
+        candidates = candidates.T # (N, 56), a view
+    scores = candidates[:, 4]
+    keep = np.flatnonzero(scores > score_threshold)
+    candidates = candidates[keep]
+    scores = scores[keep]
+
+    if end_to_end:
+        boxes = candidates[:, :4].copy()
+        boxes[:, 2:] -= boxes[:, :2] # x, y, w, h
+        order = np.argsort(-scores, kind='stable')
+    else:
+        boxes = candidates[:, :4].copy()
+        boxes[:, :2] -= boxes[:, 2:] / 2 # cx, cy -> x, y of the top left corner
+        order = np.asarray(cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), score_threshold, iou_threshold),
+                           dtype=np.int64).reshape(-1)
+    if max_poses is not None:
+        order = order[:max_poses]
+    num_people = len(order)
+
+    frame = pose_frame.reset(num_people, MOVENET_NUM_KEYPOINTS)
+    keypoint_start = 6 if end_to_end else 5
+    keypoints = candidates[order, keypoint_start:keypoint_start + keypoint_values].reshape(
+        num_people, MOVENET_NUM_KEYPOINTS, 3)
+    landmarks = frame.landmarks
+    landmarks[..., 0] = keypoints[..., 0] # x
+    landmarks[..., 1] = keypoints[..., 1] # y
+    landmarks[..., 2] = 0.0               # 2D model, no depth
+    landmarks[..., 3] = keypoints[..., 2] # keypoint visibility
+    frame.bbox[:] = boxes[order]
+    frame.confidence[:] = scores[order]
+    return frame
 
-class PoseDetectorMoveNet(PoseDetector):
+class PoseDetectorYolo(PoseDetector):
     """
-    Implements multi-person pose detection using Google's MoveNet (MultiPose variant).
-    Requires TensorFlow and TensorFlow Hub.
+    YOLOv8 / YOLO11 pose on ONNX Runtime's CPU execution provider.
+    One pass finds every person, so the cost hardly grows with the crowd
+    (MediaPipe runs its landmark model once per person).
+
+    Export the model with ultralytics, e.g.
+        yolo export model=yolov8n-pose.pt format=onnx imgsz=640
+    The frame is letterboxed (aspect kept, grey padding) into one reused float32 input,
+    results are mapped back to the unpadded frame.
+    Quantized exports load the same way: int8 (onnxruntime.quantization, float input and output)
+    and fp16 (half=True, the input buffer is float16 then).
     """
-    def __init__(self, model_url="https://tfhub.dev/google/movenet/multipose/lightning/1", num_poses=2):
+    def __init__(self, model_path="yolov8n-pose.onnx", num_poses=10, score_threshold=0.25,
+                 iou_threshold=0.45, input_size=640, intra_op_threads=None, inter_op_threads=1):
         """
-        Initializes the MoveNet detector.
+        Loads the ONNX model.
 
         Args:
-            model_url (str): URL to the MoveNet MultiPose model from TensorFlow Hub.
-                             'multipose/lightning/1' for speed, 'multipose/thunder/1' for accuracy.
-            num_poses (int): Maximum number of poses to detect.
+            model_path (str): Path to the exported YOLO-pose .onnx file.
+            num_poses (int): Maximum number of poses to report.
+            score_threshold (float): Minimum person score.
+            iou_threshold (float): NMS overlap threshold.
+            input_size (int): Input width and height for models exported with dynamic shapes.
+            intra_op_threads (int): Threads inside an operator, None for up to 4.
+            inter_op_threads (int): Operators run in parallel, 1 (sequential) suits these graphs.
         """
         super().__init__()
-        self.model_url = model_url
+        self.model_path = model_path
         self.num_poses = num_poses
-        self.interpreter = None
-        self.input_size = 256 # MoveNet Lightning's typical input size
+        self.score_threshold = score_threshold
+        self.iou_threshold = iou_threshold
+        self.input_size = input_size
+        self.intra_op_threads = intra_op_threads or min(4, os.cpu_count() or 1)
+        self.inter_op_threads = inter_op_threads
+        self.num_landmarks_per_person = MOVENET_NUM_KEYPOINTS
+        self.connections = MOVENET_CONNECTIONS
+        self.has_depth = False
+        self.session = None
+        self.input_name = None
+        self.input_tensor = None
+        # letterbox of the last image size: (image shape, scale, scaled width, scaled height, left, top)
+        self.letterbox = None
+        self.resized = None
+        self.canvas = None
         self._initialize_detector()
-        # MoveNet typically outputs 17 keypoints (COCO format)
-        # You might need to map these to your LANDMARK_NAMES if they differ.
-        self.num_landmarks_per_person = 17 # Default COCO keypoints for MoveNet
 
     def _initialize_detector(self):
-        """Initializes the MoveNet model from TensorFlow Hub."""
+        """Creates the ONNX Runtime session and preallocates the input."""
         try:
-            # Load the model from TensorFlow Hub
-            model = hub.load(self.model_url)
-            self.interpreter = model.signatures['serving_default']
-            
-            # Determine input size from model if possible, or set default
-            if 'input_1' in self.interpreter.inputs[0].name: # Check for common input name
-                self.input_size = self.interpreter.inputs[0].shape[1]
-            print(f"MoveNet detector initialized with model: {self.model_url}, input size: {self.input_size}")
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.intra_op_threads
+            options.inter_op_num_threads = self.inter_op_threads
+            options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if self.inter_op_threads > 1
+                                      else ort.ExecutionMode.ORT_SEQUENTIAL)
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self.session = ort.InferenceSession(self.model_path, sess_options=options,
+                                                providers=["CPUExecutionProvider"])
+            model_input = self.session.get_inputs()[0]
+            self.input_name = model_input.name
+            # static exports fix the size, dynamic ones have names instead of numbers
+            if isinstance(model_input.shape[2], int):
+                self.input_size = model_input.shape[2]
+            input_dtype = np.float16 if model_input.type == "tensor(float16)" else np.float32
+            self.input_tensor = np.zeros((1, 3, self.input_size, self.input_size), dtype=input_dtype)
+            self.canvas = np.full((self.input_size, self.input_size, 3), YOLO_LETTERBOX_PAD, dtype=np.uint8)
+            print(f"YOLO pose initialized with model: {self.model_path}, input {self.input_size}, "
+                  f"{self.intra_op_threads} intra / {self.inter_op_threads} inter op threads")
         except Exception as e:
-            print(f"Error initializing MoveNet: {e}")
-            print("Please ensure TensorFlow and TensorFlow Hub are installed and the model URL is correct.")
-            self.interpreter = None
+            print(f"Error initializing YOLO pose: {e}")
+            print("Please ensure onnxruntime is installed and model_path is a YOLOv8/11-pose .onnx export.")
+            self.session = None
+
+    def get_model_settings(self):
+        settings = super().get_model_settings()
+        settings.update(model_path=self.model_path, num_poses=self.num_poses, score_threshold=self.score_threshold,
+                        iou_threshold=self.iou_threshold, input_size=self.input_size)
+        return settings
+
+    def _fill_input(self, image):
+        """ letterbox image into self.canvas, then RGB, CHW, 0-1 floats into self.input_tensor, no new arrays """
+        if self.letterbox is None or self.letterbox[0] != image.shape:
+            height, width = image.shape[:2]
+            scale = self.input_size / max(width, height)
+            scaled_width, scaled_height = max(1, round(width * scale)), max(1, round(height * scale))
+            left, top = (self.input_size - scaled_width) // 2, (self.input_size - scaled_height) // 2
+            self.letterbox = (image.shape, scale, scaled_width, scaled_height, left, top)
+            self.resized = np.empty((scaled_height, scaled_width, 3), dtype=np.uint8)
+            self.canvas[:] = YOLO_LETTERBOX_PAD
+        _, _, scaled_width, scaled_height, left, top = self.letterbox
+        cv2.resize(image, (scaled_width, scaled_height), dst=self.resized, interpolation=cv2.INTER_LINEAR)
+        self.canvas[top:top + scaled_height, left:left + scaled_width] = self.resized
+        # BGR HWC uint8 -> RGB CHW float32 / 255 in one pass
+        np.multiply(self.canvas[:, :, ::-1].transpose(2, 0, 1), np.float32(1 / 255), out=self.input_tensor[0],
+                    casting="unsafe")
+
+    def _to_image(self, frame):
+        """ map frame's landmarks and bbox from input pixels to coordinates normalized to the image """
+        _, scale, _, _, left, top = self.letterbox
+        scale_x, scale_y = 1 / (scale * self.image_width), 1 / (scale * self.image_height)
+        landmarks = frame.landmarks
+        landmarks[..., 0] = (landmarks[..., 0] - left) * scale_x
+        landmarks[..., 1] = (landmarks[..., 1] - top) * scale_y
+        bbox = frame.bbox
+        bbox[:, 0] = (bbox[:, 0] - left) * scale_x
+        bbox[:, 1] = (bbox[:, 1] - top) * scale_y
+        bbox[:, 2] *= scale_x
+        bbox[:, 3] *= scale_y
+        return frame
 
     def process_image(self, image):
         """
-        Processes an image to detect multiple poses using MoveNet.
-        Populates self.detected_poses with PoseData objects.
+        Processes an image with the YOLO-pose model.
+        Populates self.pose_frame with the detected people.
 
         Args:
             image (numpy.ndarray): The input image (BGR format from OpenCV).
 
         Returns:
-            list: A list of PoseData objects if poses are detected, otherwise an empty list.
+            PoseFrame: The detected poses, empty (len 0) if nobody was found.
         """
-        self.detected_poses = []
-        if self.interpreter is None:
-            print("MoveNet detector not initialized. Cannot process image.")
-            return []
+        if self.session is None:
+            print("YOLO pose detector not initialized. Cannot process image.")
+            return self.new_pose_frame(0)
 
         self.image_height, self.image_width, _ = image.shape
-
         try:
-            # Resize image to model input size
-            resized_image = cv2.resize(image, (self.input_size, self.input_size))
-            # Convert to RGB and add batch dimension, normalize to [0, 1]
-            input_tensor = tf.convert_to_tensor(resized_image, dtype=tf.float32)
-            input_tensor = tf.expand_dims(input_tensor, axis=0)
-            input_tensor = tf.image.convert_image_dtype(input_tensor, dtype=tf.float32)
-
-            # Run inference
-            outputs = self.interpreter(input_tensor)
-            # output_0 shape: (1, 6, 56) for MultiPose Lightning (6 people, 17 keypoints * 3 (y,x,conf) + 5 (bbox))
-            # The output format can vary slightly, refer to MoveNet documentation for exact structure.
-            keypoints_with_scores = outputs['output_0'].numpy()
-
-            # Process detections
-            for person_idx in range(keypoints_with_scores.shape[1]):
-                person_data = keypoints_with_scores[0, person_idx, :]
-                
-                # Each person's data is typically [y1, x1, y2, x2, score, keypoint_y, keypoint_x, keypoint_score, ...]
-                # Extract bounding box and overall score
-                # Note: MoveNet's output format for bbox and score can be tricky.
-                # This is a common interpretation for MultiPose:
-                person_score = person_data[4] # Overall pose confidence
-                
-                # Keypoints start from index 5, and are (y, x, score) triplets
-                keypoints_raw = person_data[5:].reshape(-1, 3) # (17, 3) for 17 keypoints
-                
-                landmarks = []
-                for kp_id in range(self.num_landmarks_per_person):
-                    y_norm, x_norm, conf = keypoints_raw[kp_id]
-                    # Create a dummy object with x, y, z for compatibility
-                    landmarks.append(type('obj', (object,), {'x': x_norm, 'y': y_norm, 'z': conf})())
-
-                # Calculate bounding box from keypoints if not directly provided or reliable
-                # MoveNet MultiPose output often has a bounding box at the start (y1, x1, y2, x2)
-                y1_bbox_norm, x1_bbox_norm, y2_bbox_norm, x2_bbox_norm = person_data[0], person_data[1], person_data[2], person_data[3]
-                bbox_norm = [x1_bbox_norm, y1_bbox_norm, x2_bbox_norm - x1_bbox_norm, y2_bbox_norm - y1_bbox_norm]
-
-                # Filter by overall pose confidence
-                if person_score > 0.2: # Adjust threshold as needed
-                    self.detected_poses.append(PoseData(landmarks=landmarks, confidence=person_score, bbox=bbox_norm))
-            
-            return self.detected_poses
+            self._fill_input(image)
+            # fp16 models answer in float16, decode in float32
+            output = self.session.run(None, {self.input_name: self.input_tensor})[0].astype(np.float32, copy=False)
+            frame = decode_yolo_pose_output(output, self.new_pose_frame(0), self.score_threshold,
+                                            self.iou_threshold, self.num_poses)
+            return self._to_image(frame)
         except Exception as e:
-            print(f"Error processing image with MoveNet: {e}")
-            return []
-
-    # The base class draw_landmarks should work for MoveNet's output format.
+            print(f"Error processing image with YOLO pose: {e}")
+            return self.new_pose_frame(0)
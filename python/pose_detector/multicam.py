@@ -0,0 +1,159 @@
+"""
+MultiCameraRunner runs N cameras at once, one process per camera so every
+detector gets its own interpreter (no GIL contention between detectors).
+
+Each camera process runs a PosePipeline (capture thread, inference, OSC, NDI threads)
+with its own detector instance. OSC addresses are namespaced /camN/... (N from 1),
+e.g. /cam2/p1/head, and each camera can go out as its own NDI source "<ndi_name>-camN".
+Per camera fps and drop counters are shared back to the parent through a multiprocessing Array.
+"""
+
+import multiprocessing
+import time
+
+import cv2
+
+from .pose_encoding import POSE_FORMAT_LANDMARKS
+
+# layout of the per camera stats array
+STAT_ALIVE = 0
+STAT_CAPTURED = 1
+STAT_INFERRED = 2
+STAT_DROPPED = 3
+STAT_CAPTURE_FPS = 4
+STAT_INFERENCE_FPS = 5
+NUM_STATS = 6
+
+
+def default_detector_factory():
+    # imported here so the child process only loads mediapipe when it needs it
+    from pose_detector import PoseDetectorMediapipe
+    return PoseDetectorMediapipe()
+
+
+def _run_camera(slot, camera_id, settings, stats, stop_event):
+    """ camera process main: runs a PosePipeline until stop_event is set """
+    from pythonosc import udp_client
+    from .pipeline import PosePipeline
+
+    cap = cv2.VideoCapture(camera_id, settings["api_preference"])
+    if not cap.isOpened():
+        print(f"cam{slot}: failed to open camera {camera_id}")
+        return
+
+    pose_detector = settings["detector_factory"]()
+    pose_detector.osc_address_prefix = f"/cam{slot}"
+    pose_detector.osc_bundle = settings["osc_bundle"]
+    pose_detector.osc_pose_format = settings["osc_pose_format"]
+
+    osc_client = None
+    if settings["osc_host"]:
+        osc_client = udp_client.SimpleUDPClient(settings["osc_host"], settings["osc_port"])
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    ndi_sender = None
+    if settings["ndi_name"]:
+        from .ndi_sender import NdiSender
+        ndi_sender = NdiSender(f"{settings['ndi_name']}-cam{slot}", fps=fps)
+
+    pipeline = PosePipeline(cap, pose_detector, fps=fps,
+                            ndi_out=ndi_sender.send if ndi_sender else None,
+                            osc_client=osc_client, preview=False,
+                            inference_size=settings["inference_size"], ndi_size=settings["ndi_size"])
+    pipeline.start()
+    stats[STAT_ALIVE] = 1
+    print(f"cam{slot}: camera {camera_id} running")
+
+    last_time = time.perf_counter()
+    last_captured = last_inferred = 0
+    try:
+        while pipeline.running and not stop_event.wait(1.0):
+            now = time.perf_counter()
+            elapsed = now - last_time
+            captured, inferred = pipeline.frames_captured, pipeline.frames_inferred
+            stats[STAT_CAPTURED] = captured
+            stats[STAT_INFERRED] = inferred
+            stats[STAT_DROPPED] = pipeline.queues["inference"].dropped
+            stats[STAT_CAPTURE_FPS] = (captured - last_captured) / elapsed
+            stats[STAT_INFERENCE_FPS] = (inferred - last_inferred) / elapsed
+            last_time, last_captured, last_inferred = now, captured, inferred
+    finally:
+        pipeline.stop()
+        cap.release()
+        if ndi_sender is not None:
+            ndi_sender.close()
+        stats[STAT_ALIVE] = 0
+        print(f"cam{slot}: stopped")
+
+
+class MultiCameraRunner:
+    def __init__(self, camera_ids, osc_host=None, osc_port=5005, ndi_name=None, osc_bundle=False,
+                 detector_factory=default_detector_factory, api_preference=cv2.CAP_ANY,
+                 inference_size=None, ndi_size=None, osc_pose_format=POSE_FORMAT_LANDMARKS):
+        """
+        :param camera_ids: cv2 camera indices, camera_ids[0] becomes /cam1
+        :param osc_host: OSC destination host, None for no OSC
+        :param osc_port: OSC destination port, shared by all cameras (the /camN prefix tells them apart)
+        :param ndi_name: base NDI source name, each camera sends "<ndi_name>-camN"; None for no NDI
+        :param osc_bundle: send each camera's frames as OSC bundles
+        :param detector_factory: picklable callable returning a new PoseDetector, called in each camera process
+        :param api_preference: cv2.VideoCapture backend, e.g. cv2.CAP_DSHOW on windows
+        :param inference_size: detector input resolution, None for the camera's, a width or (width, height)
+        :param ndi_size: NDI output resolution, same forms as inference_size
+        :param osc_pose_format: landmark encoding of each camera's OSC, one of pose_encoding.POSE_FORMATS
+        """
+        self.camera_ids = list(camera_ids)
+        self.settings = {
+            "osc_host": osc_host,
+            "osc_port": int(osc_port),
+            "ndi_name": ndi_name,
+            "osc_bundle": osc_bundle,
+            "osc_pose_format": osc_pose_format,
+            "detector_factory": detector_factory,
+            "api_preference": api_preference,
+            "inference_size": inference_size,
+            "ndi_size": ndi_size,
+        }
+        self.stop_event = None
+        self.processes = []
+        self.stats = []
+
+    def start(self):
+        self.stop_event = multiprocessing.Event()
+        for slot, camera_id in enumerate(self.camera_ids, start=1):
+            stats = multiprocessing.Array('d', NUM_STATS)
+            process = multiprocessing.Process(target=_run_camera, name=f"pose-cam{slot}",
+                                              args=(slot, camera_id, self.settings, stats, self.stop_event),
+                                              daemon=True)
+            process.start()
+            self.processes.append(process)
+            self.stats.append(stats)
+
+    def stop(self, timeout=5.0):
+        if self.stop_event is not None:
+            self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.stats = []
+
+    def get_stats(self):
+        """
+        :return: list with one dict per camera: camera, alive, captured, inferred, dropped, capture_fps, inference_fps
+        """
+        result = []
+        for slot, (camera_id, stats) in enumerate(zip(self.camera_ids, self.stats), start=1):
+            values = stats[:]
+            result.append({
+                "camera": f"cam{slot}",
+                "camera_id": camera_id,
+                "alive": bool(values[STAT_ALIVE]),
+                "captured": int(values[STAT_CAPTURED]),
+                "inferred": int(values[STAT_INFERRED]),
+                "dropped": int(values[STAT_DROPPED]),
+                "capture_fps": values[STAT_CAPTURE_FPS],
+                "inference_fps": values[STAT_INFERENCE_FPS],
+            })
+        return result
@@ -0,0 +1,178 @@
+"""
+NdiSender wraps an NDI send instance so the GUI, the multi camera workers
+and the headless runner can all push BGR frames out as an NDI source.
+NDIlib is only imported when an NdiSender is created, so the rest of
+pose_detector works on machines without NDI.
+
+Frames go out with the async send API from a ring of preallocated buffers:
+the colour conversion writes into the next free buffer (no new 8MB array per
+1080p frame) while NDI is still transmitting the previous one. NDI only holds
+on to the last async frame, so two buffers are enough.
+Pixel formats are the ones NDI handles natively: BGRX (one cheap channel add,
+exact colour) or UYVY (half the bytes on the wire, BT.709 4:2:2).
+"""
+
+import threading
+import time
+from fractions import Fraction
+
+import cv2
+import numpy as np
+
+PIXEL_FORMAT_BGRX = "BGRX"
+PIXEL_FORMAT_UYVY = "UYVY"
+PIXEL_FORMATS = (PIXEL_FORMAT_BGRX, PIXEL_FORMAT_UYVY)
+
+# BGR -> limited range BT.709 Y, Cb, Cr as a cv2.transform affine matrix (columns B, G, R, offset)
+BGR_TO_YCBCR_709 = np.array([
+    [0.0722 * 219 / 255, 0.7152 * 219 / 255, 0.2126 * 219 / 255, 16],
+    [0.5 * 224 / 255, -0.3854 * 224 / 255, -0.1146 * 224 / 255, 128],
+    [-0.0458 * 224 / 255, -0.4542 * 224 / 255, 0.5 * 224 / 255, 128],
+], dtype=np.float32)
+
+
+def frame_rate_fraction(fps):
+    """
+    NDI frame_rate_N / frame_rate_D for a cv2 fps value, NTSC rates (29.97...) as N/1001
+    :return: (numerator, denominator)
+    """
+    if not fps or fps <= 0:
+        return 30, 1
+    ntsc = fps * 1001 / 1000
+    if abs(ntsc - round(ntsc)) < 0.01 and abs(fps - round(fps)) > 0.01:
+        return round(ntsc) * 1000, 1001
+    rate = Fraction(fps).limit_denominator(1000)
+    return rate.numerator, rate.denominator
+
+
+def bgr_to_uyvy(frame, out, scratch=None):
+    """
+    Convert a BGR frame to packed UYVY into out
+    :param frame: (h, w, 3) uint8 BGR, w even
+    :param out: (h, w, 2) uint8, [:, :, 0] is U/V alternating, [:, :, 1] is Y
+    :param scratch: optional (h, w, 3) uint8 reused for the Y, Cb, Cr planes
+    :return: out
+    """
+    ycbcr = cv2.transform(frame, BGR_TO_YCBCR_709, dst=scratch)
+    # chroma from the even pixel of every pair
+    out[:, 0::2, 0] = ycbcr[:, 0::2, 1]
+    out[:, 1::2, 0] = ycbcr[:, 0::2, 2]
+    out[:, :, 1] = ycbcr[:, :, 0]
+    return out
+
+
+class NdiFrameConverter:
+    """
+    BGR frames -> NDI pixel format, into a ring of reused buffers. Doesn't need NDIlib,
+    so the conversion cost can be measured without NDI (see pipeline_benchmark).
+    """
+    def __init__(self, pixel_format=PIXEL_FORMAT_BGRX, num_buffers=2):
+        """
+        :param pixel_format: PIXEL_FORMAT_BGRX or PIXEL_FORMAT_UYVY
+        :param num_buffers: conversion buffers, at least 2 so NDI can send one while the next is filled
+        """
+        if pixel_format not in PIXEL_FORMATS:
+            raise ValueError(f"unknown NDI pixel format {pixel_format}")
+        self.pixel_format = pixel_format
+        self.buffers = [None] * max(2, num_buffers)
+        self.scratch = None
+        self.next_buffer = 0
+
+    def _buffer_for(self, index, height, width):
+        channels = 4 if self.pixel_format == PIXEL_FORMAT_BGRX else 2
+        buffer = self.buffers[index]
+        if buffer is None or buffer.shape != (height, width, channels):
+            # only happens for the first frames or on a size change;
+            # never the buffer NDI may still be sending, that's the previous index
+            buffer = np.empty((height, width, channels), dtype=np.uint8)
+            self.buffers[index] = buffer
+        return buffer
+
+    def convert(self, frame):
+        """
+        Convert a BGR frame into the next buffer of the ring
+        :return: (buffer index, buffer), the buffer stays untouched until the ring comes round again
+        """
+        height, width = frame.shape[:2]
+        index = self.next_buffer
+        buffer = self._buffer_for(index, height, width)
+        if self.pixel_format == PIXEL_FORMAT_BGRX:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=buffer)
+        else:
+            if self.scratch is None or self.scratch.shape != frame.shape:
+                self.scratch = np.empty_like(frame)
+            bgr_to_uyvy(frame, buffer, self.scratch)
+        self.next_buffer = (index + 1) % len(self.buffers)
+        return index, buffer
+
+
+class NdiSender:
+    def __init__(self, ndi_name, fps=None, pixel_format=PIXEL_FORMAT_BGRX, num_buffers=2):
+        """
+        :param ndi_name: NDI source name
+        :param fps: source frame rate for the NDI metadata, can be changed later with set_frame_rate
+        :param pixel_format: PIXEL_FORMAT_BGRX or PIXEL_FORMAT_UYVY
+        :param num_buffers: conversion buffers, at least 2 so NDI can send one while the next is filled
+        """
+        self.converter = NdiFrameConverter(pixel_format, num_buffers)
+        import NDIlib as ndi
+        self.ndi = ndi
+        self.ndi_name = ndi_name
+        self.pixel_format = pixel_format
+        if not ndi.initialize():
+            raise RuntimeError("NDI Initialization failed")
+        send_settings = ndi.SendCreate()
+        send_settings.ndi_name = ndi_name
+        # we pace the frames ourselves, don't let NDI block the sending thread to clock them
+        send_settings.clock_video = False
+        self.ndi_send = ndi.send_create(send_settings)
+
+        fourcc = ndi.FOURCC_VIDEO_TYPE_BGRX if pixel_format == PIXEL_FORMAT_BGRX else ndi.FOURCC_VIDEO_TYPE_UYVY
+        self.video_frames = []
+        for _ in self.converter.buffers:
+            video_frame = ndi.VideoFrameV2()
+            video_frame.FourCC = fourcc
+            self.video_frames.append(video_frame)
+        self.frames_sent = 0
+        # optional MetricsRegistry, gets ndi_convert and ndi_send latencies
+        self.metrics = None
+        self.lock = threading.Lock()
+        self.set_frame_rate(fps)
+
+    def set_frame_rate(self, fps):
+        """ frame rate metadata sent with every frame, from the source's fps """
+        numerator, denominator = frame_rate_fraction(fps)
+        for video_frame in self.video_frames:
+            video_frame.frame_rate_N = numerator
+            video_frame.frame_rate_D = denominator
+
+    def send(self, frame):
+        """
+        Convert one BGR frame into the next buffer and queue it for sending, returns without
+        waiting for the transmission. Safe to call from a pipeline thread.
+        :param frame: BGR image from cv2 (UYVY needs an even width)
+        :return: nothing
+        """
+        with self.lock:
+            if self.ndi_send is None:
+                return
+            start = time.perf_counter()
+            index, buffer = self.converter.convert(frame)
+            converted = time.perf_counter()
+            video_frame = self.video_frames[index]
+            video_frame.data = buffer
+            self.ndi.send_send_video_async_v2(self.ndi_send, video_frame)
+            metrics = self.metrics
+            if metrics is not None:
+                metrics.record("ndi_convert", converted - start)
+                metrics.record("ndi_send", time.perf_counter() - converted)
+            self.frames_sent += 1
+
+    def close(self):
+        with self.lock:
+            if self.ndi_send is not None:
+                # destroy waits for the frame in flight before the buffers can go
+                self.ndi.send_destroy(self.ndi_send)
+                self.ndi_send = None
+                self.video_frames = []
+                self.converter = None
@@ -0,0 +1,129 @@
+"""
+OscFrameBundler collects all the OSC messages of one frame and sends them as
+timetagged OSC bundles instead of one UDP datagram per message.
+One bundle per frame means one syscall and the receiver (TouchDesigner)
+sees the whole skeleton update at once instead of a half updated one.
+Bundles are split so no datagram is bigger than max_datagram_size,
+keeping groups of messages (e.g. one person) in the same datagram where possible.
+
+Only the compact pose formats (pose_encoding, one /personN/pose message per person)
+fit a person in one datagram. The per landmark format does not: a 33 landmark person
+is 1456 + 488 bytes, so a 3 person frame goes out as 7 datagrams and a receiver can
+still see a person half updated if one of them is lost or late.
+"""
+
+import time
+
+from pythonosc.osc_message_builder import OscMessageBuilder
+from pythonosc.parsing import osc_types
+
+# 1500 byte ethernet MTU - 20 byte IP header - 8 byte UDP header
+DEFAULT_MAX_DATAGRAM_SIZE = 1472
+
+BUNDLE_PREFIX = b"#bundle\x00"
+# "#bundle\0" + 8 byte timetag
+BUNDLE_HEADER_SIZE = 16
+
+
+class OscDatagram:
+    """
+    Prebuilt OSC packet, accepted by pythonosc udp_client send()
+    which only needs the .dgram bytes.
+    pythonosc's OscBundle would re-parse every message just to wrap them.
+    """
+    def __init__(self, dgram):
+        self.dgram = dgram
+
+    @property
+    def size(self):
+        return len(self.dgram)
+
+
+def osc_sink(osc_client, bundle, max_datagram_size=DEFAULT_MAX_DATAGRAM_SIZE):
+    """
+    Where a detector's send_landmarks_via_osc should send its messages:
+    osc_client itself, or an OscFrameBundler wrapping it when bundle is set.
+    Call flush() on a bundler once all of the frame's messages are added.
+    """
+    if bundle:
+        return OscFrameBundler(osc_client, max_datagram_size=max_datagram_size)
+    return osc_client
+
+
+class OscFrameBundler:
+    """
+    Drop in replacement for the osc_client inside send_landmarks_via_osc:
+    send_message() only collects, flush() sends the frame as bundle(s).
+    """
+    def __init__(self, osc_client, timestamp=None, max_datagram_size=DEFAULT_MAX_DATAGRAM_SIZE):
+        """
+        :param osc_client: pythonosc udp_client (or anything with send(content))
+        :param timestamp: bundle timetag, seconds since epoch, default now
+        :param max_datagram_size: split bundles so none is larger than this
+        """
+        self.osc_client = osc_client
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.max_datagram_size = max_datagram_size
+        self._timetag = osc_types.write_date(self.timestamp)
+        self._contents = []      # encoded messages in the current bundle
+        self._size = BUNDLE_HEADER_SIZE
+        self._group_start = 0    # index in _contents of the first message of the open group
+        self._group_size = 0     # bytes of the open group
+        self.num_datagrams = 0
+
+    def send_message(self, address, value):
+        """ same signature as SimpleUDPClient.send_message, but only queues the message """
+        builder = OscMessageBuilder(address=address)
+        if value is None:
+            values = []
+        elif isinstance(value, (list, tuple)):
+            values = value
+        else:
+            values = [value]
+        for val in values:
+            builder.add_arg(val)
+        self.add_dgram(builder.build().dgram)
+
+    def send(self, content):
+        """ queue an already built OscMessage (or OscDatagram) """
+        self.add_dgram(content.dgram)
+
+    def add_dgram(self, dgram):
+        element_size = 4 + len(dgram)
+        if self._contents and self._size + element_size > self.max_datagram_size:
+            group_size = self._group_size + element_size
+            if self._group_start > 0 and BUNDLE_HEADER_SIZE + group_size <= self.max_datagram_size:
+                # send what came before the open group, carry the group over to the next bundle
+                carried = self._contents[self._group_start:]
+                self._contents = self._contents[:self._group_start]
+                self._send_bundle()
+                self._contents = carried
+                self._size = BUNDLE_HEADER_SIZE + self._group_size
+            else:
+                # group too big for a datagram on its own, it has to be split
+                self._send_bundle()
+                self._group_size = 0
+        self._contents.append(dgram)
+        self._size += element_size
+        self._group_size += element_size
+
+    def end_group(self):
+        """ messages since the last end_group() should stay together in one datagram """
+        self._group_start = len(self._contents)
+        self._group_size = 0
+
+    def flush(self):
+        """ send whatever is queued """
+        if self._contents:
+            self._send_bundle()
+
+    def _send_bundle(self):
+        parts = [BUNDLE_PREFIX, self._timetag]
+        for dgram in self._contents:
+            parts.append(osc_types.write_int(len(dgram)))
+            parts.append(dgram)
+        self.osc_client.send(OscDatagram(b"".join(parts)))
+        self.num_datagrams += 1
+        self._contents = []
+        self._size = BUNDLE_HEADER_SIZE
+        self._group_start = 0
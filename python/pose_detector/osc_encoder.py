@@ -0,0 +1,79 @@
+"""
+LandmarkOscEncoder sends the per-landmark OSC messages (/p1/<name> x y z,
+/personN/landmark/<name> x y z) without building them from scratch every frame.
+
+The padded address and ",fff" type tag bytes of every (person slot, landmark) message
+are laid out once in a bytearray. Per frame the float payloads are patched in with
+one numpy assignment through a big-endian float32 view of that buffer, and the
+prebuilt memoryview datagrams are handed to the osc client (or OscFrameBundler).
+The output is byte for byte what pythonosc's OscMessageBuilder would produce.
+"""
+
+import numpy as np
+
+from .osc_bundle import OscDatagram
+
+
+def osc_string(text):
+    """ OSC string: ascii bytes, null terminated, padded with nulls to a multiple of 4 """
+    data = text.encode("ascii") + b"\x00"
+    return data + b"\x00" * (-len(data) % 4)
+
+
+class _PersonSlot:
+    """ precompiled messages of one person slot """
+    def __init__(self, addresses, values_per_landmark):
+        typetags = osc_string("," + "f" * values_per_landmark)
+        payload_size = 4 * values_per_landmark
+        heads = [osc_string(address) + typetags for address in addresses]
+
+        self.buffer = bytearray(sum(len(head) + payload_size for head in heads))
+        # word index (in 4 byte units) of every float, shape (K, values_per_landmark)
+        self.index = np.empty((len(heads), values_per_landmark), dtype=np.intp)
+        spans = []
+        offset = 0
+        for idx, head in enumerate(heads):
+            self.buffer[offset:offset + len(head)] = head
+            payload = offset + len(head)
+            self.index[idx] = np.arange(payload // 4, payload // 4 + values_per_landmark)
+            spans.append((offset, payload + payload_size))
+            offset = payload + payload_size
+
+        self.words = np.frombuffer(self.buffer, dtype='>f4')
+        view = memoryview(self.buffer)
+        self.datagrams = [OscDatagram(view[start:end]) for start, end in spans]
+
+
+class LandmarkOscEncoder:
+    """
+    Precompiled encoder for one message per landmark.
+    address_format is formatted with person (slot number) and name (landmark name),
+    e.g. "/p1/{name}" or "/person{person}/landmark/{name}".
+    """
+    def __init__(self, address_format, landmark_names, values_per_landmark=3):
+        self.address_format = address_format
+        self.landmark_names = list(landmark_names)
+        self.values_per_landmark = values_per_landmark
+        self._slots = []
+
+    def _get_slot(self, person_id):
+        # slots are compiled on first use, then kept for the life of the encoder
+        while len(self._slots) <= person_id:
+            person = len(self._slots)
+            addresses = [self.address_format.format(person=person, name=name) for name in self.landmark_names]
+            self._slots.append(_PersonSlot(addresses, self.values_per_landmark))
+        return self._slots[person_id]
+
+    def send_person(self, sink, person_id, landmarks):
+        """
+        Patch one person's landmark values into the precompiled messages and send them
+        :param sink: pythonosc udp client, OscFrameBundler, or anything with send(content)
+        :param person_id: slot number used in the address
+        :param landmarks: (K, >= values_per_landmark) array, the first values_per_landmark columns are sent
+        :return: nothing
+        """
+        slot = self._get_slot(person_id)
+        count = min(len(landmarks), len(slot.datagrams))
+        slot.words[slot.index[:count]] = np.asarray(landmarks)[:count, :self.values_per_landmark]
+        for datagram in slot.datagrams[:count]:
+            sink.send(datagram)
@@ -0,0 +1,526 @@
+"""
+PosePipeline runs capture, inference, NDI out, OSC out and preview as separate
+worker threads connected by small bounded queues, so the slowest stage
+(usually the pose detector) no longer sets the frame rate for everything else.
+
+    capture --+--> ndi queue -------> NDI out
+              |
+              +--> inference queue --> inference --+--> osc queue -----> OSC out
+                                                   |
+                                                   +--> preview queue --> preview --> display queue (Tk)
+
+Each queue has a policy: DROP_OLDEST throws away the stalest frame when full
+(right for video, we always want the newest frame), BLOCK makes the producer
+wait (right for OSC, where every detection should go out in order).
+
+Inference, NDI and preview can each run at their own resolution (inference_size,
+ndi_size, preview_size); a downscale is done once per frame and size and shared
+by every stage that asks for that size (FramePacket.resized). Landmarks are
+normalized, so they stay full frame coordinates whatever the inference size.
+
+With osc_rate set, the OSC queue is replaced by an OSC clock thread that sends
+at a fixed rate from a PoseInterpolator fed by the (possibly decimated, see
+inference_every) detections.
+"""
+
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from .metrics import MetricsRegistry, log_limited
+from .osc_bundle import OscDatagram
+from .pose_interpolation import EXTRAPOLATE, PoseInterpolator
+from .pose_recording import (SubmittedFrames, detector_num_landmarks, detector_pose_arrays, detector_schema,
+                             load_detector_record, make_replay_detector)
+
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+
+# default policy per queue, override with PosePipeline(queue_policies={...})
+default_queue_policies = {
+    "ndi": DROP_OLDEST,
+    "inference": DROP_OLDEST,
+    "osc": BLOCK,
+    "preview": DROP_OLDEST,
+    "display": DROP_OLDEST,
+}
+
+
+class FrameQueue:
+    """
+    Bounded thread safe queue with a drop-oldest or block policy on overflow.
+    close() wakes up any waiting producer/consumer so stages can shut down.
+    """
+    def __init__(self, name, maxsize=2, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"unknown queue policy {policy}")
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.dropped = 0
+        self._items = deque()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        """
+        Add an item, applying the overflow policy
+        :param item:
+        :return: False if the queue was closed before the item could be added
+        """
+        with self._cond:
+            while len(self._items) >= self.maxsize and not self._closed:
+                if self.policy == DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                else:
+                    self._cond.wait(0.1)
+            if self._closed:
+                return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Remove and return the oldest item
+        :param timeout: seconds to wait, None waits until an item arrives or the queue is closed
+        :return: the item, or None on timeout/close
+        """
+        with self._cond:
+            if timeout is None:
+                while not self._items and not self._closed:
+                    self._cond.wait(0.1)
+            elif not self._items and not self._closed and timeout > 0:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
+
+
+def resolve_size(size, frame_width, frame_height):
+    """
+    Pixel size for a stage
+    :param size: None for the capture size, an int width (height keeps the aspect ratio) or (width, height)
+    :return: (width, height)
+    """
+    if size is None:
+        return frame_width, frame_height
+    if isinstance(size, int):
+        return size, max(1, round(frame_height * size / frame_width))
+    return tuple(size)
+
+
+class FramePacket:
+    """
+    One captured frame travelling through the pipeline.
+    The captured frame is shared read-only between stages; a stage that wants
+    to draw on it must work on a copy.
+    """
+    def __init__(self, frame_index, loop_count, timestamp, frame):
+        self.frame_index = frame_index
+        self.loop_count = loop_count
+        self.timestamp = timestamp
+        self.frame = frame
+        self.frame_height, self.frame_width = frame.shape[:2]
+        # downscaled copies by (width, height), shared read-only like frame
+        self._resized = {}
+        self.results = None
+        # (address, value) pairs or raw OSC content produced by the detector
+        self.osc_messages = None
+        # frame with landmarks drawn, or RGB PIL image once through preview
+        self.preview = None
+
+    def resized(self, size):
+        """
+        The frame at a stage's resolution, resized at most once per size
+        :param size: as for resolve_size
+        :return: BGR image, the frame itself if it already has that size
+        """
+        width, height = resolve_size(size, self.frame_width, self.frame_height)
+        if (width, height) == (self.frame_width, self.frame_height):
+            return self.frame
+        image = self._resized.get((width, height))
+        if image is None:
+            # two stages racing for the same size may both resize, harmless, the dict keeps one
+            image = cv2.resize(self.frame, (width, height), interpolation=cv2.INTER_AREA)
+            self._resized[(width, height)] = image
+        return image
+
+
+class OscMessageCollector:
+    """
+    Quacks like pythonosc SimpleUDPClient but only records what would be sent.
+    Lets the inference stage snapshot the detector output while the actual
+    UDP sends happen later on the OSC stage.
+    """
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, address, value):
+        # copy lists so later detector updates can't change what we send
+        if isinstance(value, (list, tuple)):
+            value = list(value)
+        self.messages.append((address, value))
+
+    def send(self, content):
+        # precompiled datagrams share a buffer that is rewritten next frame, keep a copy
+        self.messages.append((None, OscDatagram(bytes(content.dgram))))
+
+    def replay(self, osc_client):
+        """ send everything recorded to a real osc client """
+        for address, value in self.messages:
+            if address is None:
+                osc_client.send(value)
+            else:
+                osc_client.send_message(address, value)
+
+
+class PosePipeline:
+    """
+    Threaded capture -> inference -> NDI/OSC/preview pipeline.
+
+    ndi_out, osc_client and recorder may be set, changed or cleared while running,
+    the stages check them on every frame. ndi_out is a callable taking a BGR frame.
+    detection_cache (a DetectionCache for the file being played) serves repeated frames
+    of a looping file without running the detector.
+
+    inference_every=N runs the detector on every Nth captured frame only (1 = every frame
+    the inference thread gets to, it always skips to the newest). osc_rate (Hz) sends OSC
+    at a fixed rate, interpolated or extrapolated between detections (osc_smoothing, see
+    pose_interpolation), instead of once per detection.
+
+    roi (a RoiTracker) crops each frame around the people found in the previous one
+    before inference, results stay in full frame coordinates.
+
+    inference_size, ndi_size and preview_size: None for the capture size,
+    a width (aspect ratio kept) or (width, height). image-width/height sent over OSC
+    stay the capture size.
+
+    preview_fps caps how often a preview frame is drawn and handed to the GUI, independent
+    of the processing rate (0 for every frame). preview_enabled can be switched while running.
+
+    Every stage records its latency, frame counts, queue depths and drops into metrics
+    (a MetricsRegistry, see metrics.MetricsReporter to publish it).
+
+    replace_detector() swaps in another detector (and inference size) between two frames,
+    quality_controller (a QualityController, see quality_controller.py) is told the time
+    of every detection and does that to hold a frame rate.
+    """
+    def __init__(self, cap, pose_detector, fps=30.0, is_file=False, looping=False,
+                 ndi_out=None, osc_client=None, preview=True, preview_size=None,
+                 queue_size=2, queue_policies=None, recorder=None, detection_cache=None,
+                 inference_every=1, osc_rate=None, osc_smoothing=EXTRAPOLATE, roi=None,
+                 inference_size=None, ndi_size=None, preview_fps=15, metrics=None):
+        self.cap = cap
+        self.pose_detector = pose_detector
+        self.fps = fps if fps and fps >= 1 else 30.0
+        self.is_file = is_file
+        self.looping = looping
+        self.ndi_out = ndi_out
+        self.osc_client = osc_client
+        self.preview_enabled = preview
+        self.preview_size = preview_size
+        self.preview_fps = preview_fps
+        self.inference_size = inference_size
+        self.ndi_size = ndi_size
+        # optional PoseRecorder, every detection is appended to it
+        self.recorder = recorder
+        # optional DetectionCache, keyed by frame_index so only meaningful for files
+        self.detection_cache = detection_cache if is_file else None
+        self.inference_every = max(1, int(inference_every))
+        self.osc_rate = osc_rate
+        self.interpolator = PoseInterpolator(osc_smoothing) if osc_rate else None
+        self.roi = roi
+        self.quality_controller = None
+        # packets handed to an asynchronous detector, so its late results are filed under their own frame
+        self.submitted = SubmittedFrames()
+        # (pose_detector, inference_size) waiting to be swapped in by the inference thread
+        self._pending_detector = None
+        self._pending_lock = threading.Lock()
+
+        policies = dict(default_queue_policies)
+        if queue_policies:
+            policies.update(queue_policies)
+        self.queues = {name: FrameQueue(name, queue_size, policy)
+                       for name, policy in policies.items()}
+
+        self.running = False
+        self.finished = False   # set when a non looping file reaches its end
+        self.frameCount = 0
+        self.loopcount = 1
+        # running totals, frameCount restarts every loop
+        self.frames_captured = 0
+        self.frames_inferred = 0
+        self._threads = []
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.metrics.add_collector(self._collect_metrics)
+
+    def start(self):
+        self.running = True
+        self.finished = False
+        stages = [
+            ("capture", self._capture_stage),
+            ("ndi", self._ndi_stage),
+            ("inference", self._inference_stage),
+            ("osc", self._osc_clock_stage if self.osc_rate else self._osc_stage),
+            ("preview", self._preview_stage),
+        ]
+        for name, target in stages:
+            thread = threading.Thread(target=target, name=f"pose-{name}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        self.running = False
+        for queue in self.queues.values():
+            queue.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = []
+
+    def get_display_frame(self):
+        """
+        Non blocking fetch of the newest preview frame for the GUI thread
+        :return: FramePacket with .preview as RGB PIL-ready array, or None
+        """
+        return self.queues["display"].get(timeout=0)
+
+    def replace_detector(self, pose_detector, inference_size=None):
+        """
+        Use pose_detector (and inference_size) from the next frame on, the old detector is closed.
+        pose_detector must have the same landmarks per person as the one it replaces.
+        """
+        with self._pending_lock:
+            self._pending_detector = (pose_detector, inference_size)
+        if not self.running:
+            self._swap_detector()
+
+    def _swap_detector(self):
+        with self._pending_lock:
+            pending, self._pending_detector = self._pending_detector, None
+        if pending is None:
+            return
+        old_detector = self.pose_detector
+        self.pose_detector, self.inference_size = pending
+        self.submitted.clear()
+        if hasattr(old_detector, "close"):
+            old_detector.close()
+
+    def dropped_frames(self):
+        return {name: queue.dropped for name, queue in self.queues.items()}
+
+    def _collect_metrics(self, metrics):
+        for name, queue in self.queues.items():
+            metrics.set_gauge(f"queue_{name}_depth", queue.qsize())
+            metrics.set_gauge(f"queue_{name}_dropped", queue.dropped)
+
+    def _capture_stage(self):
+        frame_interval = 1.0 / self.fps
+        next_time = time.perf_counter()
+        metrics = self.metrics
+        while self.running:
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            metrics.record("read", time.perf_counter() - start)
+            if not ret:
+                if self.is_file and self.looping:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    self.loopcount += 1
+                    self.frameCount = 0
+                    ret, frame = self.cap.read()
+                if not ret:
+                    print("Video capture read failed, end of capture")
+                    self.finished = True
+                    self.running = False
+                    break
+
+            packet = FramePacket(self.frameCount, self.loopcount, time.time(), frame)
+            self.frameCount += 1
+            self.frames_captured += 1
+            metrics.increment("captured")
+            self.queues["ndi"].put(packet)
+            self.queues["inference"].put(packet)
+
+            # webcams pace themselves in read(), files have to be paced to their fps
+            if self.is_file:
+                next_time += frame_interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.perf_counter()
+
+    def _ndi_stage(self):
+        queue = self.queues["ndi"]
+        while self.running:
+            packet = queue.get()
+            if packet is None:
+                continue
+            ndi_out = self.ndi_out
+            if ndi_out is not None:
+                with self.metrics.time("ndi"):
+                    ndi_out(packet.resized(self.ndi_size))
+                self.metrics.increment("ndi_sent")
+
+    def _inference_stage(self):
+        queue = self.queues["inference"]
+        num_landmarks = detector_num_landmarks(self.pose_detector)
+        results = None
+        next_preview_time = 0.0
+        metrics = self.metrics
+        while self.running:
+            packet = queue.get()
+            if packet is None:
+                continue
+            if self._pending_detector is not None:
+                self._swap_detector()
+            new_result = False
+            result_packet = None
+            if packet.frame_index % self.inference_every:
+                # decimated frame: preview shows the last detection, nothing new to send
+                packet.results = results
+            else:
+                start = time.perf_counter()
+                results, result_packet = self._detect(packet)
+                packet.results = results
+                elapsed = time.perf_counter() - start
+                metrics.record("inference", elapsed)
+                # an asynchronous detector (live_stream) returns its previous result until a newer one is done
+                new_result = result_packet is not None
+                quality_controller = self.quality_controller
+                if quality_controller is not None and new_result:
+                    quality_controller.observe(elapsed)
+            if not new_result:
+                packet.osc_messages = None
+            else:
+                self.frames_inferred += 1
+                metrics.increment("inferred")
+                recorder = self.recorder
+                if recorder is not None:
+                    recorder.write_detector(result_packet.frame_index, result_packet.timestamp, self.pose_detector)
+
+                if self.interpolator is not None:
+                    self.interpolator.add(result_packet.timestamp,
+                                          *detector_pose_arrays(self.pose_detector, num_landmarks))
+                elif packet.results and self.osc_client is not None:
+                    collector = OscMessageCollector()
+                    with metrics.time("osc_encode"):
+                        self.pose_detector.send_landmarks_via_osc(collector)
+                    packet.osc_messages = collector
+                    self.queues["osc"].put(packet)
+
+            if self.preview_enabled and packet.timestamp >= next_preview_time:
+                if self.preview_fps:
+                    # keep to the preview clock, but never more than one interval behind it
+                    interval = 1.0 / self.preview_fps
+                    next_preview_time = max(next_preview_time, packet.timestamp - interval) + interval
+                # landmarks are normalized, so they draw right at the preview size
+                start = time.perf_counter()
+                preview = packet.resized(self.preview_size).copy()
+                if packet.results:
+                    self.pose_detector.draw_landmarks(preview)
+                metrics.record("preview_draw", time.perf_counter() - start)
+                packet.preview = preview
+                self.queues["preview"].put(packet)
+
+    def _detect(self, packet):
+        """
+        Run the detector on a packet, or load its result from the detection cache
+        :return: (results, packet the result was detected in, None if the detector has no new result)
+        """
+        cache = self.detection_cache
+        record = cache.get(packet.frame_index) if cache is not None else None
+        if record is not None:
+            self.metrics.increment("cache_hits")
+            return load_detector_record(self.pose_detector, record), packet
+        roi = self.roi
+        if roi is not None:
+            # crop the full resolution frame, then scale the crop down to the inference size
+            max_size = (resolve_size(self.inference_size, packet.frame_width, packet.frame_height)
+                        if self.inference_size is not None else None)
+            results = roi.process_image(self.pose_detector, packet.frame, max_size)
+        else:
+            results = self.pose_detector.process_image(packet.resized(self.inference_size))
+        # an asynchronous detector's result belongs to an earlier frame, file it under that one
+        result_packet = self.submitted.match(self.pose_detector, packet)
+        # receivers scale the normalized landmarks by the capture size, not the inference size
+        self.pose_detector.image_width, self.pose_detector.image_height = packet.frame_width, packet.frame_height
+        if cache is not None and result_packet is not None:
+            cache.put(result_packet.frame_index, self.pose_detector)
+        return results, result_packet
+
+    def _osc_stage(self):
+        queue = self.queues["osc"]
+        while self.running:
+            packet = queue.get()
+            if packet is None:
+                continue
+            osc_client = self.osc_client
+            if osc_client is not None:
+                try:
+                    with self.metrics.time("osc_send"):
+                        packet.osc_messages.replay(osc_client)
+                    self.metrics.increment("osc_sent")
+                    # capture timestamp to the last datagram leaving
+                    self.metrics.record("capture_to_osc", time.time() - packet.timestamp)
+                except Exception as e:
+                    self.metrics.increment("osc_errors")
+                    log_limited("osc-send", f"Error: Cannot send OSC message {e}")
+
+    def _osc_clock_stage(self):
+        # a replay detector formats the interpolated poses with the live detector's OSC schema,
+        # its /framecount counts output frames
+        output = make_replay_detector(detector_schema(self.pose_detector),
+                                      detector_num_landmarks(self.pose_detector))
+        interval = 1.0 / self.osc_rate
+        next_time = time.perf_counter()
+        while self.running:
+            next_time += interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.perf_counter()
+
+            osc_client = self.osc_client
+            record = self.interpolator.sample(time.time())
+            if osc_client is None or record is None or len(record.landmarks) == 0:
+                continue
+            for setting in ("osc_bundle", "osc_max_datagram_size", "osc_pose_format",
+                            "osc_precompiled", "osc_address_prefix"):
+                setattr(output, setting, getattr(self.pose_detector, setting))
+            output.load_record(record)
+            try:
+                with self.metrics.time("osc_send"):
+                    output.send_landmarks_via_osc(osc_client)
+                self.metrics.increment("osc_sent")
+            except Exception as e:
+                self.metrics.increment("osc_errors")
+                log_limited("osc-send", f"Error: Cannot send OSC message {e}")
+
+    def _preview_stage(self):
+        queue = self.queues["preview"]
+        while self.running:
+            packet = queue.get()
+            if packet is None:
+                continue
+            with self.metrics.time("preview_convert"):
+                packet.preview = cv2.cvtColor(packet.preview, cv2.COLOR_BGR2RGB)
+            self.metrics.increment("previewed")
+            self.queues["display"].put(packet)
@@ -0,0 +1,266 @@
+"""
+Measure the pipeline around the model: capture hand-off, queueing, OSC encoding and
+sending, NDI conversion, preview drawing. No mediapipe, NDI or camera needed.
+
+    python -m pose_detector.pipeline_benchmark
+    python -m pose_detector.pipeline_benchmark --fps 0 --persons 4 --pose-format blob --ndi-format UYVY
+    python -m pose_detector.pipeline_benchmark --osc 127.0.0.1:5005   (to testScripts/oscServer.py instead)
+
+Run from the python folder. Frames come from memory (MemoryCapture over synthetic frames
+or the first frames of --clip), the model is PoseDetectorFake (deterministic poses,
+optional --detector-latency), OSC goes to a loopback UDP listener in this process that
+only counts datagrams, NDI frames are converted exactly like NdiSender does
+(NdiFrameConverter) and then dropped, preview frames are drawn, converted and taken off
+the display queue like the GUI does.
+
+At the default --fps 30 the load is a real camera's and cpu_us_per_frame (process CPU time
+per captured frame, all threads) is the number to compare between code changes. With
+--fps 0 the capture runs flat out (spinning on the in-memory frames) and the fps of each
+stage is the most the glue can keep up with, CPU per frame means nothing then.
+"""
+
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+
+import cv2
+
+from .benchmark import load_clip_frames, synthetic_frames
+from .metrics import MetricsRegistry, format_snapshot
+from .ndi_sender import PIXEL_FORMAT_BGRX, PIXEL_FORMATS, NdiFrameConverter
+from .pipeline import PosePipeline
+from .pose_encoding import POSE_FORMAT_LANDMARKS, POSE_FORMATS
+from .multiSkelton.poseDetector_fake import PoseDetectorFake
+
+DEFAULT_SECONDS = 10.0
+DEFAULT_WARMUP = 1.0
+DEFAULT_SIZE = (1280, 720)
+
+
+class MemoryCapture:
+    """ cv2.VideoCapture stand-in that plays a list of frames, looping, as fast as it is read """
+    def __init__(self, frames, fps=30.0):
+        self.frames = frames
+        self.fps = fps
+        self.position = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        frame = self.frames[self.position % len(self.frames)]
+        self.position += 1
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = int(value)
+            return True
+        return False
+
+    def release(self):
+        pass
+
+
+class LoopbackUdpSink:
+    """ UDP listener on 127.0.0.1 counting what the pipeline sends, without decoding it """
+    def __init__(self, host="127.0.0.1", port=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # room for a few frames of per landmark messages, so counting never loses datagrams
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.address = self.sock.getsockname()
+        self.datagrams = 0
+        self.bytes = 0
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._receive, name="bench-udp-sink", daemon=True)
+        self._thread.start()
+
+    def _receive(self):
+        while self.running:
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.datagrams += 1
+            self.bytes += len(data)
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(1.0)
+        self.sock.close()
+
+
+class ConvertOnlyNdi:
+    """ ndi_out that does NdiSender's conversion into the reused buffers and drops the frame """
+    def __init__(self, metrics, pixel_format=PIXEL_FORMAT_BGRX):
+        self.converter = NdiFrameConverter(pixel_format)
+        self.metrics = metrics
+        self.frames = 0
+
+    def send(self, frame):
+        with self.metrics.time("ndi_convert"):
+            self.converter.convert(frame)
+        self.frames += 1
+
+
+def drain_display(pipeline, stop_event):
+    """ take preview frames off the display queue like the GUI's display_frame does """
+    while not stop_event.is_set():
+        if pipeline.get_display_frame() is None:
+            time.sleep(0.002)
+
+
+def run(args):
+    """
+    One benchmark run
+    :return: dict with the settings, per stage fps and latency (us), cpu_us_per_frame, OSC traffic
+    """
+    from pythonosc import udp_client
+    if args.clip:
+        frames = load_clip_frames(args.clip, 120)
+        if args.width:
+            frames = [cv2.resize(frame, (args.width, args.height or round(frame.shape[0] * args.width / frame.shape[1])),
+                                 interpolation=cv2.INTER_AREA) for frame in frames]
+    else:
+        frames = synthetic_frames(120, (args.width or DEFAULT_SIZE[0], args.height or DEFAULT_SIZE[1]))
+    height, width = frames[0].shape[:2]
+
+    metrics = MetricsRegistry()
+    pose_detector = PoseDetectorFake(num_poses=args.persons, latency=args.detector_latency / 1000)
+    pose_detector.osc_pose_format = args.pose_format
+    pose_detector.osc_bundle = args.osc_bundle
+
+    sink = None
+    if args.no_osc:
+        osc_client = None
+    elif args.osc:
+        host, _, port = args.osc.rpartition(":")
+        osc_client = udp_client.SimpleUDPClient(host or "127.0.0.1", int(port))
+    else:
+        sink = LoopbackUdpSink()
+        sink.start()
+        osc_client = udp_client.SimpleUDPClient(*sink.address)
+    ndi = None if args.no_ndi else ConvertOnlyNdi(metrics, args.ndi_format)
+
+    paced = bool(args.fps)
+    cap = MemoryCapture(frames, args.fps or 30.0)
+    pipeline = PosePipeline(cap, pose_detector, fps=cap.fps, is_file=paced, looping=True,
+                            ndi_out=ndi.send if ndi is not None else None, osc_client=osc_client,
+                            preview=not args.no_preview, preview_size=args.preview_width or None,
+                            preview_fps=args.preview_fps, inference_every=args.pose_every,
+                            osc_rate=args.osc_rate or None, inference_size=args.inference_width or None,
+                            ndi_size=args.ndi_width or None, metrics=metrics)
+    stop_display = threading.Event()
+    display_thread = threading.Thread(target=drain_display, args=(pipeline, stop_display), daemon=True)
+
+    pipeline.start()
+    display_thread.start()
+    try:
+        time.sleep(args.warmup)
+        metrics.snapshot()
+        start_datagrams, start_bytes = (sink.datagrams, sink.bytes) if sink else (0, 0)
+        start_cpu, start_time = time.process_time(), time.perf_counter()
+        time.sleep(args.seconds)
+        cpu, elapsed = time.process_time() - start_cpu, time.perf_counter() - start_time
+        snapshot = metrics.snapshot()
+    finally:
+        pipeline.stop()
+        stop_display.set()
+        display_thread.join(1.0)
+        if sink is not None:
+            sink.stop()
+
+    captured = snapshot["rates"].get("captured", 0.0) * snapshot["interval"]
+    result = {
+        "settings": {key: value for key, value in vars(args).items() if key != "results"},
+        "frame_size": [width, height],
+        "seconds": elapsed,
+        "fps": snapshot["rates"],
+        "latency_us": {name: {"mean": 1000 * summary["mean_ms"], "p95": 1000 * summary["p95_ms"]}
+                       for name, summary in snapshot["latency"].items() if summary["count"]},
+        "cpu_us_per_frame": 1e6 * cpu / captured if captured and paced else None,
+        "cpu_percent": 100 * cpu / elapsed,
+        "dropped": pipeline.dropped_frames(),
+    }
+    if sink is not None:
+        result["osc_datagrams_per_s"] = (sink.datagrams - start_datagrams) / elapsed
+        result["osc_kbytes_per_s"] = (sink.bytes - start_bytes) / elapsed / 1024
+    result["summary"] = format_snapshot(snapshot)
+    return result
+
+
+def format_result(result):
+    lines = [f"frames {result['frame_size'][0]}x{result['frame_size'][1]}, {result['seconds']:.1f}s measured"]
+    lines.append("fps        " + "  ".join(f"{name} {rate:.1f}" for name, rate in sorted(result["fps"].items())))
+    lines.append("latency us " + "  ".join(f"{name} {values['mean']:.0f}/{values['p95']:.0f}"
+                                         for name, values in sorted(result["latency_us"].items())))
+    if result["cpu_us_per_frame"] is not None:
+        lines.append(f"cpu        {result['cpu_us_per_frame']:.0f} us per captured frame, "
+                     f"{result['cpu_percent']:.0f}% of one core")
+    if "osc_datagrams_per_s" in result:
+        lines.append(f"osc        {result['osc_datagrams_per_s']:.0f} datagrams/s, "
+                     f"{result['osc_kbytes_per_s']:.0f} KB/s")
+    lines.append("dropped    " + "  ".join(f"{name} {count}" for name, count in sorted(result["dropped"].items())))
+    return "\n".join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m pose_detector.pipeline_benchmark",
+                                     description="Pipeline overhead with a fake detector and in-memory sinks")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS, help="measured time")
+    parser.add_argument("--warmup", type=float, default=DEFAULT_WARMUP, help="seconds before measuring")
+    parser.add_argument("--clip", help="use the first frames of this video instead of synthetic frames")
+    parser.add_argument("--width", type=int, help=f"frame width (default {DEFAULT_SIZE[0]})")
+    parser.add_argument("--height", type=int, help=f"frame height (default {DEFAULT_SIZE[1]})")
+    parser.add_argument("--fps", type=float, default=30, help="pace capture to this rate, 0 = as fast as possible")
+    parser.add_argument("--persons", type=int, default=2, help="people the fake detector finds")
+    parser.add_argument("--detector-latency", type=float, default=0.0, help="ms the fake detector takes")
+    parser.add_argument("--pose-format", choices=POSE_FORMATS, default=POSE_FORMAT_LANDMARKS)
+    parser.add_argument("--osc-bundle", action="store_true", help="one OSC bundle per frame")
+    parser.add_argument("--osc-rate", type=float, default=0, help="OSC clock rate (Hz), 0 = per detection")
+    parser.add_argument("--osc", help="send OSC to host:port instead of the in-process counter")
+    parser.add_argument("--no-osc", action="store_true")
+    parser.add_argument("--ndi-format", choices=PIXEL_FORMATS, default=PIXEL_FORMAT_BGRX)
+    parser.add_argument("--no-ndi", action="store_true")
+    parser.add_argument("--no-preview", action="store_true")
+    parser.add_argument("--preview-fps", type=float, default=15)
+    parser.add_argument("--preview-width", type=int, default=640)
+    parser.add_argument("--pose-every", type=int, default=1)
+    parser.add_argument("--inference-width", type=int, default=0)
+    parser.add_argument("--ndi-width", type=int, default=0)
+    parser.add_argument("--results", help="write the result as JSON here")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    result = run(args)
+    print(format_result(result))
+    if args.results:
+        with open(args.results, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"pipeline_benchmark: results in {args.results}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
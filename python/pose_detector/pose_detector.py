@@ -1,6 +1,19 @@
+from .osc_bundle import DEFAULT_MAX_DATAGRAM_SIZE, osc_sink
+from .pose_encoding import POSE_FORMAT_LANDMARKS
+
+
 class PoseDetector:
     def __init__(self):
         self.results = None
+        # send each frame as one timetagged OSC bundle instead of one datagram per message
+        self.osc_bundle = False
+        self.osc_max_datagram_size = DEFAULT_MAX_DATAGRAM_SIZE
+        # landmarks: one message per landmark, or floats/blob/int16: one /p1/pose message (see pose_encoding)
+        self.osc_pose_format = POSE_FORMAT_LANDMARKS
+        # per landmark messages from precompiled address/type tag bytes (see osc_encoder)
+        self.osc_precompiled = True
+        # prepended to every OSC address, e.g. "/cam1" gives /cam1/p1/head
+        self.osc_address_prefix = ""
     def get_landmark_name(self, landmark_id):
         """
         Returns the name of the landmark given the landmark id
@@ -17,6 +30,45 @@ class PoseDetector:
         """
         raise NotImplementedError("process_image method must be implemented in subclass")
 
+    def get_landmark_array(self):
+        """
+        Landmarks of the last processed image as a (num_landmarks, 4) numpy array
+        of x, y, z, visibility, used by recording and compact encodings
+        :return: array, or None if nothing was detected
+        """
+        raise NotImplementedError("get_landmark_array method must be implemented in subclass")
+
+    def get_model_settings(self):
+        """
+        Settings that change what process_image returns, as a dict of plain values.
+        Together with the class name they identify cached detections (see detection_cache)
+        :return: dict, empty if the model has no options
+        """
+        return {}
+
+    def load_landmark_array(self, pose, image_width, image_height):
+        """
+        Make a stored (num_landmarks, 4) result the current detection, as if process_image produced it.
+        Used to serve cached or recorded poses without running the model
+        :param pose: array as returned by get_landmark_array, or None for nobody detected
+        :return: same as process_image
+        """
+        raise NotImplementedError("load_landmark_array method must be implemented in subclass")
+
+    def map_to_frame(self, left, top, width, height, frame_width, frame_height):
+        """
+        The last image was a crop of a bigger frame (see roi): convert the results
+        to normalized coordinates of the full frame
+        :param left: crop position and size, normalized to the full frame
+        :param top:
+        :param width:
+        :param height:
+        :param frame_width: full frame size in pixels
+        :param frame_height:
+        :return: nothing
+        """
+        raise NotImplementedError("map_to_frame method must be implemented in subclass")
+
     def draw_landmarks(self, image):
         """
         Draw the pose landmarks over the image (optional)
@@ -29,8 +81,14 @@ class PoseDetector:
         """
         Send the pose landmarks via OSC (Open Sound Control)
         form should be /p1/landmark_name [x, y, z]
+        or a single /p1/pose message when self.osc_pose_format is a compact format
         may also send /image-height, /image-width, /numLandmarks
+        if self.osc_bundle is set, the whole frame goes out as one bundle (see get_osc_sink)
         :param osc_client:
         :return: nothing
         """
         raise NotImplementedError("send_landmarks_via_osc method must be implemented in subclass")
+
+    def get_osc_sink(self, osc_client):
+        """ the client itself, or an OscFrameBundler when self.osc_bundle is set (see osc_bundle.osc_sink) """
+        return osc_sink(osc_client, self.osc_bundle, self.osc_max_datagram_size)
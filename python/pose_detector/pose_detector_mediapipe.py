@@ -1,7 +1,13 @@
+from types import SimpleNamespace
+
 import mediapipe as mp
+from mediapipe.framework.formats import landmark_pb2
 
 from pythonosc import udp_client
+from .metrics import log_limited
+from .osc_encoder import LandmarkOscEncoder
 from .pose_detector import PoseDetector
+from .pose_encoding import POSE_FORMAT_LANDMARKS, encode_pose, landmarks_to_array
 
 class PoseDetectorMediapipe(PoseDetector):
     pose_id_to_name = {
@@ -40,13 +46,23 @@ class PoseDetectorMediapipe(PoseDetector):
         32: 'foot_r'
     }
 
-    def __init__(self):
+    def __init__(self, osc_bundle=False, osc_pose_format=POSE_FORMAT_LANDMARKS, model_complexity=1):
+        """
+        :param model_complexity: 0 lite, 1 full, 2 heavy pose landmark model (faster to more accurate)
+        """
         super().__init__()
+        self.osc_bundle = osc_bundle
+        self.osc_pose_format = osc_pose_format
+        self.model_complexity = model_complexity
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose()
+        self.pose = self.mp_pose.Pose(model_complexity=model_complexity)
         self.mpDraw = mp.solutions.drawing_utils
         self.results = None
         self.frameCount = 0
+        self.landmark_encoder = None
+
+    def get_model_settings(self):
+        return {"model_complexity": self.model_complexity}
 
     def process_image(self, image):
         self.results = self.pose.process(image)
@@ -54,6 +70,37 @@ class PoseDetectorMediapipe(PoseDetector):
         self.frameCount += 1
         return self.results
 
+    def load_landmark_array(self, pose, image_width, image_height):
+        # rebuild the protobuf landmark list, so drawing and OSC work exactly as for a live result
+        landmark_list = None
+        if pose is not None:
+            landmark_list = landmark_pb2.NormalizedLandmarkList(landmark=[
+                landmark_pb2.NormalizedLandmark(x=x, y=y, z=z, visibility=visibility)
+                for x, y, z, visibility in pose.tolist()])
+        self.results = SimpleNamespace(pose_landmarks=landmark_list)
+        self.image_width, self.image_height = image_width, image_height
+        self.frameCount += 1
+        return self.results
+
+    def map_to_frame(self, left, top, width, height, frame_width, frame_height):
+        self.image_width, self.image_height = frame_width, frame_height
+        if self.results is None or self.results.pose_landmarks is None:
+            return
+        for landmark in self.results.pose_landmarks.landmark:
+            landmark.x = left + landmark.x * width
+            landmark.y = top + landmark.y * height
+            # z is on the same scale as x
+            landmark.z = landmark.z * width
+
+    def get_landmark_array(self):
+        """
+        landmarks of the last processed image as a (33, 4) float32 array of x, y, z, visibility
+        :return: array, or None if no pose was detected
+        """
+        if self.results is None or self.results.pose_landmarks is None:
+            return None
+        return landmarks_to_array(self.results.pose_landmarks.landmark)
+
     def get_num_landmarks(self):
         if self.results is None:
             return 0
@@ -73,25 +120,44 @@ class PoseDetectorMediapipe(PoseDetector):
     def get_landmark_name(self, landmark_id):
         return self.pose_id_to_name.get(landmark_id, "Unknown")
 
+    def get_landmark_encoder(self):
+        # built on first use and again if the address prefix changes
+        address_format = self.osc_address_prefix + "/p1/{name}"
+        if self.landmark_encoder is None or self.landmark_encoder.address_format != address_format:
+            self.landmark_encoder = LandmarkOscEncoder(
+                address_format, [self.get_landmark_name(idx) for idx in range(len(self.pose_id_to_name))])
+        return self.landmark_encoder
+
     def send_landmarks_via_osc(self, osc_client):
         if osc_client is None:
-            print("osc_client is None")
+            log_limited("mediapipe-osc", "osc_client is None")
             return
+        sink = self.get_osc_sink(osc_client)
+        prefix = self.osc_address_prefix
         try:
-            osc_client.send_message("/framecount", self.frameCount)
+            sink.send_message(f"{prefix}/framecount", self.frameCount)
         except Exception as e:
             print("Error: Cannot send OSC message", e)
 
-        osc_client.send_message(f"/image-height", self.image_height)
-        osc_client.send_message(f"/image-width", self.image_width)
+        sink.send_message(f"{prefix}/image-height", self.image_height)
+        sink.send_message(f"{prefix}/image-width", self.image_width)
         #print("height, width, num marks", self.image_height, self.image_width, self.get_num_landmarks())
 
-        if self.results is not None:
-            if self.results.pose_landmarks is not None:
-                for idx, lm in enumerate(self.results.pose_landmarks.landmark):
-                    osc_client.send_message(f"/p1/{self.get_landmark_name(idx)}", [lm.x, lm.y, lm.z])
-                osc_client.send_message(f"/numLandmarks", len(self.results.pose_landmarks.landmark))
+        pose = self.get_landmark_array()
+        if pose is not None:
+            if self.osc_pose_format == POSE_FORMAT_LANDMARKS and self.osc_precompiled:
+                self.get_landmark_encoder().send_person(sink, 0, pose)
+            elif self.osc_pose_format == POSE_FORMAT_LANDMARKS:
+                for idx, (x, y, z) in enumerate(pose[:, :3].tolist()):
+                    sink.send_message(f"{prefix}/p1/{self.get_landmark_name(idx)}", [x, y, z])
             else:
-                print("results.pose_landmarks is None")
+                # whole skeleton as one fixed layout message, 33 x (x, y, z, visibility)
+                sink.send_message(f"{prefix}/p1/pose", encode_pose(pose, self.osc_pose_format))
+            sink.send_message(f"{prefix}/numLandmarks", len(pose))
+        elif self.results is not None:
+            log_limited("mediapipe-pose", "results.pose_landmarks is None, no pose detected")
         else:
-            print("results is None")
+            log_limited("mediapipe-pose", "results is None")
+
+        if sink is not osc_client:
+            sink.flush()
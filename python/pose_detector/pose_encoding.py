@@ -0,0 +1,74 @@
+"""
+Compact pose encodings: one OSC message per person instead of one per landmark.
+
+The skeleton is a fixed layout of K landmarks x (x, y, z, visibility), row major,
+so a receiver (e.g. TouchDesigner OSC In DAT/CHOP) can unpack it by index
+without dispatching 33+ addresses, and the address strings no longer dominate bandwidth.
+
+pose formats:
+    landmarks   one message per landmark /p1/<name> x y z (the original output)
+    floats      /p1/pose with K*4 float arguments
+    blob        /p1/pose with one blob of K*4 little-endian float32
+    int16       /p1/pose with one blob of K*4 little-endian int16,
+                each value clipped to [-1, 1] and scaled by 32767
+"""
+
+import numpy as np
+
+POSE_FORMAT_LANDMARKS = "landmarks"
+POSE_FORMAT_FLOATS = "floats"
+POSE_FORMAT_BLOB = "blob"
+POSE_FORMAT_INT16 = "int16"
+POSE_FORMATS = (POSE_FORMAT_LANDMARKS, POSE_FORMAT_FLOATS, POSE_FORMAT_BLOB, POSE_FORMAT_INT16)
+
+# values per landmark in the compact formats
+POSE_VALUES_PER_LANDMARK = 4
+INT16_SCALE = 32767
+
+
+def landmarks_to_array(landmarks):
+    """
+    Pack landmark objects (anything with .x .y .z, optionally .visibility) into a (K, 4) float32 array
+    :param landmarks: iterable of landmarks
+    :return: numpy array, columns x, y, z, visibility (1.0 when the landmark has none)
+    """
+    return np.array([(lm.x, lm.y, lm.z, getattr(lm, 'visibility', 1.0)) for lm in landmarks],
+                    dtype=np.float32).reshape(-1, POSE_VALUES_PER_LANDMARK)
+
+
+def encode_pose(pose, pose_format):
+    """
+    Encode one person's (K, 4) landmark array as the argument of a single OSC message
+    :param pose: array-like (K, 4) x, y, z, visibility
+    :param pose_format: one of floats, blob, int16
+    :return: list of floats (floats) or bytes (blob, int16), pass as send_message value
+    """
+    pose = np.asarray(pose, dtype=np.float32)
+    if pose_format == POSE_FORMAT_FLOATS:
+        return pose.ravel().tolist()
+    if pose_format == POSE_FORMAT_BLOB:
+        return pose.astype('<f4', copy=False).tobytes()
+    if pose_format == POSE_FORMAT_INT16:
+        return quantize_int16(pose).tobytes()
+    raise ValueError(f"unknown compact pose format {pose_format}")
+
+
+def quantize_int16(pose):
+    """ values clipped to [-1, 1] and scaled to little-endian int16 """
+    return np.rint(np.clip(pose, -1.0, 1.0) * INT16_SCALE).astype('<i2')
+
+
+def decode_pose(value, num_landmarks, pose_format):
+    """
+    Inverse of encode_pose, handy for receivers written in python and for tests
+    :return: (num_landmarks, 4) float32 array
+    """
+    if pose_format == POSE_FORMAT_FLOATS:
+        pose = np.asarray(value, dtype=np.float32)
+    elif pose_format == POSE_FORMAT_BLOB:
+        pose = np.frombuffer(value, dtype='<f4').astype(np.float32)
+    elif pose_format == POSE_FORMAT_INT16:
+        pose = np.frombuffer(value, dtype='<i2').astype(np.float32) / INT16_SCALE
+    else:
+        raise ValueError(f"unknown compact pose format {pose_format}")
+    return pose.reshape(num_landmarks, POSE_VALUES_PER_LANDMARK)
@@ -0,0 +1,123 @@
+"""
+PoseInterpolator fills the gaps between sparse detections, so OSC can go out at
+a fixed rate (e.g. 60 Hz) while the detector only runs every Nth frame or as
+fast as the CPU allows (~15/s for the heavy MediaPipe model).
+
+Two modes:
+    INTERPOLATE  linear between the last two detections, output runs one detection interval late
+    EXTRAPOLATE  continue the last detection along its velocity for at most max_extrapolation
+                 seconds, then hold; no added latency, may overshoot on sudden stops
+
+Multi person detectors do not keep person order between images, so people of the
+previous detection are matched to the latest one by nearest landmark centroid.
+When the number of people changes the latest detection is held as is.
+"""
+
+import threading
+
+import numpy as np
+
+from .pose_recording import PoseRecord
+
+INTERPOLATE = "interpolate"
+EXTRAPOLATE = "extrapolate"
+SMOOTHING_MODES = (INTERPOLATE, EXTRAPOLATE)
+
+
+class _Detection:
+    def __init__(self, timestamp, landmarks, confidence, bbox, image_width, image_height):
+        self.timestamp = timestamp
+        self.landmarks = np.array(landmarks, dtype=np.float32)
+        num_persons = len(self.landmarks)
+        self.confidence = (np.full(num_persons, np.nan, dtype=np.float32) if confidence is None
+                           else np.array(confidence, dtype=np.float32))
+        self.bbox = (np.full((num_persons, 4), np.nan, dtype=np.float32) if bbox is None
+                     else np.array(bbox, dtype=np.float32))
+        self.image_width = image_width
+        self.image_height = image_height
+
+    def reorder(self, order):
+        self.landmarks = self.landmarks[order]
+        self.confidence = self.confidence[order]
+        self.bbox = self.bbox[order]
+
+
+def match_persons(previous, latest):
+    """
+    Order of previous's people that best lines up with latest's, by nearest x, y centroid
+    :param previous: (P, K, 4) landmarks
+    :param latest: (P, K, 4) landmarks
+    :return: index array into previous
+    """
+    if len(latest) <= 1:
+        return np.arange(len(latest))
+    previous_centers = previous[:, :, :2].mean(axis=1)
+    latest_centers = latest[:, :, :2].mean(axis=1)
+    distances = np.linalg.norm(latest_centers[:, np.newaxis] - previous_centers[np.newaxis], axis=2)
+    order = np.full(len(latest), -1)
+    # greedy, closest pair first; fine for the handful of people a frame holds
+    for flat in np.argsort(distances, axis=None):
+        latest_id, previous_id = divmod(int(flat), len(previous))
+        if order[latest_id] < 0 and previous_id not in order:
+            order[latest_id] = previous_id
+    return order
+
+
+class PoseInterpolator:
+    """
+    add() detections from the inference thread, sample() poses for any time from the OSC clock thread.
+    """
+    def __init__(self, mode=EXTRAPOLATE, max_extrapolation=0.1):
+        """
+        :param mode: INTERPOLATE or EXTRAPOLATE
+        :param max_extrapolation: seconds past the last detection EXTRAPOLATE keeps moving
+        """
+        if mode not in SMOOTHING_MODES:
+            raise ValueError(f"unknown smoothing mode {mode}")
+        self.mode = mode
+        self.max_extrapolation = max_extrapolation
+        self.previous = None
+        self.latest = None
+        self.lock = threading.Lock()
+
+    def add(self, timestamp, landmarks, confidence=None, bbox=None, image_width=0, image_height=0):
+        """
+        A new detection
+        :param timestamp: capture time of the detected frame, seconds (time.time())
+        :param landmarks: (persons, K, 4) array, copied
+        :param confidence: (persons,) or None
+        :param bbox: (persons, 4) or None
+        """
+        detection = _Detection(timestamp, landmarks, confidence, bbox, image_width, image_height)
+        with self.lock:
+            previous = self.latest
+            if previous is not None and len(previous.landmarks) == len(detection.landmarks):
+                previous.reorder(match_persons(previous.landmarks, detection.landmarks))
+            self.previous, self.latest = previous, detection
+
+    def sample(self, timestamp):
+        """
+        Pose at a given time
+        :param timestamp: seconds, same clock as add()
+        :return: PoseRecord, None before the first detection
+        """
+        with self.lock:
+            previous, latest = self.previous, self.latest
+            if latest is None:
+                return None
+
+            landmarks, bbox = latest.landmarks, latest.bbox
+            interval = latest.timestamp - previous.timestamp if previous is not None else 0.0
+            if interval > 0 and len(previous.landmarks) == len(latest.landmarks):
+                if self.mode == INTERPOLATE:
+                    # play back one interval late, so the time always falls between two detections
+                    alpha = min(max((timestamp - interval - previous.timestamp) / interval, 0.0), 1.0)
+                else:
+                    alpha = 1.0 + min(max(timestamp - latest.timestamp, 0.0), self.max_extrapolation) / interval
+                landmarks = latest.landmarks.copy()
+                landmarks[:, :, :3] = previous.landmarks[:, :, :3] + alpha * (latest.landmarks[:, :, :3]
+                                                                             - previous.landmarks[:, :, :3])
+                bbox = previous.bbox + alpha * (latest.bbox - previous.bbox)
+
+            return PoseRecord(None, timestamp, latest.image_width, latest.image_height,
+                              landmarks, latest.confidence, bbox)
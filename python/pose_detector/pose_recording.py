@@ -0,0 +1,451 @@
+"""
+Record detected poses to disk and replay them over OSC without running a model.
+
+A recording is two append-only files:
+    <name>.poserec  header + one record per frame
+    <name>.poseidx  seek index, one (offset, timestamp) entry per record
+
+poserec header:  magic b"POSEREC2", uint32 num_landmarks, uint32 values_per_landmark (4),
+                 uint32 OSC schema of the recording detector (0 single, 1 multi, see SCHEMAS)
+                 (POSEREC1 files have no schema field and replay with the single person schema)
+record:          uint64 frame_index, float64 capture timestamp (seconds),
+                 uint16 num_persons, uint16 reserved, uint16 image_width, uint16 image_height,
+                 float32 landmarks[num_persons][num_landmarks][4]   x, y, z, visibility
+                 float32 confidence[num_persons]                    NaN if unknown
+                 float32 bbox[num_persons][4]                       NaN if unknown
+all little-endian. The index can be rebuilt from the data file if it is lost or short.
+
+PoseRecording memory-maps the data file, so seeking is just an index lookup
+and the landmark arrays are views into the mapping (no parsing, no copies).
+PoseReplayer streams a recording through a detector's send_landmarks_via_osc,
+so receivers see the same OSC schema as the live detector that recorded it, at any speed multiple.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from .metrics import log_limited
+
+MAGIC = b"POSEREC2"
+FILE_HEADER = struct.Struct("<8sIII")
+# recordings from before the schema field
+MAGIC_V1 = b"POSEREC1"
+FILE_HEADER_V1 = struct.Struct("<8sII")
+RECORD_HEADER = struct.Struct("<QdHHHH")
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("timestamp", "<f8")])
+VALUES_PER_LANDMARK = 4
+
+# replay through the single person PoseDetectorMediapipe schema (/p1/<name>)
+# or the multiSkelton schema (/personN/landmark/<name>)
+SCHEMA_SINGLE = "single"
+SCHEMA_MULTI = "multi"
+# header schema field -> schema
+SCHEMAS = (SCHEMA_SINGLE, SCHEMA_MULTI)
+
+
+def index_path_for(path):
+    return os.path.splitext(path)[0] + ".poseidx"
+
+
+def pack_record(frame_index, timestamp, landmarks, confidence=None, bbox=None,
+                image_width=0, image_height=0, num_landmarks=None):
+    """
+    One frame in the record layout above
+    :param landmarks: (num_persons, num_landmarks, 4) array, num_persons may be 0
+    :param confidence: (num_persons,) array or None
+    :param bbox: (num_persons, 4) array or None
+    :param num_landmarks: needed to shape an empty landmarks array
+    :return: bytes
+    """
+    landmarks = np.asarray(landmarks, dtype="<f4")
+    if num_landmarks is not None:
+        landmarks = landmarks.reshape(-1, num_landmarks, VALUES_PER_LANDMARK)
+    num_persons = len(landmarks)
+    if confidence is None:
+        confidence = np.full(num_persons, np.nan)
+    if bbox is None:
+        bbox = np.full((num_persons, 4), np.nan)
+    return b"".join((RECORD_HEADER.pack(frame_index, timestamp, num_persons, 0, image_width, image_height),
+                     landmarks.tobytes(),
+                     np.asarray(confidence, dtype="<f4").tobytes(),
+                     np.asarray(bbox, dtype="<f4").tobytes()))
+
+
+def unpack_record(buffer, offset, num_landmarks):
+    """
+    The record at offset in buffer as a PoseRecord, its arrays are read-only views into buffer
+    :return: (PoseRecord, offset just past the record)
+    """
+    frame_index, timestamp, num_persons, _, width, height = RECORD_HEADER.unpack_from(buffer, offset)
+    offset += RECORD_HEADER.size
+    count = num_persons * num_landmarks * VALUES_PER_LANDMARK
+    landmarks = np.frombuffer(buffer, dtype="<f4", count=count, offset=offset)
+    offset += 4 * count
+    confidence = np.frombuffer(buffer, dtype="<f4", count=num_persons, offset=offset)
+    offset += 4 * num_persons
+    bbox = np.frombuffer(buffer, dtype="<f4", count=4 * num_persons, offset=offset)
+    offset += 16 * num_persons
+    record = PoseRecord(frame_index, timestamp, width, height,
+                        landmarks.reshape(num_persons, num_landmarks, VALUES_PER_LANDMARK),
+                        confidence, bbox.reshape(num_persons, 4))
+    return record, offset
+
+
+def detector_num_landmarks(pose_detector):
+    """ landmarks per person of either detector family """
+    num_landmarks = getattr(pose_detector, "num_landmarks_per_person", None)
+    if num_landmarks is None:
+        num_landmarks = len(pose_detector.pose_id_to_name)
+    return num_landmarks
+
+
+def detector_schema(pose_detector):
+    """ SCHEMA_MULTI for multiSkelton detectors, SCHEMA_SINGLE for the single person ones """
+    return SCHEMA_MULTI if hasattr(pose_detector, "load_pose_arrays") else SCHEMA_SINGLE
+
+
+def detector_pose_arrays(pose_detector, num_landmarks):
+    """
+    The last result of either detector family as arrays:
+    multiSkelton detectors (pose_frame) or the single person ones (get_landmark_array)
+    :return: landmarks (persons, num_landmarks, 4), confidence or None, bbox or None, image_width, image_height
+    """
+    pose_frame = getattr(pose_detector, "pose_frame", None)
+    if pose_frame is not None:
+        return (pose_frame.landmarks, pose_frame.confidence, pose_frame.bbox,
+                pose_detector.image_width, pose_detector.image_height)
+    pose = pose_detector.get_landmark_array()
+    landmarks = np.empty((0, num_landmarks, VALUES_PER_LANDMARK)) if pose is None else pose[np.newaxis]
+    return (landmarks, None, None,
+            getattr(pose_detector, "image_width", 0), getattr(pose_detector, "image_height", 0))
+
+
+def load_detector_record(pose_detector, record):
+    """
+    Make a PoseRecord the current result of a live detector of either family
+    :return: what the detector's process_image would have returned
+    """
+    if hasattr(pose_detector, "load_pose_arrays"):
+        return pose_detector.load_pose_arrays(record.landmarks, record.confidence, record.bbox,
+                                              record.image_width, record.image_height)
+    pose = record.landmarks[0] if len(record.landmarks) else None
+    return pose_detector.load_landmark_array(pose, record.image_width, record.image_height)
+
+
+class SubmittedFrames:
+    """
+    Matches a detector's result to the frame it was detected in. Asynchronous detectors
+    (multiSkelton live_stream) return the result of an earlier frame, identified by
+    result_timestamp_ms; whatever was kept for that frame's submitted_timestamp_ms is its
+    frame index, capture time, crop... Synchronous detectors always answer for the frame just given.
+    """
+    def __init__(self, max_pending=64):
+        """
+        :param max_pending: frames kept waiting for a result, older ones are forgotten
+        """
+        self.max_pending = max_pending
+        # submitted_timestamp_ms -> value, in submission order
+        self.pending = {}
+
+    def match(self, pose_detector, value):
+        """
+        Keep value for the frame pose_detector.process_image just took
+        :return: the value kept for the frame of the detector's current result,
+                 None if it has no new result (or one for a frame that wasn't kept)
+        """
+        new_result = getattr(pose_detector, "has_new_result", True)
+        submitted = getattr(pose_detector, "submitted_timestamp_ms", None)
+        if submitted is None:
+            return value if new_result else None
+        self.pending[submitted] = value
+        while len(self.pending) > self.max_pending:
+            del self.pending[next(iter(self.pending))]
+        if not new_result:
+            return None
+        result_timestamp = pose_detector.result_timestamp_ms
+        matched = self.pending.pop(result_timestamp, None)
+        # frames submitted before it without a result were dropped by the detector
+        for timestamp in [timestamp for timestamp in self.pending if timestamp < result_timestamp]:
+            del self.pending[timestamp]
+        return matched
+
+    def clear(self):
+        self.pending.clear()
+
+
+class PoseRecorder:
+    """
+    Appends one record per frame to a .poserec file and its .poseidx seek index.
+    """
+    def __init__(self, path, num_landmarks, schema=SCHEMA_SINGLE):
+        """
+        :param path: .poserec file to create (overwritten if it exists)
+        :param num_landmarks: landmarks per person, fixed for the whole recording
+        :param schema: OSC schema of the recording detector (detector_schema), replays use it
+        """
+        self.path = path
+        self.num_landmarks = num_landmarks
+        self.schema = schema
+        self.data_file = open(path, "wb")
+        self.index_file = open(index_path_for(path), "wb")
+        self.data_file.write(FILE_HEADER.pack(MAGIC, num_landmarks, VALUES_PER_LANDMARK, SCHEMAS.index(schema)))
+        self.num_records = 0
+        self.lock = threading.Lock()
+
+    def write(self, frame_index, timestamp, landmarks, confidence=None, bbox=None,
+              image_width=0, image_height=0):
+        """
+        Append one frame
+        :param frame_index: capture frame number
+        :param timestamp: capture time, seconds
+        :param landmarks: (num_persons, num_landmarks, 4) array, num_persons may be 0
+        :param confidence: (num_persons,) array or None
+        :param bbox: (num_persons, 4) array or None
+        :param image_width: size of the processed image
+        :param image_height:
+        :return: nothing
+        """
+        record = pack_record(frame_index, timestamp, landmarks, confidence, bbox,
+                             image_width, image_height, self.num_landmarks)
+        with self.lock:
+            if self.data_file is None:
+                return
+            offset = self.data_file.tell()
+            self.data_file.write(record)
+            self.index_file.write(np.array([(offset, timestamp)], dtype=INDEX_DTYPE).tobytes())
+            self.num_records += 1
+
+    def write_detector(self, frame_index, timestamp, pose_detector):
+        """
+        Append the last result of either detector family (see detector_pose_arrays)
+        """
+        self.write(frame_index, timestamp, *detector_pose_arrays(pose_detector, self.num_landmarks))
+
+    def close(self):
+        with self.lock:
+            if self.data_file is not None:
+                self.data_file.close()
+                self.index_file.close()
+                self.data_file = None
+                self.index_file = None
+
+
+class PoseRecord:
+    """ One replayed frame, the arrays are read-only views into the memory map """
+    def __init__(self, frame_index, timestamp, image_width, image_height, landmarks, confidence, bbox):
+        self.frame_index = frame_index
+        self.timestamp = timestamp
+        self.image_width = image_width
+        self.image_height = image_height
+        self.landmarks = landmarks
+        self.confidence = confidence
+        self.bbox = bbox
+
+
+class PoseRecording:
+    """
+    Read access to a .poserec file through mmap, with O(1) seek by record number
+    and O(log n) seek by time.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = self._map[:len(MAGIC)]
+        if magic == MAGIC:
+            _, self.num_landmarks, values, schema = FILE_HEADER.unpack_from(self._map, 0)
+            self.header_size = FILE_HEADER.size
+            # OSC schema of the detector that recorded it
+            self.schema = SCHEMAS[schema] if schema < len(SCHEMAS) else SCHEMA_SINGLE
+        elif magic == MAGIC_V1:
+            _, self.num_landmarks, values = FILE_HEADER_V1.unpack_from(self._map, 0)
+            self.header_size = FILE_HEADER_V1.size
+            self.schema = SCHEMA_SINGLE
+        else:
+            values = None
+        if values != VALUES_PER_LANDMARK:
+            raise ValueError(f"{path} is not a pose recording")
+        self._person_size = 4 * self.num_landmarks * VALUES_PER_LANDMARK + 4 + 16
+        self.index = self._load_index()
+
+    def _record_size(self, num_persons):
+        return RECORD_HEADER.size + num_persons * self._person_size
+
+    def _load_index(self):
+        index_path = index_path_for(self.path)
+        if os.path.exists(index_path):
+            index = np.fromfile(index_path, dtype=INDEX_DTYPE)
+            if self._end_of(index) == len(self._map):
+                return index
+        # index missing, short, or a crash left a partial record: rebuild it
+        return self._scan()
+
+    def _end_of(self, index):
+        """ file offset just past the last indexed record, -1 if that record is cut off """
+        if len(index) == 0:
+            return self.header_size
+        last = int(index["offset"][-1])
+        if last + RECORD_HEADER.size > len(self._map):
+            return -1
+        num_persons = RECORD_HEADER.unpack_from(self._map, last)[2]
+        return last + self._record_size(num_persons)
+
+    def _scan(self):
+        """ rebuild the index by walking the records """
+        entries = []
+        offset = self.header_size
+        while offset + RECORD_HEADER.size <= len(self._map):
+            _, timestamp, num_persons, _, _, _ = RECORD_HEADER.unpack_from(self._map, offset)
+            size = self._record_size(num_persons)
+            if offset + size > len(self._map):
+                break
+            entries.append((offset, timestamp))
+            offset += size
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def duration(self):
+        if len(self.index) == 0:
+            return 0.0
+        return float(self.index["timestamp"][-1] - self.index["timestamp"][0])
+
+    def read(self, record_number):
+        """ the record_number'th frame (0 based) as a PoseRecord """
+        return unpack_record(self._map, int(self.index["offset"][record_number]), self.num_landmarks)[0]
+
+    def find_time(self, seconds):
+        """ record number playing at the given time from the start of the recording """
+        if len(self.index) == 0:
+            return 0
+        target = self.index["timestamp"][0] + seconds
+        return min(int(np.searchsorted(self.index["timestamp"], target)), len(self.index) - 1)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def make_replay_detector(schema, num_landmarks):
+    """
+    Detector that sends recorded poses with the same OSC output as the live one
+    :param schema: SCHEMA_SINGLE (PoseDetectorMediapipe /p1/...) or SCHEMA_MULTI (multiSkelton /personN/...)
+    :param num_landmarks: landmarks per person in the recording
+    """
+    if schema == SCHEMA_SINGLE:
+        from .pose_detector import PoseDetector
+        from .pose_detector_mediapipe import PoseDetectorMediapipe
+
+        class ReplayPoseDetectorMediapipe(PoseDetectorMediapipe):
+            def __init__(self):
+                PoseDetector.__init__(self)  # no mediapipe model needed for replay
+                self.results = None
+                self.frameCount = 0
+                self.landmark_encoder = None
+                self.image_width = self.image_height = 0
+                self.pose = None
+                self.model_complexity = None
+
+            def load_record(self, record):
+                self.frameCount += 1
+                self.image_width, self.image_height = record.image_width, record.image_height
+                self.pose = record.landmarks[0] if len(record.landmarks) else None
+
+            def get_landmark_array(self):
+                return self.pose
+
+        return ReplayPoseDetectorMediapipe()
+
+    from .multiSkelton.poseDetector import PoseDetector as MultiPoseDetector
+
+    class ReplayPoseDetector(MultiPoseDetector):
+        def __init__(self):
+            super().__init__()
+            self.num_landmarks_per_person = num_landmarks
+
+        def load_record(self, record):
+            if len(record.landmarks):
+                # recordings of 2D models have z = 0 throughout, send their confidence in its place as they did live
+                self.has_depth = bool(np.any(record.landmarks[..., 2]))
+            load_detector_record(self, record)
+
+    return ReplayPoseDetector()
+
+
+class PoseReplayer:
+    """
+    Streams a PoseRecording over OSC on a background thread, paced by the recorded
+    timestamps divided by speed. seek() works while playing.
+    The OSC settings (osc_bundle, osc_pose_format...) are those of self.pose_detector.
+    """
+    def __init__(self, recording, osc_client, schema=None, speed=1.0, looping=False):
+        """
+        :param schema: SCHEMA_SINGLE or SCHEMA_MULTI, None for the one stored in the recording
+        """
+        self.recording = recording
+        self.osc_client = osc_client
+        self.speed = speed
+        self.looping = looping
+        self.pose_detector = make_replay_detector(schema or recording.schema, recording.num_landmarks)
+        self.position = 0
+        self.running = False
+        self.paused = False
+        self._seek_to = None
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="pose-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+
+    def seek(self, record_number):
+        """ jump to a record number, takes effect on the next frame """
+        self._seek_to = max(0, min(int(record_number), len(self.recording) - 1))
+
+    def seek_time(self, seconds):
+        self.seek(self.recording.find_time(seconds))
+
+    def _run(self):
+        timestamps = self.recording.index["timestamp"]
+        # wall clock time at which the recording's current position should play
+        start_wall = time.perf_counter()
+        start_stamp = timestamps[0] if len(timestamps) else 0.0
+        while self.running and len(self.recording):
+            if self._seek_to is not None:
+                self.position, self._seek_to = self._seek_to, None
+                start_wall, start_stamp = time.perf_counter(), timestamps[self.position]
+            if self.position >= len(self.recording):
+                if not self.looping:
+                    break
+                self.position = 0
+                start_wall, start_stamp = time.perf_counter(), timestamps[0]
+            if self.paused:
+                time.sleep(0.05)
+                start_wall, start_stamp = time.perf_counter(), timestamps[self.position]
+                continue
+
+            due = start_wall + (timestamps[self.position] - start_stamp) / max(self.speed, 1e-6)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            self.pose_detector.load_record(self.recording.read(self.position))
+            try:
+                self.pose_detector.send_landmarks_via_osc(self.osc_client)
+            except Exception as e:
+                log_limited("replay-osc", f"Error: Cannot send OSC message {e}")
+            self.position += 1
+        self.running = False
@@ -0,0 +1,233 @@
+"""
+On-demand profiling of a running pipeline, for the slowdowns and memory growth that
+only show up after hours in an installation (restarting under a profiler loses them).
+
+ProfileSession samples the Python stacks of every thread for N seconds and takes a
+tracemalloc snapshot at the start and the end, then writes to a timestamped folder
+    <output_dir>/profile_YYYYmmdd_HHMMSS/
+        stacks.collapsed   "thread;file:function;file:function count" lines, feed to
+                           flamegraph.pl or drop on speedscope.app
+        functions.txt      functions by own (self) and total samples
+        memory_diff.txt    allocation growth between the two snapshots, by line and by traceback
+        info.json          duration, sample count, interval...
+The sampler is a plain thread reading sys._current_frames(), so it attaches to the running
+process and costs nothing when off. Native code (the detector, cv2) shows as the Python line
+that called it. tracemalloc is only started for the session (if it wasn't already running),
+so memory_diff.txt shows what was allocated and kept during those N seconds.
+
+Start one with start_profile(seconds), the 'p' key in the GUI, or an OSC message
+/profile [seconds] to a ProfileCommandServer (serve --profile-port).
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.expanduser("~"), ".pose2art", "profiles")
+DEFAULT_DURATION = 10.0
+# 100 samples per second is plenty for a flame graph and barely noticeable in the pipeline
+DEFAULT_INTERVAL = 0.01
+TRACEMALLOC_FRAMES = 16
+MEMORY_TOP = 40
+
+_session_lock = threading.Lock()
+_current_session = None
+
+
+def frame_label(frame):
+    """ "file.py:function" for a collapsed stack, without the spaces and ';' that format splits on """
+    code = frame.f_code
+    label = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+    return label.replace(" ", "_").replace(";", "_")
+
+
+def collapse_stack(frame):
+    """ outermost first list of frame labels from a thread's current frame """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class ProfileSession:
+    """ one profiling run on its own thread, see the module docstring for the output """
+    def __init__(self, duration=DEFAULT_DURATION, output_dir=DEFAULT_OUTPUT_DIR,
+                 interval=DEFAULT_INTERVAL, trace_memory=True):
+        """
+        :param duration: seconds to profile
+        :param output_dir: the timestamped folder is created in here
+        :param interval: seconds between stack samples
+        :param trace_memory: take the tracemalloc snapshots (slows allocations while on)
+        """
+        self.duration = duration
+        self.interval = interval
+        self.trace_memory = trace_memory
+        self.folder = os.path.join(output_dir, time.strftime("profile_%Y%m%d_%H%M%S"))
+        self.stacks = Counter()
+        self.num_samples = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="pose-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ end early, the output is still written """
+        self._stop_event.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        global _current_session
+        started_tracing = False
+        try:
+            first_snapshot = None
+            if self.trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(TRACEMALLOC_FRAMES)
+                    started_tracing = True
+                first_snapshot = tracemalloc.take_snapshot()
+            print(f"Profiler: sampling for {self.duration:g}s into {self.folder}")
+            start = time.perf_counter()
+            self._sample(start + self.duration)
+            elapsed = time.perf_counter() - start
+            last_snapshot = tracemalloc.take_snapshot() if first_snapshot is not None else None
+            self._write(elapsed, first_snapshot, last_snapshot)
+            print(f"Profiler: {self.num_samples} samples written to {self.folder}")
+        except Exception as e:
+            print(f"Error: profiling failed {e}")
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            with _session_lock:
+                if _current_session is self:
+                    _current_session = None
+
+    def _sample(self, end_time):
+        own_ident = threading.get_ident()
+        while not self._stop_event.is_set() and time.perf_counter() < end_time:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                thread_name = names.get(ident, f"thread-{ident}").replace(" ", "_").replace(";", "_")
+                self.stacks[";".join([thread_name] + collapse_stack(frame))] += 1
+            self.num_samples += 1
+            self._stop_event.wait(self.interval)
+
+    def function_table(self, limit=60):
+        """ text table of functions by self samples and by total (inclusive) samples """
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.stacks.items():
+            labels = stack.split(";")[1:]
+            if not labels:
+                continue
+            self_counts[labels[-1]] += count
+            for label in set(labels):
+                total_counts[label] += count
+        samples = max(sum(self.stacks.values()), 1)
+        lines = [f"{samples} thread samples ({self.num_samples} sampling passes)", "",
+                 "self %   self  function"]
+        lines += [f"{100 * count / samples:6.1f} {count:6d}  {label}"
+                  for label, count in self_counts.most_common(limit)]
+        lines += ["", "total %  total  function"]
+        lines += [f"{100 * count / samples:6.1f} {count:6d}  {label}"
+                  for label, count in total_counts.most_common(limit)]
+        return "\n".join(lines) + "\n"
+
+    def _write(self, elapsed, first_snapshot, last_snapshot):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, "stacks.collapsed"), "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(self.folder, "functions.txt"), "w") as f:
+            f.write(self.function_table())
+        if first_snapshot is not None:
+            with open(os.path.join(self.folder, "memory_diff.txt"), "w") as f:
+                f.write(memory_diff(first_snapshot, last_snapshot))
+        info = {"duration": elapsed, "requested_duration": self.duration, "interval": self.interval,
+                "samples": self.num_samples, "threads": sorted({stack.split(";")[0] for stack in self.stacks}),
+                "pid": os.getpid(), "started": os.path.basename(self.folder)}
+        with open(os.path.join(self.folder, "info.json"), "w") as f:
+            json.dump(info, f, indent=2)
+
+
+def memory_diff(first_snapshot, last_snapshot, limit=MEMORY_TOP):
+    """ text report of what grew between two tracemalloc snapshots """
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    first_snapshot = first_snapshot.filter_traces(ignore)
+    last_snapshot = last_snapshot.filter_traces(ignore)
+    current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    by_line = last_snapshot.compare_to(first_snapshot, "lineno")
+    growth = sum(stat.size_diff for stat in by_line)
+    lines = [f"traced now {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB, "
+             f"net growth during the session {growth / 1e6:+.3f} MB", "",
+             f"top {limit} by line:"]
+    lines += [str(stat) for stat in by_line[:limit]]
+    lines += ["", f"top {limit // 4} by traceback:"]
+    for stat in last_snapshot.compare_to(first_snapshot, "traceback")[:limit // 4]:
+        lines.append(f"{stat.size_diff / 1024:+.1f} KiB, {stat.count_diff:+d} blocks")
+        lines += ["    " + line for line in stat.traceback.format()]
+    return "\n".join(lines) + "\n"
+
+
+def start_profile(duration=DEFAULT_DURATION, output_dir=DEFAULT_OUTPUT_DIR, **options):
+    """
+    Profile the whole process for duration seconds in the background
+    :return: the new ProfileSession, or None if one is already running
+    """
+    global _current_session
+    with _session_lock:
+        if _current_session is not None:
+            print(f"Profiler: already profiling into {_current_session.folder}")
+            return None
+        _current_session = ProfileSession(duration, output_dir, **options)
+        _current_session.start()
+        return _current_session
+
+
+class ProfileCommandServer:
+    """
+    Listens for OSC /profile [seconds] and starts a profile session, e.g. from
+    oscsend localhost 5006 /profile f 30
+    """
+    def __init__(self, port, host="0.0.0.0", output_dir=DEFAULT_OUTPUT_DIR, address="/profile"):
+        from pythonosc import dispatcher, osc_server
+        self.output_dir = output_dir
+        osc_dispatcher = dispatcher.Dispatcher()
+        osc_dispatcher.map(address, self._on_profile)
+        self.server = osc_server.ThreadingOSCUDPServer((host, port), osc_dispatcher)
+        self._thread = None
+
+    def _on_profile(self, address, *args):
+        try:
+            duration = float(args[0]) if args else DEFAULT_DURATION
+        except (TypeError, ValueError):
+            print(f"Profiler: bad {address} arguments {args}")
+            return
+        start_profile(duration, self.output_dir)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="pose-profile-osc", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
@@ -0,0 +1,269 @@
+"""
+Hold a target detection rate by trading model quality for speed while running.
+
+    python -m pose_detector.serve --source 0 --osc 127.0.0.1:5005 --target-fps 20
+
+QualityController times every detection the pipeline runs. When the mean time per
+detection stays over the frame budget (1 / target_fps) for down_after windows, it
+steps down one quality level: a lighter model, a smaller inference resolution, fewer
+poses. When it stays under headroom * budget for up_after windows it steps back up.
+A window is an interval, or as many intervals as it takes a slow detector to deliver
+MIN_SAMPLES detections.
+A crowd walking in or a thermally throttled CPU costs a little accuracy instead of
+dropping the installation to 8 fps.
+
+Against flapping between two levels:
+    up_after is longer than down_after, and headroom leaves room for the heavier level
+    after every change the new model warms up for cooldown seconds before it is judged
+    a level that had to be left again is not retried for hold seconds, doubled each time
+    (up to MAX_HOLD), so a level that is too slow now is tried less and less often
+
+A level is a dict, lowest quality first in the list:
+    {"options": {"model_complexity": 0}, "inference_width": 480}
+options are merged over the detector's own options and passed to its serve factory,
+inference_width (optional, 0 = capture size) replaces the pipeline's inference size.
+default_quality_levels has ladders for mediapipe, mediapipe-multi, movenet-tflite and
+yolo, serve's quality_levels config key sets any other.
+
+The detector is rebuilt on the controller's thread while the old one keeps running, the
+pipeline swaps it in between two frames (PosePipeline.replace_detector).
+Levels must keep the landmark count (the same model family) so OSC receivers and
+recordings don't notice. An asynchronous (live_stream) detector returns before the model
+has run, its times say nothing: use running_mode video with a target fps.
+"""
+
+import os
+import threading
+import time
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_DOWN_AFTER = 3
+DEFAULT_UP_AFTER = 10
+DEFAULT_HEADROOM = 0.7
+DEFAULT_COOLDOWN = 5.0
+DEFAULT_HOLD = 30.0
+MAX_HOLD = 600.0
+# detections a verdict needs, a slow detector's window spans several intervals until it has them
+MIN_SAMPLES = 3
+# copied from the running detector to its replacement
+OSC_SETTINGS = ("osc_bundle", "osc_max_datagram_size", "osc_pose_format", "osc_precompiled", "osc_address_prefix")
+
+
+def _sibling(path, name):
+    """ name in the folder of path, so a ladder finds its models next to the configured one """
+    return os.path.join(os.path.dirname(path), name)
+
+
+def default_quality_levels(detector, options=None):
+    """
+    Quality ladder for a serve detector, lowest quality first
+    :param detector: serve DETECTORS name
+    :param options: the detector's configured options, its num_poses and model folder are kept
+    :return: list of level dicts, None if there is no default ladder for the detector
+    """
+    options = options or {}
+    if detector == "mediapipe":
+        return [
+            {"options": {"model_complexity": 0}, "inference_width": 320},
+            {"options": {"model_complexity": 0}, "inference_width": 480},
+            {"options": {"model_complexity": 1}, "inference_width": 480},
+            {"options": {"model_complexity": 1}, "inference_width": 640},
+            {"options": {"model_complexity": 2}, "inference_width": 640},
+        ]
+    if detector == "mediapipe-multi":
+        # MediaPipe runs the landmark model once per person, num_poses goes first
+        model_path = options.get("model_path", "pose_landmarker_heavy.task")
+        num_poses = options.get("num_poses", 2)
+        lite, full, heavy = (_sibling(model_path, f"pose_landmarker_{name}.task") for name in ("lite", "full", "heavy"))
+        return [
+            {"options": {"model_path": lite, "num_poses": max(1, num_poses // 2)}, "inference_width": 480},
+            {"options": {"model_path": lite, "num_poses": num_poses}, "inference_width": 480},
+            {"options": {"model_path": lite, "num_poses": num_poses}, "inference_width": 640},
+            {"options": {"model_path": full, "num_poses": num_poses}, "inference_width": 640},
+            {"options": {"model_path": heavy, "num_poses": num_poses}, "inference_width": 640},
+        ]
+    if detector == "movenet-tflite":
+        model_path = options.get("model_path", "movenet_multipose_lightning.tflite")
+        name = os.path.basename(model_path)
+        if "singlepose" in name:
+            # Lightning 192x192 or Thunder 256x256, the input size is the model's
+            return [{"options": {"model_path": _sibling(model_path, name.replace("thunder", "lightning"))}},
+                    {"options": {"model_path": _sibling(model_path, name.replace("lightning", "thunder"))}}]
+        # MultiPose only comes as Lightning, its input size is free (multiples of 32)
+        return [{"options": {"input_size": size}} for size in (160, 192, 256, 320)]
+    if detector == "yolo":
+        # needs an export with dynamic shapes, a static one keeps its own size at every level
+        return [{"options": {"input_size": size}} for size in (320, 416, 512, 640)]
+    return None
+
+
+def describe_level(level):
+    parts = [f"{key} {os.path.basename(value) if key == 'model_path' else value}"
+             for key, value in level.get("options", {}).items()]
+    if "inference_width" in level:
+        parts.append(f"inference_width {level['inference_width'] or 'capture'}")
+    return ", ".join(parts)
+
+
+class QualityController:
+    """
+    Steps a running PosePipeline's detector between quality levels to hold target_fps,
+    see the module docstring. create_detector() builds the first detector, start() attaches
+    to the pipeline, stop() detaches.
+    """
+    def __init__(self, detector, levels, target_fps, base_options=None, inference_width=0, level=None,
+                 interval=DEFAULT_INTERVAL, down_after=DEFAULT_DOWN_AFTER, up_after=DEFAULT_UP_AFTER,
+                 headroom=DEFAULT_HEADROOM, cooldown=DEFAULT_COOLDOWN, hold=DEFAULT_HOLD):
+        """
+        :param detector: serve DETECTORS name, the same for every level
+        :param levels: list of level dicts, lowest quality first
+        :param target_fps: detections per second to hold
+        :param base_options: detector options the level options are merged over
+        :param inference_width: inference width for levels without one, 0 for the capture size
+        :param level: index to start at, None for the highest
+        :param interval: seconds between decisions
+        :param down_after: windows over budget before stepping down
+        :param up_after: windows under headroom * budget before stepping up
+        :param headroom: fraction of the budget the current level has to stay under to step up
+        :param cooldown: seconds after a change before the new level is judged
+        :param hold: seconds a level that was just left is not retried, doubled every time it is left again
+        """
+        if not levels:
+            raise ValueError("QualityController needs at least one quality level")
+        self.detector = detector
+        self.levels = levels
+        self.budget = 1.0 / target_fps
+        self.target_fps = target_fps
+        self.base_options = dict(base_options or {})
+        self.inference_width = inference_width
+        self.level = len(levels) - 1 if level is None else max(0, min(level, len(levels) - 1))
+        self.interval = interval
+        self.down_after = down_after
+        self.up_after = up_after
+        self.headroom = headroom
+        self.cooldown = cooldown
+        self.hold = hold
+        self.pipeline = None
+        self.lock = threading.Lock()
+        self.total = 0.0
+        self.count = 0
+        self.over = 0
+        self.under = 0
+        self.cooldown_until = 0.0
+        # level index -> (time it may be tried again, current hold seconds)
+        self.holds = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def create_detector(self, level):
+        """
+        Build the detector of a level
+        :return: (pose_detector, inference_size for the pipeline, None for the capture size)
+        """
+        from .serve import DETECTORS
+        options = dict(self.base_options, **self.levels[level].get("options", {}))
+        pose_detector = DETECTORS[self.detector](**options)
+        return pose_detector, self.levels[level].get("inference_width", self.inference_width) or None
+
+    def start(self, pipeline):
+        """ attach to pipeline, which reports its detection times to observe() from now on """
+        self.pipeline = pipeline
+        pipeline.quality_controller = self
+        pipeline.metrics.add_collector(self._collect_metrics)
+        self.cooldown_until = time.monotonic() + self.cooldown
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="pose-quality", daemon=True)
+        self._thread.start()
+        print(f"quality: holding {self.target_fps:g} fps, level {self.level} of {len(self.levels) - 1}: "
+              f"{describe_level(self.levels[self.level])}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+        if self.pipeline is not None:
+            self.pipeline.quality_controller = None
+            self.pipeline.metrics.remove_collector(self._collect_metrics)
+            self.pipeline = None
+
+    def observe(self, seconds):
+        """ one detection took seconds, called by the pipeline's inference thread """
+        with self.lock:
+            self.total += seconds
+            self.count += 1
+
+    def _collect_metrics(self, metrics):
+        metrics.set_gauge("quality_level", self.level)
+
+    def _take_window(self):
+        """ mean detection time of the window, None (and the window kept open) until it has MIN_SAMPLES """
+        with self.lock:
+            if self.count < MIN_SAMPLES:
+                return None
+            total, count = self.total, self.count
+            self.total, self.count = 0.0, 0
+        return total / count
+
+    def _reset_window(self):
+        with self.lock:
+            self.total, self.count = 0.0, 0
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.evaluate()
+
+    def evaluate(self):
+        """ one decision, every interval on the controller's thread """
+        now = time.monotonic()
+        if now < self.cooldown_until:
+            # the new model is warming up, don't count those detections
+            self._reset_window()
+            return
+        mean = self._take_window()
+        if mean is None:
+            return
+        if mean > self.budget:
+            self.over, self.under = self.over + 1, 0
+        elif mean < self.headroom * self.budget:
+            self.over, self.under = 0, self.under + 1
+        else:
+            self.over = self.under = 0
+
+        if self.over >= self.down_after and self.level > 0:
+            self._hold(self.level, now)
+            self._step(self.level - 1, mean)
+        elif self.under >= self.up_after and self.level < len(self.levels) - 1:
+            if now >= self.holds.get(self.level + 1, (0.0, 0.0))[0]:
+                self._step(self.level + 1, mean)
+
+    def _hold(self, level, now):
+        """ don't come back to level for a while, longer every time it has to be left """
+        _, hold = self.holds.get(level, (0.0, 0.0))
+        hold = min(2 * hold, MAX_HOLD) if hold else self.hold
+        self.holds[level] = (now + hold, hold)
+
+    def _step(self, level, mean):
+        direction = "down" if level < self.level else "up"
+        print(f"quality: {1000 * mean:.1f} ms per detection for a {1000 * self.budget:.1f} ms budget, "
+              f"stepping {direction} to level {level}: {describe_level(self.levels[level])}")
+        try:
+            pose_detector, inference_size = self.create_detector(level)
+        except Exception as e:
+            print(f"quality: cannot build level {level}, {e}")
+            self._hold(level, time.monotonic())
+            self.over = self.under = 0
+            return
+        pipeline = self.pipeline
+        if pipeline is None:
+            return
+        for setting in OSC_SETTINGS:
+            if hasattr(pipeline.pose_detector, setting):
+                setattr(pose_detector, setting, getattr(pipeline.pose_detector, setting))
+        pipeline.replace_detector(pose_detector, inference_size)
+        pipeline.metrics.increment("quality_changes")
+        self.level = level
+        self.over = self.under = 0
+        # the window so far timed the old model, and the new one's first frames are slow
+        self._reset_window()
+        self.cooldown_until = time.monotonic() + self.cooldown
@@ -0,0 +1,178 @@
+"""
+RoiTracker crops each frame to the region around the people found in the previous
+frame before it goes to the detector, then the detector maps the landmarks back to
+full frame normalized coordinates (map_to_frame), so OSC, drawing, recording and
+caching never see the crop.
+
+    region of interest = union of last frame's person boxes (bbox, or landmark extent)
+                         + padding, at least min_size of the frame, inside the include zones
+    every reacquire_every frames, or when nobody was found, the whole (included) frame is used
+    so people entering the scene are picked up
+
+Zones are normalized (x, y, width, height) rectangles of the full frame:
+include zones limit detection to their bounding box, exclude zones are blacked
+out before inference (screens, mirrors, the audience...). serve sets them with
+roi_include / roi_exclude, the GUI with its zone fields, both as "x,y,w,h; x,y,w,h".
+
+Pays off most for MoveNet and OpenPose, which resize the whole frame to a small
+input: a tight crop gives them more pixels on the subject and less to process.
+The single person MediaPipe Pose does its own tracking crop internally.
+"""
+
+import cv2
+import numpy as np
+
+from .pose_recording import SubmittedFrames, detector_num_landmarks, detector_pose_arrays
+
+# landmarks below this visibility don't count towards a person's box
+MIN_VISIBILITY = 0.3
+
+
+def zones_bounds(zones):
+    """ (left, top, right, bottom) bounding all (x, y, width, height) zones """
+    zones = np.asarray(zones, dtype=np.float64).reshape(-1, 4)
+    return (zones[:, 0].min(), zones[:, 1].min(),
+            (zones[:, 0] + zones[:, 2]).max(), (zones[:, 1] + zones[:, 3]).max())
+
+
+def parse_zones(text):
+    """
+    "x,y,w,h; x,y,w,h" -> list of normalized (x, y, width, height) zones
+    :return: list, None for an empty text
+    """
+    zones = []
+    for part in text.split(";"):
+        if not part.strip():
+            continue
+        values = [float(value) for value in part.replace(",", " ").split()]
+        if len(values) != 4:
+            raise ValueError(f"zone {part.strip()!r} is not x,y,width,height")
+        zones.append(tuple(values))
+    return zones or None
+
+
+def person_bounds(landmarks, bbox=None):
+    """
+    (left, top, right, bottom) around everybody detected, None if nobody
+    :param landmarks: (persons, K, 4) normalized x, y, z, visibility
+    :param bbox: (persons, 4) x, y, width, height, NaN rows fall back to the landmark extent
+    """
+    if len(landmarks) == 0:
+        return None
+    visible = landmarks[:, :, 3] >= MIN_VISIBILITY
+    # people with no confident landmark use all of them
+    visible[~visible.any(axis=1)] = True
+    x = np.where(visible, landmarks[:, :, 0], np.nan)
+    y = np.where(visible, landmarks[:, :, 1], np.nan)
+    boxes = np.stack([np.nanmin(x, axis=1), np.nanmin(y, axis=1),
+                      np.nanmax(x, axis=1), np.nanmax(y, axis=1)], axis=1)
+    if bbox is not None:
+        known = ~np.isnan(bbox).any(axis=1)
+        boxes[known] = np.concatenate([bbox[known, :2], bbox[known, :2] + bbox[known, 2:]], axis=1)
+    return boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max()
+
+
+class RoiTracker:
+    def __init__(self, padding=0.25, min_size=0.25, reacquire_every=30,
+                 include_zones=None, exclude_zones=None):
+        """
+        :param padding: added on every side, as a fraction of the people box size
+        :param min_size: smallest crop, as a fraction of the frame width/height
+        :param reacquire_every: use the full frame every N frames, 0 never (only when nobody is found)
+        :param include_zones: list of normalized (x, y, width, height), detect only inside their bounds
+        :param exclude_zones: list of normalized (x, y, width, height), blacked out before detection
+        """
+        self.padding = padding
+        self.min_size = min_size
+        self.reacquire_every = reacquire_every
+        self.include_zones = include_zones
+        self.exclude_zones = exclude_zones
+        # next region to crop as normalized (left, top, right, bottom), None for full frame
+        self.region = None
+        self.frames_since_full = 0
+        # crop of every frame handed to an asynchronous detector, until its result comes back
+        self.submitted = SubmittedFrames()
+
+    def get_settings(self):
+        """ everything that changes the crops, for the detection cache key """
+        return {"padding": self.padding, "min_size": self.min_size, "reacquire_every": self.reacquire_every,
+                "include_zones": self.include_zones, "exclude_zones": self.exclude_zones}
+
+    def _limits(self):
+        if self.include_zones:
+            left, top, right, bottom = zones_bounds(self.include_zones)
+            return max(left, 0.0), max(top, 0.0), min(right, 1.0), min(bottom, 1.0)
+        return 0.0, 0.0, 1.0, 1.0
+
+    def crop(self, frame):
+        """
+        Image to hand to the detector for this frame
+        :param frame: full BGR frame, not modified
+        :return: (image, (left, top, width, height) normalized region the image covers)
+        """
+        height, width = frame.shape[:2]
+        region = self.region
+        if region is None or (self.reacquire_every and self.frames_since_full >= self.reacquire_every):
+            region = self._limits()
+            self.frames_since_full = 0
+        else:
+            self.frames_since_full += 1
+
+        # snap to whole pixels and describe the region by them, so mapping back is exact
+        x0, x1 = int(region[0] * width), max(int(np.ceil(region[2] * width)), int(region[0] * width) + 1)
+        y0, y1 = int(region[1] * height), max(int(np.ceil(region[3] * height)), int(region[1] * height) + 1)
+        image = frame[y0:y1, x0:x1]
+
+        if self.exclude_zones:
+            image = image.copy()
+            for zx, zy, zw, zh in self.exclude_zones:
+                ex0, ey0 = max(int(zx * width) - x0, 0), max(int(zy * height) - y0, 0)
+                ex1, ey1 = int((zx + zw) * width) - x0, int((zy + zh) * height) - y0
+                if ex1 > ex0 and ey1 > ey0:
+                    image[ey0:ey1, ex0:ex1] = 0
+        return image, (x0 / width, y0 / height, (x1 - x0) / width, (y1 - y0) / height)
+
+    def update(self, landmarks, bbox=None):
+        """
+        Pick next frame's region from this frame's full frame results
+        :param landmarks: (persons, K, 4) normalized to the full frame
+        :param bbox: (persons, 4) or None
+        """
+        bounds = person_bounds(landmarks, bbox)
+        if bounds is None:
+            self.region = None
+            return
+        left, top, right, bottom = (float(value) for value in bounds)
+        pad_x = max((right - left) * (1 + 2 * self.padding), self.min_size) / 2
+        pad_y = max((bottom - top) * (1 + 2 * self.padding), self.min_size) / 2
+        center_x, center_y = (left + right) / 2, (top + bottom) / 2
+        limit_left, limit_top, limit_right, limit_bottom = self._limits()
+        region = (max(center_x - pad_x, limit_left), max(center_y - pad_y, limit_top),
+                  min(center_x + pad_x, limit_right), min(center_y + pad_y, limit_bottom))
+        self.region = region if region[2] > region[0] and region[3] > region[1] else None
+
+    def process_image(self, pose_detector, frame, max_size=None):
+        """
+        Run pose_detector on the region of interest of frame, leaving its results in full frame coordinates.
+        An asynchronous detector's result is mapped with the crop of the frame it was detected in,
+        a repeated (not new) result was mapped when it was new and is left alone.
+        :param frame: the full resolution frame, cropping it keeps every pixel on the people
+        :param max_size: (width, height) the crop is scaled down to fit (the inference size), None to keep it
+        :return: what pose_detector.process_image returned
+        """
+        image, region = self.crop(frame)
+        if max_size is not None:
+            scale = min(max_size[0] / image.shape[1], max_size[1] / image.shape[0])
+            if scale < 1:
+                image = cv2.resize(image, (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale))),
+                                   interpolation=cv2.INTER_AREA)
+        results = pose_detector.process_image(image)
+        region = self.submitted.match(pose_detector, region)
+        if region is None:
+            return results
+        left, top, width, height = region
+        frame_height, frame_width = frame.shape[:2]
+        pose_detector.map_to_frame(left, top, width, height, frame_width, frame_height)
+        landmarks, _, bbox, _, _ = detector_pose_arrays(pose_detector, detector_num_landmarks(pose_detector))
+        self.update(landmarks, bbox)
+        return results
@@ -0,0 +1,339 @@
+"""
+Headless PosePC: the same capture -> detect -> OSC/NDI pipeline as posePC_multicam.py,
+without Tk or a preview, for display-less installation boxes.
+
+    python -m pose_detector.serve --source 0 --osc 127.0.0.1:5005 --ndi posePC
+    python -m pose_detector.serve --source clip.mp4 --loop --osc 10.0.0.5:5005
+    python -m pose_detector.serve --config gallery.json
+
+Run from the python folder. The config file is JSON with the same keys as the long
+options (dashes become underscores), command line options override it, e.g.
+    {"source": "clip.mp4", "loop": true, "osc": "10.0.0.5:5005", "ndi": "gallery",
+     "detector": "mediapipe", "inference_width": 640, "osc_rate": 60, "pose_every": 2}
+roi_include / roi_exclude are lists of normalized [x, y, width, height] zones the people
+crop stays inside / blacks out (see roi.py), setting either turns --roi on:
+    {"roi": true, "roi_padding": 0.15, "roi_exclude": [[0.8, 0.0, 0.2, 0.5]]}
+detector_options (config only) is passed to the detector constructor, e.g.
+    {"detector": "mediapipe-multi", "detector_options": {"num_poses": 4, "running_mode": "live_stream"}}
+
+With --model-selection, the detector and its options come from a model_variants.py
+calibration (the fastest variant above the accuracy floor), other detector_options still apply.
+
+With --target-fps, a QualityController (see quality_controller.py) steps the detector
+between lighter and heavier models, inference sizes and num_poses to hold that many
+detections per second. quality_levels (config only) replaces the detector's default ladder:
+    {"target_fps": 20, "quality_levels": [{"options": {"model_complexity": 0}, "inference_width": 480},
+                                          {"options": {"model_complexity": 1}, "inference_width": 640}]}
+
+With --profile-port, an OSC message /profile [seconds] profiles the running
+process (see profiler.py), for slowdowns that only show up after hours.
+
+Stops cleanly on Ctrl+C, SIGTERM (and Ctrl+Break on windows), or at the end of a non looping file.
+"""
+
+import argparse
+import json
+import signal
+import sys
+import threading
+
+import cv2
+
+from .metrics import MetricsReporter, format_snapshot
+from .pipeline import PosePipeline
+from .pose_encoding import POSE_FORMAT_LANDMARKS, POSE_FORMATS
+from .roi import RoiTracker, parse_zones
+
+DEFAULTS = {
+    "source": "0",
+    "loop": False,
+    "osc": None,
+    "osc_bundle": False,
+    "pose_format": POSE_FORMAT_LANDMARKS,
+    "ndi": None,
+    "detector": "mediapipe",
+    "detector_options": {},
+    "dshow": False,
+    "inference_width": 0,
+    "ndi_width": 0,
+    "pose_every": 1,
+    "osc_rate": 0,
+    "roi": False,
+    "roi_padding": 0.25,
+    "roi_include": None,
+    "roi_exclude": None,
+    "cache": False,
+    "record": None,
+    "status_interval": 10.0,
+    "stats_interval": 1.0,
+    "stats_osc": False,
+    "stats_log": None,
+    "profile_port": 0,
+    "model_selection": None,
+    "target_fps": 0,
+    "quality_levels": None,
+}
+
+
+def _mediapipe(**options):
+    from .pose_detector_mediapipe import PoseDetectorMediapipe
+    return PoseDetectorMediapipe(**options)
+
+
+def _mediapipe_multi(**options):
+    from .multiSkelton.poseDetector_MediaPipeMulti import PoseDetectorMediapipe
+    pose_detector = PoseDetectorMediapipe(**options)
+    if pose_detector.detector is None:
+        raise RuntimeError("MediaPipe Pose Landmarker is not available, check mediapipe and model_path")
+    return pose_detector
+
+
+def _movenet(**options):
+    from .multiSkelton.poseDetector_movenet import PoseDetectorMoveNet
+    return PoseDetectorMoveNet(**options)
+
+
+def _movenet_tflite(**options):
+    from .multiSkelton.poseDetector_movenet_tflite import PoseDetectorMoveNetTFLite
+    pose_detector = PoseDetectorMoveNetTFLite(**options)
+    if pose_detector.interpreter is None:
+        raise RuntimeError("MoveNet TFLite is not available, check the tflite runtime and model_path")
+    return pose_detector
+
+
+def _yolo(**options):
+    from .multiSkelton.poseDetector_yolo import PoseDetectorYolo
+    pose_detector = PoseDetectorYolo(**options)
+    if pose_detector.session is None:
+        raise RuntimeError("YOLO pose is not available, check onnxruntime and model_path")
+    return pose_detector
+
+
+def _openpose(**options):
+    from .multiSkelton.poseDetector_openpose import PoseDetectorOpenPose
+    pose_detector = PoseDetectorOpenPose(**options)
+    # the class only prints when pyopenpose or the models are missing, running on would detect nothing
+    if pose_detector.op_wrapper is None:
+        raise RuntimeError("OpenPose is not available, check pyopenpose and model_folder")
+    return pose_detector
+
+
+def _fake(**options):
+    from .multiSkelton.poseDetector_fake import PoseDetectorFake
+    return PoseDetectorFake(**options)
+
+
+# detector name -> factory, imported on use so only the chosen backend has to be installed
+DETECTORS = {
+    "mediapipe": _mediapipe,
+    "mediapipe-multi": _mediapipe_multi,
+    "movenet": _movenet,
+    "movenet-tflite": _movenet_tflite,
+    "yolo": _yolo,
+    "openpose": _openpose,
+    "fake": _fake,
+}
+
+
+def parse_host_port(text, default_host="127.0.0.1"):
+    """ "host:port" or "port" -> (host, port) """
+    host, _, port = text.rpartition(":")
+    return host or default_host, int(port)
+
+
+def build_parser():
+    # no defaults here, so unset options don't override the config file
+    parser = argparse.ArgumentParser(prog="python -m pose_detector.serve",
+                                     description="Headless pose detection, OSC and NDI out")
+    parser.add_argument("--config", help="JSON settings file, options given here override it")
+    parser.add_argument("--source", help="camera index or video file (default 0)")
+    parser.add_argument("--loop", action="store_true", default=None, help="loop a video file")
+    parser.add_argument("--osc", help="OSC destination host:port")
+    parser.add_argument("--osc-bundle", action="store_true", default=None, help="one OSC bundle per frame")
+    parser.add_argument("--pose-format", choices=POSE_FORMATS, help="OSC landmark encoding")
+    parser.add_argument("--ndi", help="NDI source name, no NDI if not given")
+    parser.add_argument("--detector", choices=sorted(DETECTORS), help="pose detector (default mediapipe)")
+    parser.add_argument("--dshow", action="store_true", default=None, help="use DirectShow for cameras (windows)")
+    parser.add_argument("--inference-width", type=int, help="detector input width, 0 = capture size")
+    parser.add_argument("--ndi-width", type=int, help="NDI output width, 0 = capture size")
+    parser.add_argument("--pose-every", type=int, help="run the detector every Nth frame")
+    parser.add_argument("--osc-rate", type=float, help="send OSC at this fixed rate (Hz), interpolated")
+    parser.add_argument("--roi", action="store_true", default=None, help="crop inference to the people")
+    parser.add_argument("--roi-padding", type=float, help="added around the people, fraction of their size")
+    parser.add_argument("--roi-include", type=parse_zones, help='only detect inside these zones, "x,y,w,h; x,y,w,h"')
+    parser.add_argument("--roi-exclude", type=parse_zones, help='black out these zones, "x,y,w,h; x,y,w,h"')
+    parser.add_argument("--cache", action="store_true", default=None, help="cache detections of video files")
+    parser.add_argument("--record", help="record poses to this .poserec file")
+    parser.add_argument("--status-interval", type=float, help="seconds between console stats lines, 0 for none")
+    parser.add_argument("--stats-interval", type=float, help="seconds between /stats messages and log rows")
+    parser.add_argument("--stats-osc", action="store_true", default=None,
+                        help="send /stats/... to the OSC destination")
+    parser.add_argument("--stats-log", help="append stats to this .csv or .jsonl file")
+    parser.add_argument("--profile-port", type=int,
+                        help="listen for OSC /profile [seconds] on this port, profiles go to ~/.pose2art/profiles")
+    parser.add_argument("--target-fps", type=float,
+                        help="step the detector's quality down and up to hold this many detections per second")
+    parser.add_argument("--model-selection",
+                        help="use the detector selected by model_variants.py, e.g. ~/.pose2art/model_selection.json")
+    return parser
+
+
+def load_settings(argv=None):
+    """ DEFAULTS, updated from --config, updated from the command line """
+    args = build_parser().parse_args(argv)
+    settings = dict(DEFAULTS)
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+        unknown = set(config) - set(DEFAULTS)
+        if unknown:
+            print(f"serve: ignoring unknown config keys {sorted(unknown)}")
+        settings.update((key, value) for key, value in config.items() if key in DEFAULTS)
+    settings.update((key, value) for key, value in vars(args).items() if value is not None and key != "config")
+    return settings
+
+
+def run(settings, stop_event):
+    """
+    Run the pipeline until stop_event is set or a non looping file ends
+    :param settings: dict with the DEFAULTS keys
+    :param stop_event: threading.Event
+    :return: process exit code
+    """
+    source = str(settings["source"])
+    is_file = not source.isdigit()
+    if is_file:
+        cap = cv2.VideoCapture(source)
+    else:
+        cap = cv2.VideoCapture(int(source), cv2.CAP_DSHOW if settings["dshow"] else cv2.CAP_ANY)
+    if not cap.isOpened():
+        print(f"serve: cannot open source {source}")
+        return 1
+    fps = cap.get(cv2.CAP_PROP_FPS)
+
+    if settings["model_selection"]:
+        from .model_variants import load_selection
+        settings["detector"], options = load_selection(settings["model_selection"])
+        settings["detector_options"] = dict(settings["detector_options"], **options)
+        print(f"serve: model selection {settings['detector']} {options}")
+    if (settings["roi_include"] or settings["roi_exclude"]) and not settings["roi"]:
+        print("serve: roi zones given, cropping to people")
+        settings["roi"] = True
+    if (settings["roi"] and settings["detector"] == "mediapipe-multi"
+            and settings["detector_options"].get("running_mode") != "image"):
+        # the crop moves every frame, MediaPipe's video / live_stream tracking can't follow it
+        print("serve: --roi with mediapipe-multi, using running_mode image")
+        settings["detector_options"] = dict(settings["detector_options"], running_mode="image")
+    inference_size = settings["inference_width"] or None
+    quality_controller = None
+    if settings["target_fps"]:
+        from .quality_controller import QualityController, default_quality_levels
+        levels = settings["quality_levels"] or default_quality_levels(settings["detector"],
+                                                                      settings["detector_options"])
+        if levels:
+            quality_controller = QualityController(settings["detector"], levels, settings["target_fps"],
+                                                   base_options=settings["detector_options"],
+                                                   inference_width=settings["inference_width"])
+        else:
+            print(f"serve: no quality levels for {settings['detector']}, set quality_levels to use --target-fps")
+    if quality_controller is not None:
+        pose_detector, inference_size = quality_controller.create_detector(quality_controller.level)
+    else:
+        pose_detector = DETECTORS[settings["detector"]](**settings["detector_options"])
+    pose_detector.osc_bundle = settings["osc_bundle"]
+    pose_detector.osc_pose_format = settings["pose_format"]
+
+    osc_client = None
+    if settings["osc"]:
+        from pythonosc import udp_client
+        host, port = parse_host_port(settings["osc"])
+        osc_client = udp_client.SimpleUDPClient(host, port)
+        print(f"serve: OSC to {host}:{port}")
+
+    ndi_sender = None
+    if settings["ndi"]:
+        from .ndi_sender import NdiSender
+        ndi_sender = NdiSender(settings["ndi"], fps=fps)
+        print(f"serve: NDI source {settings['ndi']}")
+
+    roi = None
+    if settings["roi"]:
+        roi = RoiTracker(padding=settings["roi_padding"], include_zones=settings["roi_include"],
+                         exclude_zones=settings["roi_exclude"])
+    detection_cache = None
+    if settings["cache"] and is_file and quality_controller is not None:
+        print("serve: no detection cache with --target-fps, the detector changes while running")
+    elif settings["cache"] and is_file:
+        from .detection_cache import DetectionCache
+        detection_cache = DetectionCache(source, pose_detector,
+                                         pipeline_settings={"inference_size": inference_size,
+                                                            "roi": roi.get_settings() if roi else False})
+    recorder = None
+    if settings["record"]:
+        from .pose_recording import PoseRecorder, detector_num_landmarks, detector_schema
+        recorder = PoseRecorder(settings["record"], detector_num_landmarks(pose_detector),
+                                detector_schema(pose_detector))
+
+    pipeline = PosePipeline(cap, pose_detector, fps=fps, is_file=is_file, looping=settings["loop"],
+                            ndi_out=ndi_sender.send if ndi_sender is not None else None,
+                            osc_client=osc_client, preview=False, recorder=recorder,
+                            detection_cache=detection_cache, inference_every=settings["pose_every"],
+                            osc_rate=settings["osc_rate"] or None, roi=roi,
+                            inference_size=inference_size, ndi_size=settings["ndi_width"] or None)
+    if ndi_sender is not None:
+        ndi_sender.metrics = pipeline.metrics
+    reporter = MetricsReporter(pipeline.metrics, interval=settings["stats_interval"],
+                               osc_client=osc_client if settings["stats_osc"] else None,
+                               log_path=settings["stats_log"], console_interval=settings["status_interval"])
+    profile_server = None
+    if settings["profile_port"]:
+        from .profiler import ProfileCommandServer
+        profile_server = ProfileCommandServer(settings["profile_port"])
+        profile_server.start()
+        print(f"serve: send /profile [seconds] to port {settings['profile_port']} to profile")
+    pipeline.start()
+    if quality_controller is not None:
+        quality_controller.start(pipeline)
+    reporter.start()
+    print(f"serve: running {settings['detector']} on {source}, Ctrl+C to stop")
+
+    try:
+        while pipeline.running and not stop_event.wait(0.25):
+            pass
+    finally:
+        if profile_server is not None:
+            profile_server.stop()
+        if quality_controller is not None:
+            quality_controller.stop()
+        reporter.stop()
+        pipeline.stop()
+        cap.release()
+        # e.g. the multi person MediaPipe landmarker's live_stream threads,
+        # the pipeline's detector may have been swapped by the quality controller
+        if hasattr(pipeline.pose_detector, "close"):
+            pipeline.pose_detector.close()
+        if ndi_sender is not None:
+            ndi_sender.close()
+        if recorder is not None:
+            recorder.close()
+        print(f"serve: stopped after {pipeline.frames_captured} frames")
+        print("serve: last interval", format_snapshot(pipeline.metrics.snapshot()))
+    return 0
+
+
+def main(argv=None):
+    settings = load_settings(argv)
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"serve: signal {signum}, stopping")
+        stop_event.set()
+
+    for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), request_stop)
+    return run(settings, stop_event)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+The /personN/landmark/<name> messages of the multi person detectors: x, y, z for 3D
+models, x, y, confidence for 2D models (MoveNet, OpenPose, YOLO), precompiled or not.
+
+    python -m pytest tests    (from the python folder)
+"""
+
+import numpy as np
+import pytest
+from pythonosc.osc_message import OscMessage
+
+from pose_detector.multiSkelton.poseDetector_fake import PoseDetectorFake
+
+
+class RecordingSink:
+    """ stands in for the udp client, keeps (address, values) of everything sent """
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, address, value):
+        self.messages.append((address, list(value) if isinstance(value, list) else [value]))
+
+    def send(self, content):
+        message = OscMessage(bytes(content.dgram if hasattr(content, "dgram") else content))
+        self.messages.append((message.address, list(message.params)))
+
+    def landmarks(self, person_id):
+        prefix = f"/person{person_id}/landmark/"
+        return np.array([values for address, values in self.messages if address.startswith(prefix)])
+
+
+def detect(has_depth, precompiled):
+    pose_detector = PoseDetectorFake(num_poses=2)
+    pose_detector.has_depth = has_depth
+    pose_detector.osc_precompiled = precompiled
+    pose_detector.process_image(np.zeros((48, 64, 3), dtype=np.uint8))
+    sink = RecordingSink()
+    pose_detector.send_landmarks_via_osc(sink)
+    return pose_detector.pose_frame.landmarks, sink
+
+
+@pytest.mark.parametrize("precompiled", [True, False])
+def test_3d_landmarks_send_xyz(precompiled):
+    landmarks, sink = detect(True, precompiled)
+    for person_id in range(2):
+        np.testing.assert_allclose(sink.landmarks(person_id), landmarks[person_id][:, :3], rtol=1e-6)
+
+
+@pytest.mark.parametrize("precompiled", [True, False])
+def test_2d_landmarks_send_confidence_in_place_of_z(precompiled):
+    landmarks, sink = detect(False, precompiled)
+    for person_id in range(2):
+        np.testing.assert_allclose(sink.landmarks(person_id), landmarks[person_id][:, [0, 1, 3]], rtol=1e-6)
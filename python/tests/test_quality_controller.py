@@ -0,0 +1,64 @@
+"""
+QualityController decisions, driven by hand: observe() stands in for the pipeline's
+inference thread, evaluate() for the controller's interval tick.
+
+    python -m pytest tests    (from the python folder)
+"""
+
+from pose_detector.benchmark import synthetic_frames
+from pose_detector.pipeline import PosePipeline
+from pose_detector.pipeline_benchmark import MemoryCapture
+from pose_detector.quality_controller import MIN_SAMPLES, QualityController
+
+# fake detector levels, lowest quality first
+LEVELS = [{"options": {"num_poses": 1}}, {"options": {"num_poses": 2}}, {"options": {"num_poses": 3}}]
+
+
+def make_controller(target_fps=10, **options):
+    controller = QualityController("fake", LEVELS, target_fps, cooldown=0.0, **options)
+    pose_detector, inference_size = controller.create_detector(controller.level)
+    pipeline = PosePipeline(MemoryCapture(synthetic_frames(1, (64, 48))), pose_detector,
+                            preview=False, inference_size=inference_size)
+    # attached without start(), so no thread ticks besides the test's
+    controller.pipeline = pipeline
+    return controller, pipeline
+
+
+def test_slow_detections_step_down():
+    # 0.4 s per detection: one detection per 1 s tick, fewer than MIN_SAMPLES per tick
+    controller, pipeline = make_controller(target_fps=10, down_after=3)
+    top = controller.level
+    for _ in range(3 * MIN_SAMPLES):
+        controller.observe(0.4)
+        controller.evaluate()
+    assert controller.level == top - 1
+    assert pipeline.pose_detector.num_poses == LEVELS[top - 1]["options"]["num_poses"]
+
+
+def test_within_budget_stays():
+    controller, _ = make_controller(target_fps=10, down_after=3)
+    top = controller.level
+    for _ in range(20):
+        for _ in range(MIN_SAMPLES):
+            controller.observe(0.09)
+        controller.evaluate()
+    assert controller.level == top
+
+
+def test_headroom_steps_up_and_failed_level_is_held():
+    controller, _ = make_controller(target_fps=10, level=0, down_after=1, up_after=2, hold=60.0)
+    for _ in range(2):
+        for _ in range(MIN_SAMPLES):
+            controller.observe(0.01)
+        controller.evaluate()
+    assert controller.level == 1
+    # level 1 turns out too slow: back down, and no retry during the hold
+    for _ in range(MIN_SAMPLES):
+        controller.observe(0.2)
+    controller.evaluate()
+    assert controller.level == 0
+    for _ in range(4):
+        for _ in range(MIN_SAMPLES):
+            controller.observe(0.01)
+        controller.evaluate()
+    assert controller.level == 0